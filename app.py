@@ -3,22 +3,33 @@
 # Author: lhys
 # File  : app.py
 
+import time
+
+# 启动计时的起点，放在其他导入之前
+STARTUP_START = time.perf_counter()
+
 import os
+import sqlite3
+import sys
 import tkinter as tk
 from datetime import datetime, timedelta
+from threading import Thread, Event
 from tkinter import ttk, messagebox, filedialog
 
-import pandas as pd
-from tkcalendar import DateEntry
-
-from utils import SqliteOperation, Record, make_path_exists
+from utils import SqliteOperation, Record, ProductIndex, VirtualTreeview, ProgressDialog, ProfitChart, Worker, \
+    make_path_exists, migrate, get_stock, import_products, export_records, save_movements, ProfitCache, \
+    record_tables, StartupTimer, PageManager, InventoryService, FolderWatcher, QUERY_STATS
 
 
 class SearchCombobox(ttk.Combobox):
-    def __init__(self, root, db, id_var=None, **kwargs):
+    def __init__(self, root, db, id_var=None, index=None, worker=None, **kwargs):
         super().__init__(root, **kwargs)
         self.db = db
         self.id_var = id_var
+        self.index = index
+        # 没有索引时在后台线程查询
+        self.worker = worker
+        self.task = None
         self.after_id = None
         self.bind('<KeyRelease>', self.on_input)
         self.bind("<<ComboboxSelected>>", self.on_select)
@@ -29,13 +40,11 @@ class SearchCombobox(ttk.Combobox):
         self.last_text = kw
         # 如果需要则设置编号
         if self.id_var is not None:
-            ids, _ = self.db.search(
-                'products',
-                (kw, ),
-                field='id',
-                limit='where `Name` = ?'
-            )
-            self.id_var.set(ids[0][0] if ids else '')
+            product_id = self.index.get_id(kw) if self.index is not None else None
+            if product_id is None:
+                ids, _ = self.db.search('products', field='id', where={'Name': kw}, limit=1)
+                product_id = ids[0][0] if ids else ''
+            self.id_var.set(product_id)
         if hasattr(self, 'select_func'): self.select_func()
 
     def set_select_func(self, func):
@@ -50,17 +59,33 @@ class SearchCombobox(ttk.Combobox):
             return
         self.after_id = self.after(300, self.show_suggestions)
 
+    @staticmethod
+    def search_names(db, kw):
+        search_text = '%'.join(kw)
+        results, _ = db.search('products', field='Name', where={'Name LIKE': f'%{search_text}%'})
+        return [row[0] for row in results]
+
     def show_suggestions(self):
         kw = self.get()
         self.last_text = kw
-        search_text = '%'.join(kw)
-        results, _ = self.db.search(
-            'products',
-            (f'%{search_text}%', ),
-            field='Name',
-            limit='where `Name` LIKE ?'
-        )
-        product_names = [row[0] for row in results]
+        # 丢弃上一次尚未返回的查询
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.index is not None:
+            # 使用内存索引，不再查询数据库
+            self.update_suggestions(kw, self.index.search(kw))
+        elif self.worker is not None:
+            self.task = self.worker.submit(
+                lambda task: self.search_names(task.db, kw),
+                on_done=lambda names: self.update_suggestions(kw, names)
+            )
+        else:
+            self.update_suggestions(kw, self.search_names(self.db, kw))
+
+    def update_suggestions(self, kw, product_names):
+        # 输入已变化则忽略
+        if self.get() != kw: return
         # 保持用户输入
         self.set(kw)
         # 更新下拉选项
@@ -75,8 +100,55 @@ class SearchCombobox(ttk.Combobox):
         self.on_select()
         self.bind('<Return>', *args, **kwargs)
 
+# 首页折线图可选区间及对应天数
+CHART_RANGES = {'一周': 7, '一月': 30, '一季度': 90, '一年': 365}
+
+# 查询页面筛选条件：(键, sql 条件)，出库数量按正数比较
+RECORD_FILTERS = [
+    ('start', 'r.`{table}_time` >= ?'),
+    ('end', 'r.`{table}_time` < ?'),
+    ('settled', 'r.`settled` = ?'),
+    ('min_price', 'r.`unit_price` >= ?'),
+    ('max_price', 'r.`unit_price` <= ?'),
+    ('min_bottles', 'r.`bottles` >= ?'),
+    ('max_bottles', 'r.`bottles` <= ?'),
+]
+
+
+def parse_filters(values):
+    """
+    将筛选输入框的文本转为 query_records 的 filters，未填写的条件为 None。
+    输入不完整或格式错误时抛出 ValueError。
+    """
+    filters = {}
+    for key in ['start', 'end']:
+        text = values.get(key, '').strip()
+        if not text:
+            filters[key] = None
+            continue
+        day = datetime.strptime(text, '%Y-%m-%d')
+        # 结束日期包含当天
+        if key == 'end': day += timedelta(days=1)
+        filters[key] = day.strftime('%Y-%m-%d')
+    for key, convert in [('min_price', float), ('max_price', float), ('min_bottles', int), ('max_bottles', int)]:
+        text = values.get(key, '').strip()
+        filters[key] = convert(text) if text else None
+    filters['direction'] = {'入库': 'in', '出库': 'out'}.get(values.get('direction'))
+    filters['settled'] = {'已结清': 1, '未结清': 0}.get(values.get('settled'))
+    return filters
+
+
+# 窗口显示后在后台导入的模块，页面中用到时再在函数内导入
+PRELOAD_MODULES = ['pandas', 'matplotlib.figure', 'matplotlib.backends.backend_tkagg', 'tkcalendar']
+
+
 class App:
-    def __init__(self, title="出入库管理系统", menu_style='bar'):
+    def __init__(self, title="出入库管理系统", menu_style='bar', startup_report=None, watch_folder=None):
+        # 记录启动各阶段耗时
+        self.startup_timer = StartupTimer(STARTUP_START)
+        self.startup_timer.mark('import')
+        self.startup_report = startup_report
+
         self.root = tk.Tk()
         self.root.title(title)
 
@@ -85,66 +157,98 @@ class App:
         # 禁止调整窗口大小
         self.root.resizable(False, False)
 
+        # 首页折线图，创建后原地更新
+        self.dashboard = None
         self.create_widgets(menu_style=menu_style)
+        self.register_pages()
+        self.startup_timer.mark('widgets')
         self.recorder = Record(self.log_text)
-        self.db = SqliteOperation("data.db", self.recorder)
+        self.db_name = 'data.db'
+        self.db = SqliteOperation(self.db_name, self.recorder)
         self.init_db()
+        # 业务接口，与命令行共用；商品信息及表结构缓存，主线程读取商品均经由此处
+        self.service = InventoryService(self.db)
+        self.products = self.service.products
+        self.startup_timer.mark('database')
+        # 后台线程，使用独立的数据库连接执行耗时操作
+        self.worker = Worker(self.root, self.db_name, self.recorder)
+        # 商品名称索引，用于输入框联想，在后台加载
+        self.product_index = ProductIndex()
+        self.worker.submit(lambda task: self.product_index.load(task.db))
+        # 首页利润数据缓存及折线图区间
+        self.profit_cache = ProfitCache(self.db)
+        self.chart_range = '一周'
+        # 收银系统导出目录，定时导入新的销售文件
+        self.watcher = None
+        if watch_folder:
+            self.watcher = FolderWatcher(self.root, self.worker, watch_folder, on_ingested=self.on_sales_ingested)
+            self.watcher.start()
+        # 较重的模块在后台导入
+        self.preloaded = Event()
+        self.preload()
         self.show_home_page()
+        self.startup_timer.mark('home page')
+        self.root.after_idle(self.on_first_paint)
 
         # 在窗口关闭时调用 self.on_closing 方法
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
         self.root.mainloop()
 
+    def preload(self):
+        def run():
+            for module in PRELOAD_MODULES:
+                try:
+                    self.startup_timer.time_import(module)
+                except ImportError as e:
+                    self.log(f'Preload {module} failed: {e}', level='warning')
+            self.preloaded.set()
+
+        Thread(target=run, name='preload', daemon=True).start()
+
+    def on_first_paint(self):
+        # 窗口首次绘制完成
+        self.startup_timer.mark('first paint')
+
+        def report():
+            # 后台导入完成后输出启动耗时
+            if not self.preloaded.is_set():
+                self.root.after(100, report)
+                return
+            self.startup_timer.mark('preload')
+            self.log(self.startup_timer.report())
+            if self.startup_report:
+                self.startup_timer.save(self.startup_report)
+                print(self.startup_timer.report())
+
+        report()
+
     def init_db(self):
-        self.db.exec_sql('''
-        CREATE TABLE IF NOT EXISTS in_records (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            in_time DATETIME DEFAULT (datetime('now', 'localtime')) NOT NULL,
-            product_id TEXT NOT NULL,
-            bottles INTEGER NOT NULL,
-            unit_price REAL NOT NULL,
-            total_price REAL NOT NULL,
-            settled BOOLEAN DEFAULT FALSE, 
-            FOREIGN KEY (product_id) REFERENCES products (`id`)
-        )
-        ''')
-
-        self.db.exec_sql('''
-        CREATE TABLE IF NOT EXISTS out_records (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            out_time DATETIME DEFAULT (datetime('now', 'localtime')) NOT NULL,
-            product_id TEXT NOT NULL,
-            bottles INTEGER NOT NULL,
-            unit_price REAL NOT NULL,
-            total_price REAL NOT NULL,
-            settled BOOLEAN DEFAULT FALSE, 
-            FOREIGN KEY (product_id) REFERENCES products (`id`)
-        )
-        ''')
+        # 建表及升级已有数据库的结构
+        migrate(self.db)
+        # WAL 模式下后台线程读写不会阻塞主线程的查询
+        self.db.exec_sql('PRAGMA journal_mode=WAL')
 
-        self.db.exec_sql('''
-        CREATE TABLE IF NOT EXISTS products (
-            id TEXT PRIMARY KEY,
-            Name TEXT,
-            BottlesPerBox INTEGER DEFAULT 0
-        )
-        ''')
-
-        self.db.exec_sql('''
-        CREATE TABLE IF NOT EXISTS statistics (
-            product_id TEXT,
-            day TEXT DEFAULT (DATE('now')) NOT NULL,
-            origin INTEGER DEFAULT 0 NOT NULL,
-            in_total INTEGER DEFAULT 0 NOT NULL,
-            out_total INTEGER DEFAULT 0 NOT NULL,
-            in_unit_price REAL DEFAULT 0 NOT NULL,
-            out_unit_price REAL DEFAULT 0 NOT NULL,
-            settled BOOLEAN DEFAULT FALSE, 
-            profit REAL DEFAULT 0 NOT NULL,
-            FOREIGN KEY (product_id) REFERENCES products (`id`)
-        )
-        ''')
+    def run_task(self, func, *args, title='处理中', on_done=None, **kwargs):
+        # 在后台线程执行 func(task, *args, **kwargs)，并显示进度窗口
+        dialog = ProgressDialog(self.root, title)
+
+        def done(result):
+            dialog.close()
+            if on_done is not None: on_done(result)
+
+        def error(e):
+            dialog.close()
+            self.log(f'{title}失败：{e}', level='error', out='all')
+
+        def cancel():
+            task.cancel()
+            self.log(f'已取消{title}。', out='text')
+
+        task = self.worker.submit(func, *args, on_done=done, on_error=error, on_progress=dialog.update_progress,
+                                  **kwargs)
+        dialog.on_cancel = cancel
+        return task
 
     def create_widgets(self, menu_style='bar'):
         if menu_style == 'bar':
@@ -155,6 +259,8 @@ class App:
         # 创建主框架，将主框架放置在窗口顶部，填充窗口并允许扩展
         self.main_frame = tk.Frame(self.root)
         self.main_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True, pady=5)
+        # 各页面只创建一次，切换时隐藏 / 显示
+        self.pages = PageManager(self.main_frame)
 
         # 创建日志框架，将日志框架放置在窗口底部，并水平填充
         self.log_frame = tk.Frame(self.root)
@@ -181,9 +287,12 @@ class App:
         ttk.Button(self.menu_frame, text="主\n页", command=self.show_home_page).pack(padx=5, pady=5)
         ttk.Button(self.menu_frame, text="新   增\n出入库\n数   据", command=self.show_add_data_page).pack(padx=5,
                                                                                                            pady=5)
+        ttk.Button(self.menu_frame, text="批量\n出入库", command=self.show_batch_page).pack(padx=5, pady=5)
         ttk.Button(self.menu_frame, text="新增\n商品\n数据", command=self.show_add_product_batches).pack(padx=5, pady=5)
         ttk.Button(self.menu_frame, text="查询\n数据", command=self.show_query_page).pack(padx=5, pady=5)
+        ttk.Button(self.menu_frame, text="库存\n状况", command=self.show_stock_page).pack(padx=5, pady=5)
         ttk.Button(self.menu_frame, text="导出\n数据", command=self.show_export_page).pack(padx=5, pady=5)
+        ttk.Button(self.menu_frame, text="诊\n断", command=self.show_diagnostics_page).pack(padx=5, pady=5)
 
     def create_menubar(self):
         # 创建菜单栏
@@ -201,6 +310,7 @@ class App:
         add_data_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="新增数据", menu=add_data_menu)
         add_data_menu.add_command(label="添加出入库记录", command=self.show_add_data_page)
+        add_data_menu.add_command(label="批量出入库", command=self.show_batch_page)
         add_data_menu.add_command(label="批量导入商品", command=self.show_add_product_batches)
         # menubar.add_command(label='新增数据', command=self.show_add_data_page)
 
@@ -210,74 +320,118 @@ class App:
         # query_menu.add_command(label="查询数据", command=self.show_query_page)
         menubar.add_command(label='查询数据', command=self.show_query_page)
 
+        # 创建库存状况菜单
+        menubar.add_command(label='库存状况', command=self.show_stock_page)
+
         # 创建导出菜单
         # export_menu = tk.Menu(menubar, tearoff=0)
         # menubar.add_cascade(label="导出", menu=export_menu)
         # export_menu.add_command(label="导出数据", command=self.show_export_page)
         menubar.add_command(label='导出数据', command=self.show_export_page)
 
+        # 创建诊断菜单
+        menubar.add_command(label='诊断', command=self.show_diagnostics_page)
+
+    def register_pages(self):
+        # 页面名称、创建函数及需要刷新的数据变化事件
+        self.pages.register('home', self.build_home_page, events=['records'])
+        self.pages.register('add_data', self.build_add_data_page)
+        self.pages.register('batch', self.build_batch_page)
+        self.pages.register('products', self.build_add_product_batches)
+        self.pages.register('query', self.build_query_page, events=['records', 'products'])
+        self.pages.register('stock', self.build_stock_page, events=['records', 'products'])
+        self.pages.register('export', self.build_export_page)
+        self.pages.register('diagnostics', self.build_diagnostics_page)
+
+    def notify_data_changed(self, *events):
+        # events: records 出入库记录，products 商品
+        self.pages.notify(*events)
+
     def log(self, message, level='info', out='log'):
         self.recorder.lock_output(message, level=level, out=out)
 
     def show_home_page(self):
-        # 清除主框架中的所有小部件
-        for widget in self.main_frame.winfo_children():
-            widget.destroy()
+        self.pages.show('home')
+        # 日期可能已变化，利润有缓存且折线图数据不变时不重绘
+        self.pages.refresh('home')
+        self.log('欢迎使用。', out='text')
 
-        # 添加主页标题
-        tk.Label(self.main_frame, text="销售情况", font=("华文楷体", 24)).pack(pady=10)
+    def show_add_data_page(self):
+        self.pages.show('add_data')
 
-        count = self.get_statistics()
-        if count.empty:
-            tk.Label(self.main_frame, text='当前无数据', font=("华文楷体", 24)).pack(pady=10)
-        else:
-            import matplotlib.pyplot as plt
-            from matplotlib.figure import Figure
-            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-
-            # 显示中文和负号
-            plt.rcParams['font.sans-serif'] = ['SimHei']
-            plt.rcParams['axes.unicode_minus'] = False
-
-            # 创建一个 Figure 对象
-            fig = Figure(figsize=(5, 4), dpi=100)
-            # 添加子图
-            ax1 = fig.add_subplot(111)
-            # ax2 = fig.add_subplot(223)
-            # ax3 = fig.add_subplot(224)
-            # ax4 = fig.add_subplot(224)
-
-            # 第一张图绘制最近一周利润走势图
-            count['day'] = pd.to_datetime(count['day']).dt.date
-            # 获取今天的日期
-            today = datetime.today().date()
-            # 最近一周的日期
-            date_range = pd.date_range(start=today - timedelta(days=7), end=today, freq='D').to_series().dt.date
-            recent_week_profit = pd.Series(index=date_range, dtype=float, name='profit')
-            # 过滤出最近一周的数据
-            recent_week_profit.update(count[count['day'].isin(date_range)].groupby('day')['profit'].sum())
-            recent_week_profit.fillna(0, inplace=True)
-            ax1.plot(recent_week_profit)
-            ax1.set_title("一周利润走势图")
-            # 设置 x 轴刻度和标签
-            ax1.set_xticks(date_range)
-            ax1.set_xticklabels([d.strftime('%m-%d') for d in date_range])
-
-            # ax2.plot([1, 2, 3], [6, 5, 4])
-            # ax3.plot([1, 2, 3], [4, 6, 5])
-            # ax4.plot([1, 2, 3], [5, 4, 6])
-
-            # 创建一个 FigureCanvasTkAgg 对象
-            canvas = FigureCanvasTkAgg(fig, master=self.main_frame)
-            # 绘制图形
-            canvas.draw()
-            # 将画布放置在主框架中，填充并扩展
-            canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+    def show_batch_page(self):
+        self.pages.show('batch')
 
-        self.log('欢迎使用。', out='text')
+    def show_add_product_batches(self):
+        self.pages.show('products')
+
+    def show_query_page(self):
+        self.pages.show('query')
 
-    def init_a_row(self, side=tk.TOP, fill=tk.BOTH, expand=True):
-        row = tk.Frame(self.main_frame)
+    def show_stock_page(self):
+        self.pages.show('stock')
+
+    def show_export_page(self):
+        self.pages.show('export')
+
+    def show_diagnostics_page(self):
+        self.pages.show('diagnostics')
+        # 统计随时变化，每次显示时刷新
+        self.pages.refresh('diagnostics')
+
+    def build_home_page(self, frame):
+        # 添加主页标题
+        tk.Label(frame, text="销售情况", font=("华文楷体", 24)).pack(pady=10)
+
+        # 折线图区间
+        row = self.init_a_row(frame, expand=False, fill=None)
+        tk.Label(row, text="区间：").pack(side=tk.LEFT)
+        range_var = tk.StringVar(value=self.chart_range)
+        range_box = ttk.Combobox(row, width=6, textvariable=range_var, values=list(CHART_RANGES), state='readonly')
+        range_box.pack(side=tk.LEFT)
+
+        content = tk.Frame(frame)
+        content.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+
+        def refresh():
+            # 折线图只隐藏，其余提示文字销毁
+            for widget in content.winfo_children():
+                if self.dashboard is not None and widget is self.dashboard.widget:
+                    widget.pack_forget()
+                else:
+                    widget.destroy()
+
+            # 只查询区间内按天汇总的利润
+            today = datetime.today().date()
+            date_range = [today - timedelta(days=i) for i in range(CHART_RANGES[self.chart_range], -1, -1)]
+            profits = dict(self.profit_cache.get(date_range[0].strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')))
+            if not profits:
+                tk.Label(content, text='当前无数据', font=("华文楷体", 24)).pack(pady=10)
+            elif not self.preloaded.is_set():
+                # matplotlib 尚在后台导入，稍后再绘制
+                loading = tk.Label(content, text='加载中...', font=("华文楷体", 16))
+                loading.pack(pady=10)
+                self.root.after(100, lambda: loading.winfo_exists() and refresh())
+            else:
+                # 折线图只创建一次，数据或区间变化时才重绘
+                if self.dashboard is None:
+                    self.dashboard = ProfitChart(content)
+                values = [profits.get(d.strftime('%Y-%m-%d'), 0) for d in date_range]
+                key = (self.chart_range, today, tuple(values))
+                self.dashboard.update(key, date_range, values, f"{self.chart_range}利润走势图")
+                # 将画布放置在页面中，填充并扩展
+                self.dashboard.widget.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+
+        def change_range(*args):
+            self.chart_range = range_var.get()
+            refresh()
+
+        range_box.bind("<<ComboboxSelected>>", change_range)
+        # 由 show_home_page 每次显示时刷新
+        return refresh
+
+    def init_a_row(self, master, side=tk.TOP, fill=tk.BOTH, expand=True):
+        row = tk.Frame(master)
         row.pack(side=side, fill=fill, expand=expand, padx=5, pady=10)
         return row
 
@@ -289,13 +443,10 @@ class App:
         if eval(event.widget.get()) == 0:
             event.widget.delete(0, tk.END)
 
-    def show_add_data_page(self):
-        # 清除主框架中的所有小部件
-        for widget in self.main_frame.winfo_children():
-            widget.destroy()
+    def build_add_data_page(self, frame):
 
         # 添加“添加出入库记录”标题
-        tk.Label(self.main_frame, text="添加出入库记录", font=("华文楷体", 24)).pack(pady=10)
+        tk.Label(frame, text="添加出入库记录", font=("华文楷体", 24)).pack(pady=10)
 
         # 保存字段条目
         self.entries = {
@@ -308,12 +459,12 @@ class App:
         # 创建一个行框架
         for i, (field, var) in enumerate(self.entries.items()):
             if field in ['结算状态', '出入库']: continue
-            row = self.init_a_row()
+            row = self.init_a_row(frame)
             tk.Label(row, width=15, text=field, anchor='w').pack(side=tk.LEFT)
 
             if i == 1:
                 id_var = self.entries.get('商品编号')
-                entry = SearchCombobox(row, self.db, id_var)
+                entry = SearchCombobox(row, self.db, id_var, index=self.product_index, worker=self.worker)
                 entry.pack(side=tk.RIGHT, expand=tk.YES, fill=tk.X)
                 entry.bind_return(self.focus_next_widget)
                 self.entries['商品名称'] = entry
@@ -333,7 +484,7 @@ class App:
                 else:
                     entry.pack(side=tk.RIGHT, expand=tk.YES, fill=tk.X)
 
-        row = self.init_a_row()
+        row = self.init_a_row(frame)
         tk.Label(row, width=15, text="结算状态", anchor='w').pack(side=tk.LEFT)
         status_var = tk.BooleanVar()
         status_var.set(True)
@@ -343,7 +494,7 @@ class App:
         tk.Radiobutton(row, text="未结清", variable=status_var, value=False).pack(side=tk.LEFT)
         self.entries['结算状态'] = status_var
 
-        row = self.init_a_row()
+        row = self.init_a_row(frame)
         # 在类型选择框架中添加标签
         tk.Label(row, width=15, text="类型", anchor='w').pack(side=tk.LEFT)
         # 创建一个 StringVar 用于保存入库/出库选择
@@ -356,71 +507,13 @@ class App:
         tk.Radiobutton(row, text="出库", variable=type_var, value='out').pack(side=tk.LEFT)
         self.entries['出入库'] = type_var
 
-        row = self.init_a_row()
+        row = self.init_a_row(frame)
         # 添加保存按钮
         ttk.Button(row, text="保存", command=self.save_data).pack(pady=20)
 
-    def get_statistics(self, start=None, end=(datetime.today() + timedelta(days=1)).strftime('%Y-%m-%d')):
-        if not start:
-            result, _ = self.db.search('statistics', field='MIN(day)')
-            start = result[0][0]
-        start = end if not start else start
-
-        result, _ = self.db.search(
-            'statistics',
-            (start, end),
-            limit='where `day` BETWEEN ? AND ?'
-        )
-        columns = self.db.get_column_names('statistics')
-        return pd.DataFrame(result, columns=columns)
-
-    def update_statistics(self, data, mode='in'):
-        # data = [product_id, bottles, unit_price, total_price, settled]
-        product_id = data.pop(0)
-
-        today = datetime.today().strftime('%Y-%m-%d')
-        history, _ = self.db.search(
-            'statistics',
-            (product_id, ),
-            limit='WHERE `product_id` = ? ORDER BY day DESC LIMIT 1'
-        )
-        if history: history = history[0]
-
-        # data = [bottles, unit_price, total_price, settled]
-        in_total = (history[3] if history else 0) + (data[0] if mode == 'in' else 0)
-        out_total = (history[4] if history else 0) + (data[0] if mode != 'in' else 0)
-        in_total_price = (history[5] * history[3] if history else 0) + (data[2] if mode == 'in' else 0)
-        out_total_price = (history[6] * history[4] if history else 0) + (data[2] if mode != 'in' else 0)
-        data = [
-            product_id,
-            today,
-            history[2] if history else 0,
-            in_total,
-            out_total,
-            in_total_price / in_total if in_total else 0,
-            out_total_price / out_total if out_total else 0,
-            (history[7] if history else True) and data[-1],
-            (history[8] if history else 0) + (data[0] * (data[1] - (history[5] if history else 0)) if mode != 'in' else 0),
-        ]
-        if not history or history[0][1] != today:
-            self.db.insert(
-                'statistics',
-                data
-            )
-        else:
-            columns = self.db.get_column_names('statistics')
-            columns = columns[3:]
-            self.db.modify(
-                'statistics',
-                columns,
-                data[3:],
-                limit=f'WHERE `product_id` = "{product_id}" and `day` = "{today}"'
-            )
-
     def save_data(self):
         # 出入库选择
         type_var = self.entries.get('出入库')
-        table = 'in_records' if type_var.get() == 'in' else 'out_records'
 
         # 出入库数据
         order = ['商品编号', '商品名称', '数量', '单价', '结算状态']
@@ -434,14 +527,10 @@ class App:
 
         data = data[2:]
 
-        result, _ = self.db.search(
-            'products',
-            (product_id, ),
-            field='id',
-            limit='where `id` = ?'
-        )
+        # 编号、名称及每箱瓶数一次取得，之后从缓存读取
+        product = self.products.get(product_id)
 
-        if not product_id or not result:
+        if product is None:
             messagebox.showwarning('提示', f'未找到商品，请点击确定新增数据。')
             return self.add_new_product(product_id, product_name)
 
@@ -449,101 +538,256 @@ class App:
             messagebox.showerror('错误', '请输入数量及价格。')
             return
 
-        data.insert(-1, data[0] * data[1])
-
-        if self.unit_var.get() == '箱':
-            unit = int(self.db.search(
-                'products',
-                (product_id, ),
-                field='BottlesPerBox',
-                limit='where `id` = ?'
-            )[0][0][0])
-            num, unit_price = data[:2]
-            num *= unit
-            unit_price /= unit
-            data[:2] = [num, unit_price]
-
-        data = [product_id] + data
-        columns = self.db.get_column_names(table)
-        # 删除多余列名
-        columns.remove('id')
-        columns.remove(f'{type_var.get()}_time')
-        # 新增数据
-        self.db.insert(table, data, keywords=columns)
+        if self.unit_var.get() == '箱' and self.products.bottles_per_box(product_id) <= 0:
+            messagebox.showerror('错误', f'商品 {product[1]} 未设置每箱瓶数，请按瓶录入。')
+            return
+
+        # 按箱录入时换算为瓶，新增数据与统计数据在同一事务中提交
+        try:
+            self.service.record_movement(product_id, *data, mode=type_var.get(), unit=self.unit_var.get())
+        except sqlite3.Error:
+            # 数据库错误已由 exec_sql 记录并提示
+            return
+        except Exception as e:
+            self.log(f'保存失败：{e}', level='error', out='all')
+            return
 
         # 记录日志
-        name = self.db.search(
-            'products',
-            (product_id, ),
-            field='Name',
-            limit='where `id` == ?'
-        )[0][0][0]
+        name = product[1]
         self.log(
             f"已{'入' if type_var.get() == 'in' else '出'}库 {self.entries.get('数量').get()} {self.unit_var.get()}{name}。",
             out='text'
         )
         messagebox.showinfo('提示', '新增数据成功')
+        self.notify_data_changed('records')
 
-        self.update_statistics(data, type_var.get())
-
+        # 清空输入，重建当前页面
         del self.entries
-        return self.show_add_data_page()
+        self.pages.reset('add_data')
+
+    def build_batch_page(self, frame):
+
+        import pandas as pd
+
+        tk.Label(frame, text="批量出入库", font=("华文楷体", 24)).pack(pady=10)
+
+        # 待保存的记录保存在 DataFrame 中，切换页面后保留
+        if not hasattr(self, 'batch_data'):
+            self.batch_data = pd.DataFrame(columns=['id', 'name', 'num', 'unit', 'price', 'per_box'])
+        editing = {'index': None}
+
+        row = self.init_a_row(frame, expand=False)
+        tk.Label(row, text="商品名称").pack(side=tk.LEFT)
+        id_var = tk.StringVar()
+        name_box = SearchCombobox(row, self.db, id_var, index=self.product_index, worker=self.worker, width=22)
+        name_box.pack(side=tk.LEFT, padx=3)
+        tk.Label(row, text="数量").pack(side=tk.LEFT)
+        num_var = tk.IntVar()
+        num_entry = tk.Entry(row, textvariable=num_var, width=6)
+        num_entry.pack(side=tk.LEFT, padx=3)
+        unit_var = tk.StringVar(value='箱')
+        ttk.Combobox(row, width=3, textvariable=unit_var, values=['箱', '瓶']).pack(side=tk.LEFT)
+        tk.Label(row, text="单价").pack(side=tk.LEFT)
+        price_var = tk.DoubleVar()
+        price_entry = tk.Entry(row, textvariable=price_var, width=8)
+        price_entry.pack(side=tk.LEFT, padx=3)
+        add_button = ttk.Button(row, text="添加")
+        add_button.pack(side=tk.LEFT, padx=3)
+
+        for entry in [num_entry, price_entry]:
+            entry.bind("<FocusIn>", self.on_focus_in)
+        name_box.bind_return(self.focus_next_widget)
+        num_entry.bind('<Return>', self.focus_next_widget)
+
+        row = self.init_a_row(frame, side=None)
+        tree = ttk.Treeview(
+            row,
+            columns=("商品编号", "商品名称", "数量", "单位", "单价", "总价"),
+            show='headings'
+        )
+        widths = [100, 200, 60, 50, 80, 100]
+        for i, col in enumerate(tree['columns']):
+            tree.heading(col, text=col)
+            tree.column(col, width=widths[i], minwidth=widths[i], anchor=tk.CENTER, stretch=True)
+        v_scrollbar = ttk.Scrollbar(row, orient='vertical', command=tree.yview)
+        v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        tree.configure(yscrollcommand=v_scrollbar.set)
+
+        total_var = tk.StringVar()
+        tk.Label(frame, textvariable=total_var).pack()
+
+        def refresh():
+            data = self.batch_data
+            totals = data['num'] * data['price']
+            tree.delete(*tree.get_children())
+            for i, (item, total) in enumerate(zip(data.itertuples(index=False), totals)):
+                tree.insert("", "end", iid=str(i), values=(item.id, item.name, item.num, item.unit, item.price,
+                                                          round(total, 2)))
+            total_var.set(f'共 {len(data)} 项，合计 {totals.sum():.2f} 元')
+
+        def reset_input():
+            editing['index'] = None
+            add_button.configure(text="添加")
+            name_box.set('')
+            id_var.set('')
+            num_var.set(0)
+            price_var.set(0)
+            name_box.focus()
+
+        def add_row(*args):
+            name = name_box.get()
+            product_id = id_var.get() or self.product_index.get_id(name)
+            if not product_id:
+                messagebox.showerror('错误', '未找到商品。')
+                return
+            try:
+                num, price = num_var.get(), price_var.get()
+            except tk.TclError:
+                messagebox.showerror('错误', '请输入正确的数量及价格。')
+                return
+            if num <= 0 or price < 0:
+                messagebox.showerror('错误', '请输入数量及价格。')
+                return
+            per_box = self.products.bottles_per_box(product_id)
+            # 与单条录入相同，未设置每箱瓶数的商品不能按箱录入
+            if unit_var.get() == '箱' and per_box <= 0:
+                messagebox.showerror('错误', f'商品 {name} 未设置每箱瓶数，请按瓶录入。')
+                return
+            item = [product_id, name, num, unit_var.get(), price, per_box]
+            if editing['index'] is None:
+                self.batch_data.loc[len(self.batch_data)] = item
+            else:
+                self.batch_data.loc[editing['index']] = item
+            refresh()
+            reset_input()
+
+        def edit_row(*args):
+            selection = tree.selection()
+            if not selection: return
+            index = int(selection[0])
+            item = self.batch_data.loc[index]
+            editing['index'] = index
+            name_box.set(item['name'])
+            id_var.set(item['id'])
+            num_var.set(item['num'])
+            unit_var.set(item['unit'])
+            price_var.set(item['price'])
+            add_button.configure(text="修改")
+
+        def delete_rows(*args):
+            indexes = [int(i) for i in tree.selection()]
+            self.batch_data = self.batch_data.drop(index=indexes).reset_index(drop=True)
+            refresh()
+            reset_input()
+
+        add_button.configure(command=add_row)
+        price_entry.bind('<Return>', add_row)
+        tree.bind('<Double-1>', edit_row)
+        tree.bind('<Delete>', delete_rows)
+
+        row = self.init_a_row(frame, expand=False)
+        type_var = tk.StringVar(value='in')
+        tk.Radiobutton(row, text="入库", variable=type_var, value='in').pack(side=tk.LEFT)
+        tk.Radiobutton(row, text="出库", variable=type_var, value='out').pack(side=tk.LEFT)
+        status_var = tk.BooleanVar(value=True)
+        tk.Radiobutton(row, text="已结清", variable=status_var, value=True).pack(side=tk.LEFT, padx=(20, 0))
+        tk.Radiobutton(row, text="未结清", variable=status_var, value=False).pack(side=tk.LEFT)
 
-    def show_add_product_batches(self):
-        for widget in self.main_frame.winfo_children():
-            widget.destroy()
+        def save():
+            data = self.batch_data
+            if data.empty:
+                messagebox.showerror('错误', '请先添加商品。')
+                return
+            # 按箱录入的换算为瓶，添加时已检查每箱瓶数
+            factor = data['per_box'].where(data['unit'] == '箱', 1)
+            if (factor <= 0).any():
+                messagebox.showerror('错误', '有商品未设置每箱瓶数，请按瓶录入。')
+                return
+            movements = pd.DataFrame({
+                'product_id': data['id'],
+                'bottles': (data['num'] * factor).astype('int64'),
+                'unit_price': data['price'] / factor,
+                'total_price': data['num'] * data['price'],
+                'settled': status_var.get(),
+            })
+            # 全部记录及统计在一个事务中提交
+            try:
+                count = save_movements(self.db, movements, mode=type_var.get())
+            except sqlite3.Error:
+                # 数据库错误已由 exec_sql 记录并提示
+                return
+            except Exception as e:
+                self.log(f'批量保存失败：{e}', level='error', out='all')
+                return
+            total = movements['total_price'].sum()
+            self.log(f"已批量{'入' if type_var.get() == 'in' else '出'}库 {count} 项，合计 {total:.2f} 元。", out='text')
+            messagebox.showinfo('提示', f'成功保存 {count} 条数据。')
+            self.notify_data_changed('records')
+            self.batch_data = self.batch_data.iloc[0:0]
+            refresh()
+            reset_input()
+
+        ttk.Button(row, text="删除选中", command=delete_rows).pack(side=tk.RIGHT, padx=3)
+        ttk.Button(row, text="保存", command=save).pack(side=tk.RIGHT, padx=3)
+
+        refresh()
 
-        tk.Label(self.main_frame, text="批量导入商品", font=("华文楷体", 24)).pack(pady=10)
+    def build_add_product_batches(self, frame):
 
-        path_frame = tk.Frame(self.main_frame)
+        tk.Label(frame, text="批量导入商品", font=("华文楷体", 24)).pack(pady=10)
+
+        path_frame = tk.Frame(frame)
         path_frame.pack()
-        tk.Label(path_frame, text="请选择 Excel 文件：").pack(side=tk.LEFT, padx=5)
+        tk.Label(path_frame, text="请选择 Excel / CSV 文件：").pack(side=tk.LEFT, padx=5)
         path_var = tk.StringVar()
         path_entry = tk.Entry(path_frame, textvariable=path_var, state='readonly', width=50)
         path_entry.pack(side=tk.LEFT, padx=5)
 
         def select_path():
-            path = filedialog.askopenfilename()
-            if not os.path.isfile(path) or not path.endswith('.xlsx'):
-                messagebox.showerror('错误', '请选择 Excel 文件。')
+            path = filedialog.askopenfilename(filetypes=[('Excel / CSV', '*.xlsx *.csv')])
+            if not os.path.isfile(path) or not path.lower().endswith(('.xlsx', '.csv')):
+                messagebox.showerror('错误', '请选择 Excel 或 CSV 文件。')
                 return
             path_var.set(path)
 
         path_button = tk.Button(path_frame, text="选择", command=select_path)
         path_button.pack(side=tk.LEFT, padx=5)
 
+        update_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(frame, text="更新已存在的商品", variable=update_var).pack(pady=5)
+
+        def run_import(task, path, update):
+            # 在后台线程中执行
+            result = import_products(task.db, path, update=update, progress=task.report)
+            if result['inserted'] or result['updated']:
+                self.product_index.load(task.db)
+            return result
+
+        def on_imported(result):
+            if result['inserted'] or result['updated']:
+                messagebox.showinfo(
+                    "提示",
+                    f"成功导入 {result['inserted']} 条数据，更新 {result['updated']} 条，跳过 {result['skipped']} 条。"
+                )
+            else:
+                messagebox.showinfo("提示", f"没有新的商品数据，跳过 {result['skipped']} 条。")
+
+            if result['inserted'] or result['updated']:
+                # 导入在后台连接中完成，缓存的商品信息需要重新读取
+                self.products.invalidate()
+                self.notify_data_changed('products')
+            # 清空已选择的文件
+            self.pages.reset('products')
+
         def save():
             path = path_var.get()
             if not path:
-                messagebox.showerror('错误', '请选择 Excel 文件。')
+                messagebox.showerror('错误', '请选择 Excel 或 CSV 文件。')
                 return
-            data = pd.read_excel(
-                path,
-                header=None,
-                skiprows=1,
-                names=['id', 'name', 'num'],
-                dtype={'id': str}
-            )
-            data.dropna(subset=['name', 'num'], inplace=True)
-
-            data = [
-                tuple(row) for row in data.itertuples(index=False, name=None)
-                if self.db.search(
-                    'products',
-                    (row[0], ),
-                    limit='where `id` = ?',
-                ) == ([], True)
-            ]
-            if data:
-                _, flag = self.db.insert('products', data, mode='multi')
-                if not flag: return
-                messagebox.showinfo("提示", f'成功导入 {len(data)} 条数据。')
-            else:
-                messagebox.showinfo("提示", '没有新的商品数据。')
+            self.run_task(run_import, path, update_var.get(), title='导入商品', on_done=on_imported)
 
-            self.show_add_product_batches()
-
-        export_button = tk.Button(self.main_frame, text="导入", command=save)
+        export_button = tk.Button(frame, text="导入", command=save)
         export_button.pack(pady=20)
 
     def add_new_product(self, product_id, product_name):
@@ -577,7 +821,10 @@ class App:
             product_name = product_name_entry.get()
             bottles_per_box = unit_entry.get()
 
-            self.db.insert('products', [product_id, product_name, bottles_per_box])
+            flag = self.products.add(product_id, product_name, bottles_per_box)
+            if flag:
+                self.product_index.add(product_id, product_name)
+                self.notify_data_changed('products')
             self.log(f"新增商品: {product_id} - {product_name} - {bottles_per_box}", 'info', out='all')
 
             new_product_window.destroy()
@@ -585,28 +832,111 @@ class App:
 
         tk.Button(new_product_window, text="保存", command=save).pack(pady=10)
 
-    def show_query_page(self):
-        for widget in self.main_frame.winfo_children():
-            widget.destroy()
-
-        row = self.init_a_row(expand=False)
+    def query_records(self, product_id=None, after=None, before=None, limit=-1, db=None, filters=None):
+        """
+        出入库记录与商品名称一次查出，入库总价记为负、出库数量记为负。
+        按 (时间, 类型, 编号) 倒序排列，返回 [(key, values), ...]；
+        after / before 为 key 时按键集分页，返回其后 / 其前的 limit 条；db 为后台线程的连接。
+        filters 为 parse_filters 的结果，条件均在 sql 中过滤，时间区间使用时间索引。
+        时间范围（筛选条件及分页的键）涉及已归档的年份时，同时查询对应的归档文件。
+        """
+        filters = filters or {}
+        db = db or self.db
+        start = max(filter(None, [filters.get('start'), before and before[0]]), default=None)
+        end = min(filter(None, [filters.get('end'), after and after[0]]), default=None)
+        branches, args = [], []
+        for table, direction, sign in [('in', 1, ''), ('out', 0, '-')]:
+            # 只查入库或出库时跳过另一张表
+            if filters.get('direction') not in (None, table): continue
+            sources = record_tables(db, table, start, end)
+            conditions, branch_args = [], []
+            if product_id:
+                conditions.append('r.`product_id` = ?')
+                branch_args.append(product_id)
+            for key, condition in RECORD_FILTERS:
+                if filters.get(key) is not None:
+                    conditions.append(condition.format(table=table))
+                    branch_args.append(filters[key])
+            if after is not None:
+                conditions.append(f'(r.`{table}_time`, {direction}, r.`id`) < (?, ?, ?)')
+                branch_args.extend(after)
+            if before is not None:
+                conditions.append(f'(r.`{table}_time`, {direction}, r.`id`) > (?, ?, ?)')
+                branch_args.extend(before)
+            where = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+            # 向前翻页时先正序取 limit 条
+            order = 'ASC' if before is not None else 'DESC'
+            for source in sources:
+                branches.append(f'''
+                    SELECT * FROM (
+                        SELECT r.`{table}_time` AS time, {direction} AS direction, r.`id` AS id,
+                               r.`product_id`, p.`Name`, {sign}r.`bottles`, ROUND(r.`unit_price`, 2),
+                               ROUND({'' if sign else '-'}r.`total_price`, 2),
+                               CASE WHEN r.`settled` THEN '已结清' ELSE '未结清' END
+                        FROM {source} r LEFT JOIN products p ON p.`id` = r.`product_id` {where}
+                        ORDER BY time {order}, id {order} LIMIT ?
+                    )
+                ''')
+                args.extend(branch_args + [limit])
+        order = 'ASC' if before is not None else 'DESC'
+        sql = ' UNION ALL '.join(branches) + f' ORDER BY time {order}, direction {order}, id {order} LIMIT ?'
+        result, _ = db.exec_sql(sql, args + [limit])
+        if before is not None:
+            result.reverse()
+        return [(tuple(row[:3]), row[3:]) for row in result]
+
+    def build_query_page(self, frame):
+
+        row = self.init_a_row(frame, expand=False)
         tk.Label(row, text="搜索", font=("华文楷体", 24)).pack(pady=10)
 
-        row = self.init_a_row(expand=False)
+        row = self.init_a_row(frame, expand=False)
         search_frame = tk.Frame(row)
         search_frame.pack(pady=10)
         tk.Label(search_frame, text="关键词：").pack(side=tk.LEFT)
 
-        box = SearchCombobox(search_frame, self.db, width=50)
+        box = SearchCombobox(search_frame, self.db, index=self.product_index, worker=self.worker, width=50)
         box.pack(side=tk.LEFT)
 
         search_button = tk.Button(search_frame, text="搜索")
         search_button.pack(side=tk.LEFT, padx=5)
 
-        row = self.init_a_row(side=None)
-
-        tree = ttk.Treeview(
+        # 筛选条件，输入后延时查询
+        filter_vars = {key: tk.StringVar() for key in
+                       ['start', 'end', 'min_price', 'max_price', 'min_bottles', 'max_bottles']}
+        filter_vars['direction'] = tk.StringVar(value='全部')
+        filter_vars['settled'] = tk.StringVar(value='全部')
+
+        row = self.init_a_row(frame, expand=False, fill=None)
+        tk.Label(row, text="日期：").pack(side=tk.LEFT)
+        tk.Entry(row, textvariable=filter_vars['start'], width=11).pack(side=tk.LEFT)
+        tk.Label(row, text="至").pack(side=tk.LEFT, padx=3)
+        tk.Entry(row, textvariable=filter_vars['end'], width=11).pack(side=tk.LEFT)
+        tk.Label(row, text="类型：").pack(side=tk.LEFT, padx=(15, 0))
+        ttk.Combobox(row, width=5, textvariable=filter_vars['direction'], values=['全部', '入库', '出库'],
+                     state='readonly').pack(side=tk.LEFT)
+        tk.Label(row, text="结算：").pack(side=tk.LEFT, padx=(15, 0))
+        ttk.Combobox(row, width=6, textvariable=filter_vars['settled'], values=['全部', '已结清', '未结清'],
+                     state='readonly').pack(side=tk.LEFT)
+
+        row = self.init_a_row(frame, expand=False, fill=None)
+        tk.Label(row, text="单价（瓶）：").pack(side=tk.LEFT)
+        tk.Entry(row, textvariable=filter_vars['min_price'], width=8).pack(side=tk.LEFT)
+        tk.Label(row, text="至").pack(side=tk.LEFT, padx=3)
+        tk.Entry(row, textvariable=filter_vars['max_price'], width=8).pack(side=tk.LEFT)
+        tk.Label(row, text="数量（瓶）：").pack(side=tk.LEFT, padx=(15, 0))
+        tk.Entry(row, textvariable=filter_vars['min_bottles'], width=8).pack(side=tk.LEFT)
+        tk.Label(row, text="至").pack(side=tk.LEFT, padx=3)
+        tk.Entry(row, textvariable=filter_vars['max_bottles'], width=8).pack(side=tk.LEFT)
+        status_var = tk.StringVar()
+        tk.Label(row, textvariable=status_var, fg='red').pack(side=tk.LEFT, padx=10)
+
+        row = self.init_a_row(frame, side=None)
+
+        tree = VirtualTreeview(
             row,
+            page_size=100,
+            worker=self.worker,
             columns=("时间", "商品编号", "商品名称", "数量", "单价（瓶）", "总价", "是否结清"),
             show='headings'
         )
@@ -629,70 +959,114 @@ class App:
         tree.configure(xscrollcommand=h_scrollbar.set, yscrollcommand=v_scrollbar.set)
 
         def search_data(*args):
+            try:
+                filters = parse_filters({key: var.get() for key, var in filter_vars.items()})
+            except ValueError:
+                # 输入尚未完成时不查询
+                status_var.set('筛选条件格式有误')
+                return
+            status_var.set('')
             kw = box.get()
-            if not kw:
-                result, _ = self.db.union_search(
-                    'in_records',
-                    'out_records',
-                    field1='*, 1',
-                    field2='*, -1'
-                )
-            else:
-                product_id, _ = self.db.search(
-                    'products',
-                    (kw, kw),
-                    field='id',
-                    limit='where `id` = ? or `Name` = ?'
-                )
-                if not product_id:
+            product_id = None
+            if kw:
+                product_id = self.product_index.get_id(kw)
+            if kw and product_id is None:
+                product = self.products.find(kw)
+                if product is None:
                     messagebox.showerror('错误', '未找到商品。')
                     return
-                result, _ = self.db.union_search(
-                    'in_records',
-                    'out_records',
-                    (product_id[0][0], product_id[0][0]),
-                    field1='*, 1',
-                    field2='*, -1',
-                    limit='where `product_id` = ?'
-                )
-            columns = self.db.get_column_names('in_records')
-            columns[1] = 'time'
-            columns.append('weight')
-            result = pd.DataFrame(result, columns=columns).round(2)
-            result.drop('id', axis=1)
-            result = result.sort_values(by=['time'], ascending=False)
-            result['bottles'] = result['bottles'] * result['weight']
-            result['total_price'] = -1 * result['total_price'] * result['weight']
-
-            # 删除 Treeview 中的所有行
-            for row in tree.get_children():
-                tree.delete(row)
-
-            # 将查询结果插入到 Treeview 中
-            for row in result.itertuples():
-                row = list(row)[2:-1]
-                name = self.db.search(
-                    'products',
-                    (row[1], ),
-                    field='Name',
-                    limit='WHERE `id` = ?'
-                )[0][0][0]
-                row.insert(2, name)
-                row[-1] = '已结清' if row[-1] else '未结清'
-                tree.insert("", "end", values=row)
+                product_id = product[0]
+            # 在后台线程中随滚动分页加载查询结果，重新查询时取消尚未完成的查询
+            tree.reload(lambda **kwargs: self.query_records(product_id, filters=filters, **kwargs))
+
+        pending = {'after_id': None}
+
+        def on_filter_change(*args):
+            # 连续输入时只在停止输入 300 ms 后查询一次
+            if pending['after_id'] is not None:
+                frame.after_cancel(pending['after_id'])
+            pending['after_id'] = frame.after(300, search_filters)
+
+        def search_filters():
+            pending['after_id'] = None
+            search_data()
+
+        for var in filter_vars.values():
+            var.trace_add('write', on_filter_change)
 
         box.set_select_func(search_data)
         box.bind_return(search_data)
         search_button['command'] = search_data
         search_data()
+        # 数据变化时按当前关键词重新查询
+        return search_data
 
-    def show_export_page(self):
-        for widget in self.main_frame.winfo_children():
-            widget.destroy()
+    def build_stock_page(self, frame):
 
-        tk.Label(self.main_frame, text="导出数据", font=("华文楷体", 24)).pack(pady=10)
+        row = self.init_a_row(frame, expand=False)
+        tk.Label(row, text="库存状况", font=("华文楷体", 24)).pack(pady=10)
 
-        path_frame = self.init_a_row(expand=False, fill=None)
+        total_var = tk.StringVar()
+        row = self.init_a_row(frame, expand=False)
+        tk.Label(row, textvariable=total_var).pack()
+
+        row = self.init_a_row(frame, side=None)
+        tree = ttk.Treeview(
+            row,
+            columns=("商品编号", "商品名称", "库存（瓶）", "均价（瓶）", "总价"),
+            show='headings'
+        )
+
+        def fill(rows):
+            tree.delete(*tree.get_children())
+            for item in rows:
+                tree.insert("", "end", values=item)
+
+        stock = []
+        order = {'column': None, 'reverse': False}
+
+        def sort_stock():
+            i = order['column']
+            if i is not None:
+                # 编号、名称两列为文本，其余为数字；空值排在最后，且不与其他值直接比较
+                empty = '' if i < 2 else 0
+                stock.sort(key=lambda item: (item[i] is None, empty if item[i] is None else item[i]),
+                           reverse=order['reverse'])
+            fill(stock)
+
+        def sort_by(i):
+            # 再次点击同一列时倒序
+            order['reverse'] = not order['reverse'] if order['column'] == i else False
+            order['column'] = i
+            sort_stock()
+
+        def refresh():
+            # 库存表随出入库增量维护，这里只需按商品读取，保持当前排序
+            stock[:] = get_stock(self.db)
+            total = sum(item[4] for item in stock)
+            total_var.set(f'库存总金额：{total:.2f} 元，共 {len(stock)} 种商品')
+            sort_stock()
+
+        widths = [120, 200, 100, 100, 120]
+        for i, col in enumerate(tree['columns']):
+            tree.heading(col, text=col, command=lambda i=i: sort_by(i))
+            tree.column(col, width=widths[i], minwidth=widths[i], anchor=tk.CENTER, stretch=True)
+
+        v_scrollbar = ttk.Scrollbar(row, orient='vertical', command=tree.yview)
+        v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        tree.configure(yscrollcommand=v_scrollbar.set)
+
+        refresh()
+        return refresh
+
+    def build_export_page(self, frame):
+
+        from tkcalendar import DateEntry
+
+        tk.Label(frame, text="导出数据", font=("华文楷体", 24)).pack(pady=10)
+
+        path_frame = self.init_a_row(frame, expand=False, fill=None)
         tk.Label(path_frame, text="请输入要保存的路径:").pack(side=tk.LEFT, padx=5)
         path_var = tk.StringVar()
         path_entry = tk.Entry(path_frame, textvariable=path_var, state='readonly', width=50)
@@ -706,7 +1080,7 @@ class App:
         path_button.pack(side=tk.LEFT, padx=5)
 
         # 创建时间框架
-        time_frame = self.init_a_row(expand=False, fill=None)
+        time_frame = self.init_a_row(frame, expand=False, fill=None)
         today = datetime.today()
         # 添加开始时间标签
         tk.Label(time_frame, text="开始时间：").pack(side=tk.LEFT, padx=5)
@@ -721,23 +1095,23 @@ class App:
         # 将结束时间选择器放置在时间框架中
         end_time_entry.pack(side=tk.LEFT)
 
-        def export_one_table(name, start_time, end_time, keep_dir):
-            try:
-                table = f'{name}_records'
-                records, _ = self.db.search(
-                    table,
-                    (start_time, end_time),
-                    limit=f'WHERE `{name}_time` BETWEEN ? AND ?'
+        # 导出格式
+        format_frame = self.init_a_row(frame, expand=False, fill=None)
+        tk.Label(format_frame, text="导出格式：").pack(side=tk.LEFT, padx=5)
+        format_var = tk.StringVar(value='xlsx')
+        tk.Radiobutton(format_frame, text="Excel", variable=format_var, value='xlsx').pack(side=tk.LEFT)
+        tk.Radiobutton(format_frame, text="CSV", variable=format_var, value='csv').pack(side=tk.LEFT)
+
+        def export_tables(task, start_time, end_time, keep_dir, fmt):
+            # 在后台线程中分批读取并写入文件
+            for name, label in [('in', '入'), ('out', '出')]:
+                export_records(
+                    task.db, name, start_time, end_time, keep_dir, fmt=fmt,
+                    progress=lambda done, total, label=label: task.report(
+                        done, total, f'正在导出{label}库记录：{done}/{total}'
+                    )
                 )
-
-                columns = ['', '时间', '商品编号', '数量（瓶）', '单价（瓶）', '总价', '是否结清']
-                records = pd.DataFrame(records, columns=columns)
-                records['是否结清'].map({0: '未结清', 1: '已结清'})
-                records.to_excel(os.path.join(keep_dir, f'{name}.xlsx'), index=False)
-                return True
-            except Exception as e:
-                messagebox.showerror('错误', str(e))
-                return False
+            return True
 
         def export_data():
             path = path_var.get()
@@ -752,21 +1126,104 @@ class App:
 
             search_end_time = datetime.strptime(end_time, '%Y-%m-%d')
             search_end_time = (search_end_time + timedelta(days=1)).strftime('%Y-%m-%d')
-            flag = export_one_table('in', start_time, search_end_time, keep_dir)
-            if not flag: return
-            flag = export_one_table('out', start_time, search_end_time, keep_dir)
-            if not flag: return
-
-            messagebox.showinfo("提示", f'{start_time} 到 {end_time} 的数据已导出到 "{path}"。')
+            self.run_task(
+                export_tables, start_time, search_end_time, keep_dir, format_var.get(),
+                title='导出数据',
+                on_done=lambda _: messagebox.showinfo("提示", f'{start_time} 到 {end_time} 的数据已导出到 "{path}"。')
+            )
 
-        export_button = tk.Button(self.main_frame, text="导出", command=export_data)
+        export_button = tk.Button(frame, text="导出", command=export_data)
         export_button.pack(pady=20)
 
+    def build_diagnostics_page(self, frame):
+        tk.Label(frame, text="诊断", font=("华文楷体", 24)).pack(pady=10)
+
+        summary_var = tk.StringVar()
+        row = self.init_a_row(frame, expand=False)
+        tk.Label(row, textvariable=summary_var, anchor='w').pack(side=tk.LEFT)
+
+        row = self.init_a_row(frame)
+        tree = ttk.Treeview(
+            row,
+            columns=("语句", "次数", "总耗时", "平均", "P95≤", "最大", "行数", "错误"),
+            show='headings',
+            height=8
+        )
+        widths = [330, 50, 70, 60, 50, 60, 60, 40]
+        for i, col in enumerate(tree['columns']):
+            tree.heading(col, text=col)
+            tree.column(col, width=widths[i], minwidth=widths[i], anchor=tk.W if i == 0 else tk.CENTER,
+                        stretch=i == 0)
+        v_scrollbar = ttk.Scrollbar(row, orient='vertical', command=tree.yview)
+        v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        tree.configure(yscrollcommand=v_scrollbar.set)
+
+        # 慢查询及其查询计划
+        row = self.init_a_row(frame)
+        slow_text = tk.Text(row, height=6)
+        slow_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar = tk.Scrollbar(row, orient='vertical', command=slow_text.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        slow_text.config(yscrollcommand=scrollbar.set, state='disabled')
+
+        def refresh():
+            data = QUERY_STATS.to_dict()
+            summary_var.set(
+                f"自 {data['since']} 起：{len(data['statements'])} 类语句，返回 {data['rows']} 行，"
+                f"提交 {data['commits']} 次，错误 {data['errors']} 次，慢查询阈值 {data['slow_ms']} ms"
+            )
+            tree.delete(*tree.get_children())
+            for item in QUERY_STATS.summary():
+                tree.insert("", "end", values=item)
+            slow_text.config(state='normal')
+            slow_text.delete('1.0', tk.END)
+            for item in reversed(data['slow_queries']):
+                plan = '\n'.join(f'    {line}' for line in item['plan'])
+                slow_text.insert(tk.END, f"{item['time']}  {item['ms']} ms  {item['sql']}  {item['args']}\n{plan}\n")
+            slow_text.config(state='disabled')
+
+        def export():
+            path = filedialog.asksaveasfilename(defaultextension='.json', initialfile='query_stats.json',
+                                                filetypes=[('JSON', '*.json')])
+            if not path: return
+            QUERY_STATS.save(path)
+            self.log(f'诊断数据已导出到 "{path}"。', out='text')
+
+        def reset():
+            QUERY_STATS.reset()
+            refresh()
+
+        row = self.init_a_row(frame, expand=False)
+        ttk.Button(row, text="清空", command=reset).pack(side=tk.RIGHT, padx=3)
+        ttk.Button(row, text="导出", command=export).pack(side=tk.RIGHT, padx=3)
+        ttk.Button(row, text="刷新", command=refresh).pack(side=tk.RIGHT, padx=3)
+
+        return refresh
+
+    def on_sales_ingested(self, results):
+        for path, result in results:
+            if result.get('error'):
+                self.log(f"导入 {os.path.basename(path)} 失败：{result['error']}，修改文件后将重新导入。",
+                         level='warning', out='text')
+                continue
+            self.log(f"已导入 {os.path.basename(path)}：新增 {result['inserted']} 条出库记录，"
+                     f"跳过 {result['skipped']} 条。", out='text')
+        if any(result['inserted'] for _, result in results):
+            self.notify_data_changed('records')
+
     def on_closing(self):
-        # 关闭数据库连接
+        # 停止后台线程并关闭数据库连接
+        if self.watcher is not None: self.watcher.stop()
+        self.worker.close()
         self.db.close()
+        # 写出缓冲的日志
+        self.recorder.close()
         # 销毁窗口
         self.root.destroy()
 
 if __name__ == "__main__":
-    app = App(menu_style='list')
\ No newline at end of file
+    # --startup-report 时将启动耗时写入 startup.json 并打印；--watch 目录 时定时导入该目录中的销售文件
+    watch_folder = sys.argv[sys.argv.index('--watch') + 1] if '--watch' in sys.argv[:-1] else None
+    app = App(menu_style='list', startup_report='startup.json' if '--startup-report' in sys.argv else None,
+              watch_folder=watch_folder)
\ No newline at end of file
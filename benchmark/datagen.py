@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : datagen.py
+
+# 生成用于性能测试的数据库：N 个中文名称的商品，M 条分布在若干年内的出入库记录。
+# 同样的参数及随机种子生成同样的数据，便于不同版本之间比较。
+
+import csv
+import random
+from datetime import datetime, timedelta
+
+from utils import SqliteOperation, migrate, rebuild_statistics
+
+BRANDS = [
+    '青岛', '雪花', '百威', '哈尔滨', '燕京', '珠江', '茅台', '五粮液', '泸州老窖', '汾酒', '洋河', '剑南春',
+    '郎酒', '西凤', '张裕', '长城', '农夫山泉', '怡宝', '康师傅', '统一', '可口可乐', '百事', '王老吉', '加多宝',
+    '娃哈哈', '元气森林', '东鹏', '红牛', '椰树', '北冰洋',
+]
+KINDS = [
+    '啤酒', '纯生', '精酿', '干红', '干白', '白酒', '黄酒', '矿泉水', '纯净水', '绿茶', '冰红茶', '乌龙茶',
+    '可乐', '雪碧', '橙汁', '凉茶', '苏打水', '椰汁', '功能饮料', '气泡水',
+]
+SPECS = ['250ml', '330ml', '500ml', '550ml', '600ml', '750ml', '1L', '1.25L', '1.5L', '2L']
+PACKS = ['', '罐装', '瓶装', '听装', '礼盒']
+BOTTLES_PER_BOX = [6, 12, 15, 20, 24]
+
+
+def product_names(count, rng):
+    # 品牌、品类、规格、包装组合，重复时追加编号
+    names, seen = [], set()
+    while len(names) < count:
+        name = rng.choice(BRANDS) + rng.choice(KINDS) + rng.choice(SPECS) + rng.choice(PACKS)
+        if name in seen:
+            name = f'{name}{len(names)}'
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def make_products(count, seed=0):
+    # [(编号, 名称, 每箱瓶数), ...]
+    rng = random.Random(seed)
+    return [
+        (f'P{i:06d}', name, rng.choice(BOTTLES_PER_BOX))
+        for i, name in enumerate(product_names(count, rng))
+    ]
+
+
+def make_records(products, count, years=3, end=None, seed=0):
+    """
+    生成 count 条出入库记录，约 40% 入库、60% 出库，时间均匀分布在 end 之前的 years 年内。
+    返回 (入库记录, 出库记录)，每条为 (时间, 商品编号, 瓶数, 单价, 总价, 是否结清)。
+    """
+    rng = random.Random(seed)
+    end = end or datetime(2024, 12, 31, 23, 59, 59)
+    span = int(timedelta(days=365 * years).total_seconds())
+    # 成本价按商品固定，出库在成本上加价
+    costs = {product_id: round(rng.uniform(1, 80), 2) for product_id, _, _ in products}
+    ids = [product_id for product_id, _, _ in products]
+    in_rows, out_rows = [], []
+    for _ in range(count):
+        product_id = rng.choice(ids)
+        time = (end - timedelta(seconds=rng.randrange(span))).strftime('%Y-%m-%d %H:%M:%S')
+        bottles = rng.randint(1, 120)
+        is_in = rng.random() < 0.4
+        unit_price = round(costs[product_id] * (1 if is_in else rng.uniform(1.05, 1.5)), 2)
+        row = (time, product_id, bottles, unit_price, round(bottles * unit_price, 2), int(rng.random() < 0.8))
+        (in_rows if is_in else out_rows).append(row)
+    return in_rows, out_rows
+
+
+def generate(path, recorder, products=1000, records=100000, years=3, seed=0):
+    """
+    生成数据库并重新计算统计，返回 (db, 商品列表)。
+    """
+    db = SqliteOperation(path, recorder)
+    migrate(db)
+    db.exec_sql('PRAGMA journal_mode=WAL')
+    items = make_products(products, seed)
+    in_rows, out_rows = make_records(items, records, years=years, seed=seed)
+    with db.transaction():
+        db.insert('products', items, keywords=['id', 'Name', 'BottlesPerBox'], mode='multi')
+        for name, rows in [('in', in_rows), ('out', out_rows)]:
+            db.insert(
+                f'{name}_records', rows, mode='multi',
+                keywords=[f'{name}_time', 'product_id', 'bottles', 'unit_price', 'total_price', 'settled']
+            )
+    rebuild_statistics(db)
+    return db, items
+
+
+def write_product_file(path, products):
+    # 与批量导入商品的文件格式相同：表头后依次为商品编号、商品名称、每箱瓶数
+    header = ['商品编号', '商品名称', '每箱瓶数']
+    if path.endswith('.csv'):
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(products)
+        return path
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(header)
+    for row in products:
+        sheet.append(list(row))
+    workbook.save(path)
+    return path
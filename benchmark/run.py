@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : run.py
+
+# 性能测试：生成数据库后依次计时各常用操作，结果写入 json，便于不同版本之间比较。
+# 不创建窗口，界面相关的方法以替身对象调用。
+#
+#     python -m benchmark.run --products 5000 --records 200000 --output benchmark.json
+#     python -m benchmark.run --compare old.json
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime
+
+from utils import Record, ProductIndex, update_statistics, rebuild_statistics, get_stock, get_daily_profit, \
+    import_products, export_records, save_movements
+from benchmark.datagen import generate, make_products, write_product_file
+
+CASES = []
+
+
+def case(name, repeat=None):
+    # 注册测试项，repeat 为 None 时使用命令行指定的次数
+    def decorator(func):
+        CASES.append((name, func, repeat))
+        return func
+    return decorator
+
+
+def measure(func, repeat):
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(timings):
+    return {
+        'n': len(timings),
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'max_ms': round(max(timings), 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def keywords(ctx, count):
+    # 从商品名称中截取 1~3 个字作为输入的关键词
+    rng = random.Random(ctx.seed)
+    result = []
+    for _ in range(count):
+        name = rng.choice(ctx.products)[1]
+        start = rng.randrange(len(name))
+        result.append(name[start:start + rng.randint(1, 3)])
+    return result
+
+
+def query_stub(ctx):
+    # App.query_records 只用到 self.db
+    return types.SimpleNamespace(db=ctx.db)
+
+
+@case('sql.search_product_by_id')
+def bench_search(ctx, repeat):
+    ids = [ctx.rng.choice(ctx.products)[0] for _ in range(repeat)]
+    return measure(lambda i: ctx.db.search('products', where={'id': ids[i]}), repeat)
+
+
+@case('index.load', repeat=3)
+def bench_index_load(ctx, repeat):
+    return measure(lambda i: ProductIndex().load(ctx.db), repeat)
+
+
+@case('suggestions.index')
+def bench_suggestions_index(ctx, repeat):
+    from app import SearchCombobox
+
+    index = ProductIndex()
+    index.load(ctx.db)
+    kws = keywords(ctx, repeat)
+    shown = []
+    # 用替身对象代替 Tk 组件调用 show_suggestions
+    stub = types.SimpleNamespace(
+        db=ctx.db, index=index, worker=None, task=None, last_text='',
+        update_suggestions=lambda kw, names: shown.append(len(names))
+    )
+    def run(i):
+        stub.get = lambda: kws[i]
+        SearchCombobox.show_suggestions(stub)
+    return measure(run, repeat)
+
+
+@case('suggestions.sql_like')
+def bench_suggestions_sql(ctx, repeat):
+    from app import SearchCombobox
+
+    kws = keywords(ctx, repeat)
+    return measure(lambda i: SearchCombobox.search_names(ctx.db, kws[i]), repeat)
+
+
+@case('query.first_page')
+def bench_query_first_page(ctx, repeat):
+    from app import App
+
+    stub = query_stub(ctx)
+    return measure(lambda i: App.query_records(stub, limit=100), repeat)
+
+
+@case('query.product_page')
+def bench_query_product_page(ctx, repeat):
+    from app import App
+
+    stub = query_stub(ctx)
+    ids = [ctx.rng.choice(ctx.products)[0] for _ in range(repeat)]
+    return measure(lambda i: App.query_records(stub, ids[i], limit=100), repeat)
+
+
+@case('query.filtered_month')
+def bench_query_filtered(ctx, repeat):
+    from app import App, parse_filters
+
+    stub = query_stub(ctx)
+    filters = parse_filters({'start': '2024-03-01', 'end': '2024-03-31', 'direction': '出库',
+                             'settled': '已结清', 'min_price': '10', 'max_bottles': '60'})
+    return measure(lambda i: App.query_records(stub, limit=100, filters=filters), repeat)
+
+
+@case('query.scroll_20_pages', repeat=5)
+def bench_query_scroll(ctx, repeat):
+    from app import App
+
+    stub = query_stub(ctx)
+
+    def run(i):
+        rows = App.query_records(stub, limit=100)
+        for _ in range(19):
+            if len(rows) < 100: break
+            rows = App.query_records(stub, after=rows[-1][0], limit=100)
+    return measure(run, repeat)
+
+
+@case('stats.daily_profit_year')
+def bench_daily_profit(ctx, repeat):
+    return measure(lambda i: get_daily_profit(ctx.db, '2024-01-01', '2024-12-31'), repeat)
+
+
+@case('stats.stock')
+def bench_stock(ctx, repeat):
+    return measure(lambda i: get_stock(ctx.db), repeat)
+
+
+@case('stats.save_one_record')
+def bench_update_statistics(ctx, repeat):
+    # 与 App.save_data 相同：记录与统计在一个事务中提交
+    ids = [ctx.rng.choice(ctx.products)[0] for _ in range(repeat)]
+    columns = ['product_id', 'bottles', 'unit_price', 'total_price', 'settled']
+
+    def run(i):
+        data = [ids[i], 12, 3.5, 42.0, True]
+        with ctx.db.transaction():
+            ctx.db.insert('out_records', data, keywords=columns)
+            update_statistics(ctx.db, *data, mode='out')
+    return measure(run, repeat)
+
+
+@case('stats.save_batch_100', repeat=10)
+def bench_save_movements(ctx, repeat):
+    import pandas as pd
+
+    def run(i):
+        rows = [ctx.rng.choice(ctx.products)[0] for _ in range(100)]
+        data = pd.DataFrame({'product_id': rows, 'bottles': 24, 'unit_price': 2.5, 'total_price': 60.0,
+                             'settled': True})
+        save_movements(ctx.db, data, mode='in')
+    return measure(run, repeat)
+
+
+@case('stats.rebuild', repeat=1)
+def bench_rebuild(ctx, repeat):
+    return measure(lambda i: rebuild_statistics(ctx.db), repeat)
+
+
+@case('import.csv_new', repeat=1)
+def bench_import_csv(ctx, repeat):
+    # 编号与已有商品不重复，全部新增
+    items = [(f'N{product_id}', name, num) for product_id, name, num in make_products(len(ctx.products), ctx.seed + 1)]
+    path = write_product_file(os.path.join(ctx.tmp, 'products.csv'), items)
+    return measure(lambda i: import_products(ctx.db, path), repeat)
+
+
+@case('import.xlsx_update', repeat=1)
+def bench_import_xlsx(ctx, repeat):
+    path = write_product_file(os.path.join(ctx.tmp, 'products.xlsx'), ctx.products)
+    return measure(lambda i: import_products(ctx.db, path, update=True), repeat)
+
+
+@case('export.csv_year', repeat=1)
+def bench_export_csv(ctx, repeat):
+    return measure(lambda i: export_records(ctx.db, 'out', '2024-01-01', '2025-01-01', ctx.tmp, fmt='csv'), repeat)
+
+
+@case('export.xlsx_year', repeat=1)
+def bench_export_xlsx(ctx, repeat):
+    return measure(lambda i: export_records(ctx.db, 'out', '2024-01-01', '2025-01-01', ctx.tmp, fmt='xlsx'), repeat)
+
+
+def run(args):
+    tmp = args.keep or tempfile.mkdtemp(prefix='inventory-benchmark-')
+    os.makedirs(tmp, exist_ok=True)
+    recorder = Record(log_file=os.path.join(tmp, 'benchmark.log'))
+    recorder.set_level(args.log_level)
+
+    start = time.perf_counter()
+    db, products = generate(os.path.join(tmp, 'benchmark.db'), recorder, products=args.products,
+                            records=args.records, years=args.years, seed=args.seed)
+    generate_ms = (time.perf_counter() - start) * 1000
+    ctx = types.SimpleNamespace(db=db, products=products, tmp=tmp, seed=args.seed, rng=random.Random(args.seed))
+
+    results = {}
+    for name, func, repeat in CASES:
+        if args.only and not any(name.startswith(prefix) for prefix in args.only): continue
+        try:
+            results[name] = summarize(func(ctx, repeat or args.repeat))
+        except ImportError as e:
+            # 缺少 pandas / openpyxl 等可选依赖时跳过
+            results[name] = {'skipped': str(e)}
+        print(f'{name:<28}' + (f"{results[name]['median_ms']:>10.3f} ms" if 'median_ms' in results[name]
+                                 else f"  skipped: {results[name]['skipped']}"), flush=True)
+
+    db.close()
+    recorder.close()
+    if not args.keep: shutil.rmtree(tmp, ignore_errors=True)
+    return {
+        'meta': {
+            'revision': git_revision(),
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'products': args.products,
+            'records': args.records,
+            'years': args.years,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'generate_ms': round(generate_ms, 1),
+            'data_dir': tmp if args.keep else None,
+        },
+        'results': results,
+    }
+
+
+def compare(old, new):
+    # 按中位数比较，ratio < 1 表示变快
+    lines = [f"{'case':<28}{'old ms':>12}{'new ms':>12}{'ratio':>8}"]
+    keys = ['products', 'records', 'years', 'seed']
+    if [old['meta'].get(key) for key in keys] != [new['meta'].get(key) for key in keys]:
+        lines.insert(0, 'Warning: data sizes differ, results are not directly comparable.')
+    for name, result in new['results'].items():
+        before = old['results'].get(name, {})
+        if 'median_ms' not in result or 'median_ms' not in before:
+            continue
+        ratio = result['median_ms'] / before['median_ms'] if before['median_ms'] else float('inf')
+        lines.append(f"{name:<28}{before['median_ms']:>12.3f}{result['median_ms']:>12.3f}{ratio:>8.2f}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark inventory hot paths on a generated database.')
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=50, help='default repetitions per case')
+    parser.add_argument('--only', nargs='*', help='run only cases starting with these prefixes')
+    parser.add_argument('--log-level', default='info', help='sql log level, "info" matches the app')
+    parser.add_argument('--keep', help='generate data in this directory and keep it')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', help='previous result file to compare with')
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f'Results written to {args.output}.')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print(compare(json.load(f), result))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : cli.py
+
+# 命令行入口，无需界面即可批量写入及维护数据：
+#     python cli.py ingest pos-2024-06-01.csv --mode out
+#     python cli.py export --start 2024-01-01 --end 2024-06-30 --dir exports --format csv
+#     python cli.py watch D:/pos --interval 60
+#     python cli.py archive --before 2024-01 --vacuum
+#     python cli.py rebuild-stats
+#     python cli.py report --start 2024-06-01 --end 2024-06-30
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+
+from utils.service import InventoryService
+from utils.watcher import scan_folder
+
+
+def ingest(service, args):
+    total = {'rows': 0, 'inserted': 0, 'skipped': 0, 'seconds': 0}
+    for path in args.files:
+        result = service.ingest_csv(
+            path, mode=args.mode, batch_size=args.batch_size,
+            progress=lambda rows, path=path: print(f'{path}: {rows} rows', file=sys.stderr, end='\r')
+        )
+        rate = result['inserted'] / result['seconds'] if result['seconds'] else 0
+        print(f"{path}: {result['inserted']} inserted, {result['skipped']} skipped, "
+              f"{result['seconds']:.2f} s ({rate:.0f} rows/s)")
+        for key in total:
+            total[key] += result[key]
+    return 0 if total['rows'] else 1
+
+
+def export(service, args):
+    # 与界面相同，结束日期包含当天
+    end = (datetime.strptime(args.end, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    result = service.export(args.start, end, args.dir, fmt=args.format, names=args.type)
+    for name, count in result.items():
+        print(f'{name}: {count} rows exported to {args.dir}')
+    return 0
+
+
+def watch(service, args):
+    # 轮询目录，--once 时只处理一次，有文件导入失败时返回 1
+    while True:
+        failed = False
+        for path, result in scan_folder(service, args.folder, pattern=args.pattern, mode=args.mode,
+                                        settle=args.settle, batch_size=args.batch_size):
+            if result.get('error'):
+                failed = True
+                print(f"{path}: failed, {result['error']}", file=sys.stderr)
+            else:
+                print(f"{path}: {result['inserted']} inserted, {result['skipped']} skipped")
+        if args.once: return 1 if failed else 0
+        try:
+            time.sleep(args.interval)
+        except KeyboardInterrupt:
+            return 0
+
+
+def archive(service, args):
+    moved = service.archive(before=args.before, keep_months=args.keep_months, vacuum=args.vacuum)
+    for year, (in_rows, out_rows) in moved.items():
+        print(f'{year}: {in_rows} in records, {out_rows} out records archived')
+    if not moved:
+        print('Nothing to archive.')
+    return 0
+
+
+def rebuild_stats(service, args):
+    days = service.rebuild_statistics()
+    print(f'Rebuilt {days} daily statistics rows.')
+    return 0
+
+
+def report(service, args):
+    result = service.report(args.start, args.end)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+    print(f"区间：{result['start']} ~ {result['end']}")
+    for name, label in [('in', '入库'), ('out', '出库')]:
+        item = result[name]
+        print(f"{label}：{item['records']} 笔，{item['bottles']} 瓶，{item['amount']:.2f} 元")
+    print(f"利润：{result['profit']:.2f} 元")
+    print(f"库存：{result['stock']['products']} 种商品，总金额 {result['stock']['value']:.2f} 元")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Inventory management command line tools.')
+    parser.add_argument('--db', default='data.db', help='database file (default: data.db)')
+    parser.add_argument('--log-file', default='process.log')
+    parser.add_argument('--log-level', default='warning', help='sql log level, info logs every statement')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('ingest', help='load in/out records from csv files')
+    command.add_argument('files', nargs='+')
+    command.add_argument('--mode', choices=['in', 'out'], help='direction when the file has no type column')
+    command.add_argument('--batch-size', type=int, default=5000)
+    command.set_defaults(func=ingest)
+
+    command = commands.add_parser('export', help='export in/out records of a date range')
+    command.add_argument('--start', required=True, help='YYYY-MM-DD')
+    command.add_argument('--end', required=True, help='YYYY-MM-DD, inclusive')
+    command.add_argument('--dir', required=True)
+    command.add_argument('--format', choices=['xlsx', 'csv'], default='xlsx')
+    command.add_argument('--type', nargs='+', choices=['in', 'out'], default=['in', 'out'])
+    command.set_defaults(func=export)
+
+    command = commands.add_parser('watch', help='poll a folder and ingest new POS sales files')
+    command.add_argument('folder')
+    command.add_argument('--pattern', default='*.csv')
+    command.add_argument('--mode', choices=['in', 'out'], default='out')
+    command.add_argument('--interval', type=float, default=30, help='seconds between scans')
+    command.add_argument('--settle', type=float, default=5, help='skip files modified within this many seconds')
+    command.add_argument('--batch-size', type=int, default=5000)
+    command.add_argument('--once', action='store_true', help='scan once and exit')
+    command.set_defaults(func=watch)
+
+    command = commands.add_parser('archive', help='move records of closed months into per-year archive files')
+    command.add_argument('--before', help='YYYY-MM, archive records before this month')
+    command.add_argument('--keep-months', type=int, default=12,
+                         help='months kept besides the current one when --before is not given (default: 12)')
+    command.add_argument('--vacuum', action='store_true', help='compact the database afterwards')
+    command.set_defaults(func=archive)
+
+    command = commands.add_parser('rebuild-stats', help='recompute statistics and stock from all records')
+    command.set_defaults(func=rebuild_stats)
+
+    command = commands.add_parser('report', help='summary of records, profit and stock')
+    command.add_argument('--start', help='YYYY-MM-DD')
+    command.add_argument('--end', help='YYYY-MM-DD, inclusive')
+    command.add_argument('--json', action='store_true')
+    command.set_defaults(func=report)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    service = InventoryService.open(args.db, log_file=args.log_file, log_level=args.log_level)
+    try:
+        return args.func(service, args)
+    except (OSError, ValueError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 2
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
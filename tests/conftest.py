@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : conftest.py
+
+import pytest
+
+from utils import InventoryService, SqliteOperation, Record, migrate
+
+
+@pytest.fixture
+def db(tmp_path):
+    # 已升级到最新版本的空数据库
+    recorder = Record(log_file=str(tmp_path / 'process.log'), headless=True)
+    db = SqliteOperation(str(tmp_path / 'data.db'), recorder)
+    migrate(db)
+    yield db
+    db.close()
+    recorder.close()
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = InventoryService.open(str(tmp_path / 'data.db'), log_file=str(tmp_path / 'process.log'),
+                                    log_level='warning')
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def root():
+    # 界面组件的测试需要显示器，没有时跳过
+    tk = pytest.importorskip('tkinter')
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip('Tk needs a display')
+    yield root
+    root.destroy()
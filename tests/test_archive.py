@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : test_archive.py
+
+import sqlite3
+
+import pytest
+
+from benchmark.datagen import make_products, make_records
+from utils import InventoryService, SqliteOperation, QueryStats, rebuild_statistics
+from utils.archive import archived_years, record_tables
+
+from .test_service import snapshot
+
+KEYWORDS = ['{name}_time', 'product_id', 'bottles', 'unit_price', 'total_price', 'settled']
+
+
+@pytest.fixture
+def slow(db, tmp_path):
+    # 每条语句都按慢查询处理，执行 EXPLAIN QUERY PLAN
+    db = SqliteOperation(str(tmp_path / 'data.db'), db.recorder, stats=QueryStats(slow_ms=0))
+    service = InventoryService(db)
+    products = make_products(10)
+    db.insert('products', products, keywords=['id', 'Name', 'BottlesPerBox'], mode='multi')
+    in_rows, out_rows = make_records(products, 2000, years=3)
+    for name, rows in [('in', in_rows), ('out', out_rows)]:
+        db.insert(f'{name}_records', rows, keywords=[key.format(name=name) for key in KEYWORDS], mode='multi')
+    yield service
+    db.close()
+
+
+def count(db, name, start, end):
+    return sum(
+        db.exec_sql(f'SELECT COUNT(*) FROM {table} WHERE `{name}_time` >= ? AND `{name}_time` < ?', (start, end))[0][0][0]
+        for table in record_tables(db, name, start, end)
+    )
+
+
+def rows(db, name, start, end):
+    result = []
+    for table in record_tables(db, name, start, end):
+        found, _ = db.exec_sql(f'SELECT * FROM {table} WHERE `{name}_time` >= ? AND `{name}_time` < ?', (start, end))
+        result.extend(found)
+    return sorted(result)
+
+
+def test_archive_counts_and_queries(slow):
+    db = slow.db
+    years = {
+        year: [count(db, name, f'{year}-01-01', f'{year + 1}-01-01') for name in ['in', 'out']]
+        for year in range(2022, 2025)
+    }
+    before = {name: rows(db, name, '2022-06-01', '2024-03-01') for name in ['in', 'out']}
+
+    moved = slow.archive(before='2024-01')
+    assert moved == {2022: tuple(years[2022]), 2023: tuple(years[2023])}
+    assert sorted(archived_years(db)) == [2022, 2023]
+    saved, _ = db.exec_sql('SELECT year, in_rows, out_rows FROM archives ORDER BY year')
+    assert saved == [(2022, *years[2022]), (2023, *years[2023])]
+
+    # 主库只剩 2024 年的记录，跨归档查询的结果与归档前相同
+    for name in ['in', 'out']:
+        result, _ = db.exec_sql(f'SELECT MIN(`{name}_time`) FROM main.{name}_records')
+        assert result[0][0] >= '2024-01-01'
+        assert rows(db, name, '2022-06-01', '2024-03-01') == before[name]
+        assert [count(db, name, f'{year}-01-01', f'{year + 1}-01-01') for year in range(2022, 2025)] == \
+            [years[year][name == 'out'] for year in range(2022, 2025)]
+
+    # 再次归档没有可移动的记录
+    assert slow.archive(before='2024-01') == {}
+
+
+def test_failed_delete_keeps_records_and_can_resume(slow):
+    db = slow.db
+    expected = [count(db, name, '2022-01-01', '2023-01-01') for name in ['in', 'out']]
+    # 删除失败时复制已提交，主库记录保持不变
+    db.exec_sql("CREATE TRIGGER block BEFORE DELETE ON out_records BEGIN SELECT RAISE(ABORT, 'blocked'); END")
+    with pytest.raises(sqlite3.IntegrityError):
+        slow.archive(before='2023-01')
+    result, _ = db.exec_sql("SELECT COUNT(*) FROM main.in_records WHERE in_time < '2023-01-01'")
+    assert result[0][0] == expected[0]
+    result, _ = db.exec_sql('SELECT COUNT(*) FROM archive_2022.out_records')
+    assert result[0][0] == expected[1]
+    assert db.exec_sql('SELECT * FROM archives')[0] == []
+
+    # 再次执行时已复制的记录按编号跳过，不会重复
+    db.exec_sql('DROP TRIGGER block')
+    assert slow.archive(before='2023-01') == {2022: tuple(expected)}
+    assert [count(db, name, '2022-01-01', '2023-01-01') for name in ['in', 'out']] == expected
+
+
+@pytest.mark.skipif(not hasattr(sqlite3.Connection, 'setlimit'), reason='setlimit requires Python 3.11')
+def test_rebuild_and_report_attach_one_year_at_a_time(slow):
+    db = slow.db
+    rebuild_statistics(db)
+    expected = snapshot(db), slow.report(), slow.report('2023-06-01', '2024-02-10')
+    slow.archive(before='2024-01')
+
+    # 归档年份超过附加上限时仍可汇总及重新计算
+    for year in archived_years(db):
+        db.driver.execute(f'DETACH DATABASE archive_{year}')
+    db.driver.setlimit(sqlite3.SQLITE_LIMIT_ATTACHED, 1)
+    rebuild_statistics(db)
+    assert (snapshot(db), slow.report(), slow.report('2023-06-01', '2024-02-10')) == expected
+    attached = [name for _, name, _ in db.driver.execute('PRAGMA database_list')]
+    assert attached == ['main']
+
+
+def test_archived_rows_are_not_ingested_again(slow, tmp_path):
+    path = tmp_path / 'pos.csv'
+    path.write_text('type,time,product_id,bottles,unit_price\nin,2022-05-01 10:00:00,P000001,3,2\n'
+                    'out,2023-05-01 10:00:00,P000001,1,3\nin,2024-02-01 10:00:00,P000002,2,2\n', encoding='utf-8')
+    assert slow.ingest_csv(str(path), source='pos.csv')['inserted'] == 3
+    slow.archive(before='2024-01')
+    result = slow.ingest_csv(str(path), source='pos.csv')
+    assert result['inserted'] == 0 and result['skipped'] == 3
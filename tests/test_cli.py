@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : test_cli.py
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 屏蔽 tkinter 后运行命令行，模拟没有 Tk 的服务器
+NO_TK = '''
+import runpy, sys
+sys.modules['tkinter'] = None
+sys.argv = ['cli.py'] + sys.argv[1:]
+runpy.run_path('cli.py', run_name='__main__')
+'''
+
+
+def test_cli_runs_without_tkinter(tmp_path):
+    result = subprocess.run(
+        [sys.executable, '-c', NO_TK, '--db', str(tmp_path / 'data.db'), '--log-file', str(tmp_path / 'process.log'),
+         'report', '--json'],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert '"profit": 0' in result.stdout
@@ -0,0 +1,17 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : test_datagen.py
+
+from benchmark.datagen import generate
+from utils import Record
+
+
+def test_generate_without_records(tmp_path):
+    recorder = Record(log_file=str(tmp_path / 'process.log'), headless=True)
+    db, products = generate(str(tmp_path / 'data.db'), recorder, products=10, records=0)
+    assert len(products) == 10
+    assert db.exec_sql('SELECT COUNT(*) FROM in_records')[0] == [(0, )]
+    assert db.exec_sql('SELECT COUNT(*) FROM stock')[0] == [(0, )]
+    db.close()
+    recorder.close()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : test_diagnostics.py
+
+import json
+
+import pytest
+
+from utils import SqliteOperation, QueryStats
+from utils.diagnostics import normalize_sql, is_explainable
+
+
+@pytest.fixture
+def traced(db, tmp_path):
+    # 每条语句都视为慢查询
+    stats = QueryStats(slow_ms=0)
+    db = SqliteOperation(str(tmp_path / 'data.db'), db.recorder, stats=stats)
+    yield db, stats
+    db.close()
+
+
+def test_normalize_sql():
+    assert normalize_sql("SELECT *  FROM products\n WHERE id = 'P1' AND BottlesPerBox > 12") == \
+        'SELECT * FROM products WHERE id = ? AND BottlesPerBox > ?'
+    assert normalize_sql("SELECT * FROM products WHERE Name = 'O''Neil'") == 'SELECT * FROM products WHERE Name = ?'
+    # 标识符中的数字不替换
+    assert normalize_sql('SELECT * FROM archive_2023.in_records LIMIT 10') == \
+        'SELECT * FROM archive_2023.in_records LIMIT ?'
+    assert is_explainable('  select 1') and not is_explainable('PRAGMA user_version') and not is_explainable('')
+
+
+def test_statements_commits_and_errors(traced):
+    db, stats = traced
+    db.insert('products', [('P1', '啤酒', 12), ('P2', '可乐', 24)], keywords=['id', 'Name', 'BottlesPerBox'],
+              mode='multi')
+    for product_id in ['P1', 'P2', 'P3']:
+        db.search('products', where={'id': product_id})
+    assert db.exec_sql('SELECT * FROM missing') == ([], False)
+
+    assert stats.commits == 1 and stats.errors == 1
+    summary = {row[0]: row for row in stats.summary(order='count')}
+    select = summary['SELECT * FROM `products` WHERE `id` = ?']
+    # (sql, count, total_ms, avg_ms, p95_ms, max_ms, rows, errors)
+    assert select[1] == 3 and select[6] == 2 and select[7] == 0
+    assert summary['SELECT * FROM missing'][7] == 1
+
+
+def test_slow_query_plan(traced, tmp_path):
+    db, stats = traced
+    db.search('products', where={'id': 'P1'})
+    db.exec_sql('PRAGMA user_version')
+    slow = {entry['sql']: entry for entry in stats.slow}
+    plan = slow['SELECT * FROM `products` WHERE `id` = ?']['plan']
+    assert plan and any('products' in line for line in plan)
+    assert slow['PRAGMA user_version']['plan'] == []
+
+    path = tmp_path / 'stats.json'
+    stats.save(str(path))
+    saved = json.loads(path.read_text(encoding='utf-8'))
+    assert saved['slow_ms'] == 0 and len(saved['slow_queries']) == 2
+    stats.reset()
+    assert not stats.statements and not stats.slow and stats.commits == 0
+
+
+def test_slow_logging_disabled(db, tmp_path):
+    stats = QueryStats(slow_ms=None)
+    other = SqliteOperation(str(tmp_path / 'data.db'), db.recorder, stats=stats)
+    other.search('products')
+    other.close()
+    assert not stats.slow and stats.summary()[0][1] == 1
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : test_export.py
+
+import csv
+
+import pytest
+
+from utils.export import EXPORT_COLUMNS, count_records, export_records
+
+KEYWORDS = ['in_time', 'product_id', 'bottles', 'unit_price', 'total_price', 'settled']
+
+
+@pytest.fixture
+def records(db):
+    # 时间乱序写入，最后两条时间相同
+    rows = [
+        ('2024-03-02 10:00:00', 'P1', 1, 2.0, 2.0, 1),
+        ('2024-03-01 09:00:00', 'P2', 2, 3.0, 6.0, 0),
+        ('2024-03-05 12:00:00', 'P1', 3, 2.0, 6.0, 1),
+        ('2024-04-01 08:00:00', 'P2', 4, 3.0, 12.0, 1),
+        ('2024-03-03 11:00:00', 'P1', 5, 2.0, 10.0, 1),
+        ('2024-03-03 11:00:00', 'P2', 6, 3.0, 18.0, 0),
+    ]
+    db.insert('in_records', rows, keywords=KEYWORDS, mode='multi')
+    return db
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return list(csv.reader(f))
+
+
+def test_export_csv_in_chunks(records, tmp_path):
+    calls = []
+    done = export_records(records, 'in', '2024-03-01', '2024-03-31', str(tmp_path), fmt='csv', chunk_size=2,
+                          progress=lambda done, total: calls.append((done, total)))
+    assert done == 5 == count_records(records, 'in', '2024-03-01', '2024-03-31')
+    assert calls == [(2, 5), (4, 5), (5, 5)]
+
+    rows = read_csv(tmp_path / 'in.csv')
+    assert rows[0] == EXPORT_COLUMNS
+    # 按时间、编号排序
+    assert [row[1] for row in rows[1:]] == ['2024-03-01 09:00:00', '2024-03-02 10:00:00', '2024-03-03 11:00:00',
+                                            '2024-03-03 11:00:00', '2024-03-05 12:00:00']
+    assert [row[3] for row in rows[3:5]] == ['5', '6']
+    assert rows[1][2:] == ['P2', '2', '3.0', '6.0', '未结清']
+
+
+def test_cancelled_export_removes_file(records, tmp_path):
+    def cancel(done, total):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        export_records(records, 'in', '2024-01-01', '2024-12-31', str(tmp_path), fmt='csv', chunk_size=2,
+                       progress=cancel)
+    assert not (tmp_path / 'in.csv').exists()
+
+
+def test_export_xlsx(records, tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    assert export_records(records, 'in', '2024-01-01', '2024-12-31', str(tmp_path), chunk_size=4) == 6
+    sheet = openpyxl.load_workbook(tmp_path / 'in.xlsx', read_only=True).active
+    rows = list(sheet.values)
+    assert list(rows[0][1:]) == EXPORT_COLUMNS[1:] and len(rows) == 7 and rows[-1][1] == '2024-04-01 08:00:00'
+
+
+def test_invalid_format(records, tmp_path):
+    with pytest.raises(ValueError):
+        export_records(records, 'in', '2024-01-01', '2024-12-31', str(tmp_path), fmt='json')
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : test_pages.py
+
+from utils.widgets import PageManager
+
+
+class Pages:
+    # 记录每个页面的创建及刷新次数
+    def __init__(self, root, names):
+        self.built = dict.fromkeys(names, 0)
+        self.refreshed = dict.fromkeys(names, 0)
+        self.manager = PageManager(root)
+        for name, events in names.items():
+            self.manager.register(name, self.builder(name), events=events)
+
+    def builder(self, name):
+        def build(frame):
+            self.built[name] += 1
+            return lambda: self.refreshed.__setitem__(name, self.refreshed[name] + 1)
+        return build
+
+
+def test_pages_are_built_once_and_kept(root):
+    pages = Pages(root, {'home': ['records'], 'query': ['records', 'products']})
+    home = pages.manager.show('home')
+    query = pages.manager.show('query')
+    assert pages.manager.show('home') is home and pages.manager.show('query') is query
+    assert pages.built == {'home': 1, 'query': 1} and pages.refreshed == {'home': 0, 'query': 0}
+    # 只有当前页面在布局中，其余页面隐藏
+    assert pages.manager.current == 'query' and query.winfo_manager() == 'pack' and home.winfo_manager() == ''
+
+
+def test_notify_refreshes_current_and_marks_others(root):
+    pages = Pages(root, {'home': ['records'], 'query': ['records', 'products'], 'stock': ['products']})
+    pages.manager.show('home')
+    pages.manager.show('query')
+    pages.manager.notify('records')
+    # 当前页面立即刷新，其他已创建的页面在下次显示时刷新，未创建的页面不受影响
+    assert pages.refreshed == {'home': 0, 'query': 1, 'stock': 0}
+    assert pages.manager.dirty == {'home'}
+    pages.manager.show('home')
+    pages.manager.show('home')
+    assert pages.refreshed['home'] == 1 and not pages.manager.dirty
+    pages.manager.show('stock')
+    assert pages.built['stock'] == 1 and pages.refreshed['stock'] == 0
+
+
+def test_reset_rebuilds_page(root):
+    pages = Pages(root, {'home': ['records'], 'query': []})
+    first = pages.manager.show('home')
+    pages.manager.reset('home')
+    assert pages.built['home'] == 2 and pages.manager.frames['home'] is not first
+    pages.manager.show('query')
+    pages.manager.reset('home')
+    assert pages.built['home'] == 2 and 'home' not in pages.manager.frames
+    pages.manager.show('home')
+    assert pages.built['home'] == 3
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : test_paging.py
+
+import pytest
+
+from app import App
+from benchmark.datagen import make_products, make_records
+from utils import InventoryService
+from utils.widgets import VirtualTreeview
+
+KEYWORDS = ['{name}_time', 'product_id', 'bottles', 'unit_price', 'total_price', 'settled']
+
+
+@pytest.fixture
+def records(db):
+    products = make_products(5)
+    db.insert('products', products, keywords=['id', 'Name', 'BottlesPerBox'], mode='multi')
+    in_rows, out_rows = make_records(products, 400, years=3)
+    # 同一时间的出入库，按 (时间, 类型, 编号) 区分先后
+    in_rows.append(out_rows[0])
+    for name, rows in [('in', in_rows), ('out', out_rows)]:
+        db.insert(f'{name}_records', rows, keywords=[key.format(name=name) for key in KEYWORDS], mode='multi')
+    return db
+
+
+def query(db, **kwargs):
+    # query_records 只用到传入的连接
+    return App.query_records(None, db=db, **kwargs)
+
+
+def pages(db, size, **kwargs):
+    rows, after = [], None
+    while True:
+        page = query(db, after=after, limit=size, **kwargs)
+        if not page: return rows
+        rows.extend(page)
+        after = page[-1][0]
+
+
+def test_keyset_pages_match_full_query(records):
+    full = query(records)
+    assert len(full) == 401
+    assert [key for key, _ in full] == sorted((key for key, _ in full), reverse=True)
+    assert pages(records, 37) == full
+
+    # 从末尾向前翻页
+    rows, before = [], full[-1][0]
+    while True:
+        page = query(records, before=before, limit=50)
+        if not page: break
+        rows[:0] = page
+        before = page[0][0]
+    assert rows == full[:-1]
+
+
+def test_keyset_pages_with_filters_and_archives(records):
+    filters = {'start': '2022-06-01', 'end': '2024-06-01', 'direction': 'out', 'settled': 1}
+    expected = query(records, filters=filters)
+    assert expected and all(values[2] < 0 and values[5] == '已结清' for _, values in expected)
+
+    InventoryService(records).archive(before='2024-01')
+    assert query(records, filters=filters) == expected
+    assert pages(records, 23, filters=filters) == expected
+
+
+class Task:
+    def __init__(self, on_done):
+        self.on_done = on_done
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class ManualWorker:
+    # 结果由测试手动返回，模拟后台查询晚于 reload 返回
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, func, on_done=None, on_error=None):
+        self.tasks.append(Task(on_done))
+        return self.tasks[-1]
+
+
+def fetch(after=None, before=None, limit=10, db=None):
+    start = 0 if after is None else after + 1
+    return [(i, (i, )) for i in range(start, min(start + limit, 25))]
+
+
+def test_queued_load_after_reload_is_dropped(root):
+    view = VirtualTreeview(root, fetch=fetch, page_size=10)
+    view.reload()
+    generation = view.generation
+    # 排队中的加载在 reload 清空 keys 之后执行
+    view.reload(fetch=lambda **kwargs: [])
+    view.load_after(generation)
+    view.load_before(view.generation)
+    assert view.keys == [] and not view.loading
+
+
+def test_stale_results_are_ignored(root):
+    worker = ManualWorker()
+    view = VirtualTreeview(root, fetch=fetch, page_size=10, worker=worker)
+    view.reload()
+    view.reload()
+    first, second = worker.tasks
+    assert first.cancelled and view.task is second
+    first.on_done(fetch(after=14))
+    assert view.keys == [] and view.loading
+    second.on_done(fetch())
+    assert view.keys == list(range(10)) and not view.loading
@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : test_products.py
+
+import pytest
+
+from utils import import_products
+
+pytest.importorskip('pandas')
+
+
+def test_malformed_rows_are_skipped(db, tmp_path):
+    path = tmp_path / 'products.csv'
+    path.write_text('商品编号,商品名称,每箱瓶数\nP1,青岛啤酒,12\nP2,雪花啤酒,12瓶\nP3,百威啤酒, 24 \nP4,,6\n'
+                    'P5,燕京啤酒,12.5\nP6,哈尔滨啤酒,6.0\nP7,珠江啤酒,inf\n', encoding='utf-8')
+    assert import_products(db, str(path)) == {'inserted': 3, 'updated': 0, 'skipped': 4}
+    rows, _ = db.search('products', field=('id', 'BottlesPerBox'), order='id')
+    assert rows == [('P1', 12), ('P3', 24), ('P6', 6)]
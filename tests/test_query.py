@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : test_query.py
+
+import pytest
+
+from utils.query import quote, select_sql, insert_sql, update_sql, delete_sql
+
+
+def test_quote():
+    assert quote('Name') == '`Name`'
+    assert quote('products.id') == '`products`.`id`'
+    assert quote('count( id )') == 'COUNT(`id`)'
+    assert quote('*') == '*'
+    for name in ['id; DROP TABLE products', 'a b', '`id`', 'LOWER(id)']:
+        with pytest.raises(ValueError):
+            quote(name)
+
+
+def test_select_binds_values():
+    sql, params = select_sql('products', ['id', 'Name'], where={'Name LIKE': '%可乐%', 'BottlesPerBox >': 6},
+                             order=['-BottlesPerBox', 'id'], limit=20, offset=40)
+    assert sql == ('SELECT `id`, `Name` FROM `products` WHERE `Name` LIKE ? AND `BottlesPerBox` > ? '
+                   'ORDER BY `BottlesPerBox` DESC, `id` LIMIT ? OFFSET ?')
+    assert params == ['%可乐%', 6, 20, 40]
+
+
+def test_select_in_between_and_join():
+    sql, params = select_sql('stock', ['stock.product_id', 'products.Name'], join=('products', 'stock.product_id',
+                             'products.id'), where=[('stock.product_id IN', ['P1', 'P2']), ('bottles BETWEEN', (1, 9))])
+    assert sql == ('SELECT `stock`.`product_id`, `products`.`Name` FROM `stock` '
+                   'LEFT JOIN `products` ON `stock`.`product_id` = `products`.`id` '
+                   'WHERE `stock`.`product_id` IN (?, ?) AND `bottles` BETWEEN ? AND ?')
+    assert params == ['P1', 'P2', 1, 9]
+
+
+def test_same_structure_same_sql():
+    # 只有值不同的查询得到同一条 sql，可复用预编译语句
+    first, _ = select_sql('products', where={'id': 'P1'}, limit=10, offset=0)
+    second, params = select_sql('products', where={'id': 'P2'}, limit=50, offset=100)
+    assert first == second and params == ['P2', 50, 100]
+    # 只有 offset 时补上 LIMIT -1
+    sql, params = select_sql('products', offset=10)
+    assert sql.endswith('LIMIT ? OFFSET ?') and params == [-1, 10]
+
+
+def test_invalid_where():
+    with pytest.raises(ValueError):
+        select_sql('products', where={'id OR 1=1 --': 'P1'})
+    with pytest.raises(ValueError):
+        select_sql('products', where={'day BETWEEN': ('2024-01-01', )})
+    with pytest.raises(ValueError):
+        select_sql('products', where={'id; --': 'P1'})
+
+
+def test_insert_update_delete():
+    assert insert_sql('products', 3, ['id', 'Name', 'BottlesPerBox']) == \
+        'INSERT INTO `products` (`id`, `Name`, `BottlesPerBox`) VALUES (?, ?, ?)'
+    assert insert_sql('products', 2) == 'INSERT INTO `products` VALUES (?, ?)'
+    assert update_sql('products', {'Name': '啤酒', 'BottlesPerBox': 12}, {'id': 'P1'}) == \
+        ('UPDATE `products` SET `Name` = ?, `BottlesPerBox` = ? WHERE `id` = ?', ['啤酒', 12, 'P1'])
+    assert delete_sql('products', {'id IN': ('P1', 'P2')}) == ('DELETE FROM `products` WHERE `id` IN (?, ?)',
+                                                              ['P1', 'P2'])
+
+
+def test_search_round_trip(db):
+    # 含引号的值以参数绑定，按原样存取
+    db.insert('products', [('P1', "O'Neil 啤酒", 12), ('P2', '可乐', 24), ('P3', '雪碧', 24)],
+              keywords=['id', 'Name', 'BottlesPerBox'], mode='multi')
+    rows, flag = db.search('products', field=['id', 'Name'], where={'Name': "O'Neil 啤酒"})
+    assert flag and rows == [('P1', "O'Neil 啤酒")]
+    rows, _ = db.search('products', field='id', where={'BottlesPerBox': 24}, order='-id', limit=1, offset=1)
+    assert rows == [('P2', )]
+    db.modify('products', ['Name'], ['百事可乐'], where={'id': 'P2'})
+    db.delete('products', where={'id IN': ['P1', 'P3']})
+    rows, _ = db.search('products', field=['id', 'Name'])
+    assert rows == [('P2', '百事可乐')]
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : test_schema.py
+
+import sqlite3
+
+from utils import SqliteOperation, Record, migrate, rebuild_statistics, SCHEMA_VERSION
+
+# 版本迁移之前的表结构及数据
+BASELINE = '''
+    CREATE TABLE in_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, in_time DATETIME DEFAULT (datetime('now', 'localtime')) NOT NULL,
+        product_id TEXT NOT NULL, bottles INTEGER NOT NULL, unit_price REAL NOT NULL, total_price REAL NOT NULL,
+        settled BOOLEAN DEFAULT FALSE
+    );
+    CREATE TABLE out_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, out_time DATETIME DEFAULT (datetime('now', 'localtime')) NOT NULL,
+        product_id TEXT NOT NULL, bottles INTEGER NOT NULL, unit_price REAL NOT NULL, total_price REAL NOT NULL,
+        settled BOOLEAN DEFAULT FALSE
+    );
+    CREATE TABLE products (id TEXT PRIMARY KEY, Name TEXT, BottlesPerBox INTEGER DEFAULT 0);
+    CREATE TABLE statistics (
+        product_id TEXT, day TEXT DEFAULT (DATE('now')) NOT NULL, origin INTEGER DEFAULT 0 NOT NULL,
+        in_total INTEGER DEFAULT 0 NOT NULL, out_total INTEGER DEFAULT 0 NOT NULL,
+        in_unit_price REAL DEFAULT 0 NOT NULL, out_unit_price REAL DEFAULT 0 NOT NULL,
+        settled BOOLEAN DEFAULT FALSE, profit REAL DEFAULT 0 NOT NULL
+    );
+    INSERT INTO products VALUES ('P1', '青岛啤酒', 12);
+    INSERT INTO in_records (in_time, product_id, bottles, unit_price, total_price, settled)
+    VALUES ('2024-01-01 10:00:00', 'P1', 10, 2, 20, 1), ('2024-01-02 10:00:00', 'P1', 10, 4, 40, 1);
+    INSERT INTO out_records (out_time, product_id, bottles, unit_price, total_price, settled)
+    VALUES ('2024-01-01 12:00:00', 'P1', 5, 5, 25, 1), ('2024-01-03 12:00:00', 'P1', 5, 5, 25, 0);
+'''
+
+
+def test_migrate_baseline(tmp_path):
+    path = str(tmp_path / 'data.db')
+    connection = sqlite3.connect(path)
+    connection.executescript(BASELINE)
+    connection.close()
+
+    recorder = Record(log_file=str(tmp_path / 'process.log'), headless=True)
+    db = SqliteOperation(path, recorder)
+    assert migrate(db) == SCHEMA_VERSION
+    statistics, _ = db.exec_sql('SELECT * FROM statistics ORDER BY day')
+    stock, _ = db.exec_sql('SELECT product_id, bottles, avg_cost FROM stock')
+    assert [row[:5] for row in statistics] == [('P1', '2024-01-01', 0, 10, 5), ('P1', '2024-01-02', 5, 10, 0),
+                                               ('P1', '2024-01-03', 15, 0, 5)]
+    # 迁移中固定的计算与当前的 rebuild_statistics 结果相同
+    rebuild_statistics(db)
+    assert db.exec_sql('SELECT * FROM statistics ORDER BY day')[0] == statistics
+    assert db.exec_sql('SELECT product_id, bottles, avg_cost FROM stock')[0] == stock
+    db.close()
+    recorder.close()
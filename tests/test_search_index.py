@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : test_search_index.py
+
+from utils import ProductIndex
+
+
+class Rows:
+    # 只提供 load 用到的 exec_sql
+    def __init__(self, rows):
+        self.rows = rows
+
+    def exec_sql(self, sql):
+        return [list(row) for row in self.rows], True
+
+
+def make_index(names, **kwargs):
+    index = ProductIndex(**kwargs)
+    index.load(Rows([(f'P{i}', name) for i, name in enumerate(names)]))
+    return index
+
+
+def test_ranking():
+    index = make_index(['可口可乐500ml', '青岛啤酒', '青岛纯生啤酒', '百威啤酒330ml', '雪花啤酒'])
+    # 名称前缀、名称子串、子序列
+    assert index.search('青岛') == ['青岛啤酒', '青岛纯生啤酒']
+    assert index.search('啤酒') == ['雪花啤酒', '青岛啤酒', '青岛纯生啤酒', '百威啤酒330ml']
+    assert index.search('500ML') == ['可口可乐500ml']
+    assert index.search('青啤') == ['青岛啤酒', '青岛纯生啤酒']
+    assert index.search('qdpj') == ['青岛啤酒', '青岛纯生啤酒']
+    assert index.search('xyz') == []
+
+
+def test_add_after_load():
+    index = make_index(['青岛啤酒'])
+    index.add('P9', '青岛纯生')
+    assert index.search('纯生') == ['青岛纯生']
+    assert index.get_id('青岛纯生') == 'P9'
+
+
+def test_subsequence_scan_is_bounded():
+    # 子序列只检查最少见字的前 scan_limit 个商品，结果为排序靠前的部分
+    index = make_index([f'啤{i:04d}酒' for i in range(100)], scan_limit=10)
+    assert index.search('啤酒', limit=50) == [f'啤{i:04d}酒' for i in range(10)]
+    result = index.search('啤9酒', limit=50)
+    assert 0 < len(result) <= 20 and all('9' in name for name in result)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : test_service.py
+
+import csv
+
+import pytest
+
+from benchmark.datagen import make_products, make_records
+from utils import rebuild_statistics
+
+
+def write_movements(path, products, count, years=1, seed=0):
+    # 按时间排序、出入库交错、跨多天的出入库 csv
+    in_rows, out_rows = make_records(products, count, years=years, seed=seed)
+    rows = sorted([('in', *row) for row in in_rows] + [('out', *row) for row in out_rows], key=lambda row: row[1])
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['type', 'time', 'product_id', 'bottles', 'unit_price', 'total_price', 'settled'])
+        writer.writerows(rows)
+    return len(rows)
+
+
+def snapshot(db):
+    statistics, _ = db.exec_sql(
+        'SELECT product_id, day, origin, in_total, out_total, ROUND(in_unit_price, 6), ROUND(out_unit_price, 6), '
+        'settled, ROUND(profit, 6) FROM statistics ORDER BY product_id, day'
+    )
+    stock, _ = db.exec_sql('SELECT product_id, bottles, ROUND(avg_cost, 6) FROM stock ORDER BY product_id')
+    return statistics, stock
+
+
+@pytest.mark.parametrize('batch_size', [1, 7, 5000])
+def test_ingest_matches_rebuild(service, tmp_path, batch_size):
+    products = make_products(20)
+    service.db.insert('products', products, keywords=['id', 'Name', 'BottlesPerBox'], mode='multi')
+    path = str(tmp_path / 'movements.csv')
+    count = write_movements(path, products, 3000)
+
+    result = service.ingest_csv(path, batch_size=batch_size)
+    assert result['inserted'] == count
+    ingested = snapshot(service.db)
+    rebuild_statistics(service.db)
+    assert ingested == snapshot(service.db)
+
+
+def test_record_by_box_requires_bottles_per_box(service):
+    service.db.insert('products', [('P1', '啤酒', 12), ('P2', '散装', 0)], keywords=['id', 'Name', 'BottlesPerBox'],
+                      mode='multi')
+    assert service.record_movement('P1', 2, 24, mode='in', unit='箱')[1:4] == [24, 2, 48]
+    with pytest.raises(ValueError):
+        service.record_movement('P2', 2, 24, mode='in', unit='箱')
+
+
+def test_ingest_normalizes_and_validates_time(service, tmp_path):
+    service.db.insert('products', ['P1', '啤酒', 12], keywords=['id', 'Name', 'BottlesPerBox'])
+    path = tmp_path / 'movements.csv'
+    path.write_text('类型,时间,商品编号,数量,单价\n入库,2024/3/1 9:30,P1,5,2\n出库,2024-03-02T10:00:00,P1,1,3\n'
+                    '出库,2024-02-30 10:00:00,P1,1,3\n出库,昨天,P1,1,3\n', encoding='utf-8')
+    result = service.ingest_csv(str(path))
+    assert (result['inserted'], result['skipped']) == (2, 2)
+    rows, _ = service.db.exec_sql('SELECT in_time FROM in_records UNION ALL SELECT out_time FROM out_records')
+    assert rows == [('2024-03-01 09:30:00', ), ('2024-03-02 10:00:00', )]
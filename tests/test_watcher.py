@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : test_watcher.py
+
+import os
+import time
+
+import pytest
+
+from utils import scan_folder
+
+
+@pytest.fixture
+def product(service):
+    service.db.insert('products', ['P1', '啤酒', 12, '690001'], keywords=['id', 'Name', 'BottlesPerBox', 'barcode'])
+
+
+def write(path, content, encoding='utf-8'):
+    with open(path, 'w', encoding=encoding) as f:
+        f.write(content)
+    # 超过 settle 时间，视为已写完
+    os.utime(path, (time.time() - 60, ) * 2)
+    return str(path)
+
+
+def test_bad_files_do_not_block_others(service, product, tmp_path):
+    folder = tmp_path / 'pos'
+    folder.mkdir()
+    bad = write(folder / 'a_bad.csv', 'foo,bar\n1,2\n')
+    gbk = write(folder / 'b_gbk.csv', '条码,数量,单价\n690001,1,5\n', encoding='gbk')
+    good = write(folder / 'c_good.csv', '条码,数量,单价\n690001,3,5\n')
+
+    results = dict(scan_folder(service, str(folder)))
+    assert results[bad]['error'] and results[gbk]['error']
+    assert results[good]['inserted'] == 1
+    # 失败的文件内容不变时不再重试
+    assert scan_folder(service, str(folder)) == []
+
+    write(folder / 'a_bad.csv', 'barcode,quantity,price\n690001,2,5\n')
+    results = dict(scan_folder(service, str(folder)))
+    assert results[bad]['inserted'] == 1 and not results[bad].get('error')
@@ -5,4 +5,32 @@
 
 from .os import make_path_exists
 from .log import Record
-from .sql import SqliteOperation
\ No newline at end of file
+from .sql import SqliteOperation
+from .search_index import ProductIndex
+from .repository import ProductRepository
+from .schema import migrate, SCHEMA_VERSION
+from .stats import update_statistics, update_statistics_batch, apply_movements, rebuild_statistics, get_stock, \
+    get_daily_profit, ProfitCache
+from .products import import_products, read_product_file
+from .export import export_records
+from .archive import archive_records, record_tables
+from .movements import save_movements
+from .profiling import StartupTimer
+from .diagnostics import QueryStats, QUERY_STATS
+from .service import InventoryService
+from .watcher import FolderWatcher, scan_folder
+
+# 界面组件依赖 tkinter，后台任务依赖界面的事件循环，用到时再导入，
+# 命令行及 InventoryService 在没有 Tk 的环境中也能使用
+LAZY_MODULES = {
+    'VirtualTreeview': 'widgets', 'ProgressDialog': 'widgets', 'ProfitChart': 'widgets', 'PageManager': 'widgets',
+    'Worker': 'worker', 'Task': 'worker', 'TaskCancelled': 'worker',
+}
+
+
+def __getattr__(name):
+    if name not in LAZY_MODULES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    from importlib import import_module
+
+    return getattr(import_module(f'.{LAZY_MODULES[name]}', __name__), name)
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : archive.py
+
+# 出入库记录按年归档：已结束月份的记录移到与数据库同目录的 archive/data-2023.db 等文件中，
+# statistics 与 stock 仍保留在主库，首页、库存及利润不受影响。
+# 查询、导出时按时间范围 ATTACH 用到的年份，与主库的记录 UNION ALL 后一起查询；
+# 汇总及重新计算统计不限年份，按年逐个附加归档（record_segments），不受附加数量上限限制。
+# 归档后的记录保留原编号，主库使用 AUTOINCREMENT 不会复用编号，两边的编号不会重复。
+
+import os
+import sqlite3
+from datetime import datetime
+
+ARCHIVE_SCHEMA = 'archive_{year}'
+
+RECORD_COLUMNS = ['id', '{name}_time', 'product_id', 'bottles', 'unit_price', 'total_price', 'settled', 'source_key']
+
+ARCHIVE_TABLE = [
+    '''
+    CREATE TABLE IF NOT EXISTS {schema}.{name}_records (
+        id INTEGER PRIMARY KEY,
+        {name}_time DATETIME NOT NULL,
+        product_id TEXT NOT NULL,
+        bottles INTEGER NOT NULL,
+        unit_price REAL NOT NULL,
+        total_price REAL NOT NULL,
+        settled BOOLEAN DEFAULT FALSE,
+        source_key TEXT
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_{name}_records_time ON {name}_records ({name}_time)',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_{name}_records_product_time ON {name}_records (product_id, {name}_time)',
+    # 导入时按来源键查找已归档的记录
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_{name}_records_source ON {name}_records (source_key) '
+    'WHERE source_key IS NOT NULL',
+]
+
+UPSERT_ARCHIVE = '''
+    INSERT INTO archives (year, path, in_rows, out_rows, until, updated)
+    VALUES (?, ?, ?, ?, ?, datetime('now', 'localtime'))
+    ON CONFLICT (year) DO UPDATE SET
+        in_rows = in_rows + excluded.in_rows,
+        out_rows = out_rows + excluded.out_rows,
+        until = MAX(until, excluded.until),
+        updated = excluded.updated
+'''
+
+
+def database_dir(db):
+    # 主库所在目录，内存数据库使用当前目录
+    for _, name, path in db.driver.execute('PRAGMA database_list'):
+        if name == 'main':
+            return os.path.dirname(path) if path else os.getcwd()
+    return os.getcwd()
+
+
+def archive_path(db, year):
+    # 相对主库目录的路径，保存在 archives 表中，整个目录移动后仍可使用
+    for _, name, path in db.driver.execute('PRAGMA database_list'):
+        if name == 'main' and path:
+            stem = os.path.splitext(os.path.basename(path))[0]
+            break
+    else:
+        stem = 'data'
+    return os.path.join('archive', f'{stem}-{year}.db')
+
+
+def archived_years(db):
+    # {year: path}，数据库尚未升级到有 archives 表的版本时为空
+    exists = db.driver.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'archives'").fetchone()
+    if not exists: return {}
+    return dict(db.driver.execute('SELECT `year`, `path` FROM archives ORDER BY `year`').fetchall())
+
+
+def attach_limit(db):
+    # sqlite 默认最多附加 10 个数据库，Python 3.11 起可以读取实际上限
+    getlimit = getattr(db.driver, 'getlimit', None)
+    return getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if getlimit is not None else 10
+
+
+def attach_archives(db, years, paths=None):
+    """
+    附加 years 对应的归档文件（已附加的跳过），返回 {year: schema}。
+    超过附加上限时先分离不需要的归档，仍然不够则抛出 ValueError。
+    ATTACH / DETACH 不能在事务中执行。
+    """
+    paths = archived_years(db) if paths is None else paths
+    attached = {name for _, name, _ in db.driver.execute('PRAGMA database_list')}
+    schemas = {year: ARCHIVE_SCHEMA.format(year=year) for year in years}
+    missing = [year for year, schema in schemas.items() if schema not in attached]
+    if not missing: return schemas
+
+    archives = {name for name in attached if name.startswith('archive_')}
+    limit = attach_limit(db)
+    if len(archives) + len(missing) > limit:
+        for name in archives - set(schemas.values()):
+            db.driver.execute(f'DETACH DATABASE {name}')
+        archives &= set(schemas.values())
+        if len(archives) + len(missing) > limit:
+            raise ValueError(f'Date range spans {len(schemas)} archive years, at most {limit} can be queried at once.')
+
+    base = database_dir(db)
+    for year in missing:
+        path = os.path.join(base, paths.get(year) or archive_path(db, year))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        db.driver.execute(f'ATTACH DATABASE ? AS {schemas[year]}', (path, ))
+        db.recorder.lock_output(f'Attached archive {path} as {schemas[year]}.')
+    return schemas
+
+
+def record_tables(db, name, start=None, end=None):
+    """
+    时间范围 [start, end] 内 name（in / out）出入库记录所在的表，主库在前：
+    ['in_records', 'archive_2023.in_records', ...]，start / end 为空时不限制。
+    归档晚于范围开始之后补录到主库的较早记录仍在主库中，所以主库总是包含在内。
+    """
+    paths = archived_years(db)
+    years = [
+        year for year in paths
+        if (start is None or year >= int(str(start)[:4])) and (end is None or year <= int(str(end)[:4]))
+    ]
+    schemas = attach_archives(db, years, paths) if years else {}
+    return [f'{name}_records'] + [f'{schemas[year]}.{name}_records' for year in sorted(years, reverse=True)]
+
+
+def record_segments(db, start=None, end=None):
+    """
+    将时间范围 [start, end) 按归档年份切分，按时间顺序逐段返回 (段开始, 段结束, schema)：
+    归档年份的一段附加该年的归档文件，schema 为附加名，其余各段只在主库，schema 为 None。
+    每次只附加一个归档，该段用完后分离，归档年份再多也不受附加上限限制，
+    使用方需在取下一段之前读完本段的查询结果。start / end 为空时不限制。
+    """
+    paths = archived_years(db)
+    current = start
+    for year in sorted(paths):
+        year_start, year_end = f'{year:04d}-01-01', f'{year + 1:04d}-01-01'
+        if (start is not None and year_end <= start) or (end is not None and year_start >= end): continue
+        if current is None or current < year_start:
+            yield current, year_start, None
+        current = year_end if end is None else min(year_end, end)
+        schema = attach_archives(db, [year], paths)[year]
+        try:
+            yield max(year_start, start or year_start), current, schema
+        finally:
+            db.driver.execute(f'DETACH DATABASE {schema}')
+    if current is None or end is None or current < end:
+        yield current, end, None
+
+
+def range_condition(column, start, end):
+    # [start, end) 的查询条件及参数，为空的一端不限制
+    conditions, params = [], []
+    if start is not None:
+        conditions.append(f'`{column}` >= ?')
+        params.append(start)
+    if end is not None:
+        conditions.append(f'`{column}` < ?')
+        params.append(end)
+    return ' AND '.join(conditions) or '1', params
+
+
+def closed_month(months_ago=0, today=None):
+    # months_ago 个月前的月初，之前的月份均已结束
+    today = today or datetime.today()
+    month = today.year * 12 + today.month - 1 - months_ago
+    return f'{month // 12:04d}-{month % 12 + 1:02d}-01'
+
+
+def has_records(db, start, end):
+    for name in ['in', 'out']:
+        result, _ = db.exec_sql(
+            f'SELECT 1 FROM main.{name}_records WHERE `{name}_time` >= ? AND `{name}_time` < ? LIMIT 1', (start, end)
+        )
+        if result: return True
+    return False
+
+
+def archive_records(db, before, vacuum=False, progress=None):
+    """
+    将 before（YYYY-MM，或该月任意一天）之前的出入库记录按年移入归档文件，只能归档已结束的月份。
+    每年先复制到归档文件并提交，核对归档中已有主库该范围的全部记录后，再在另一个事务中删除；
+    中途失败时再次执行即可，已复制的记录按编号跳过。
+    vacuum 为 True 时归档后整理主库，释放删除记录占用的空间。
+    返回 {year: (入库条数, 出库条数)}，progress(year) 在每年完成后调用。
+    """
+    cutoff = f'{datetime.strptime(str(before)[:7], "%Y-%m").strftime("%Y-%m")}-01'
+    if cutoff > closed_month():
+        raise ValueError(f'Month {cutoff[:7]} is not closed yet, only months before the current one can be archived.')
+
+    first = []
+    for name in ['in', 'out']:
+        result, _ = db.exec_sql(f'SELECT MIN(`{name}_time`) FROM {name}_records WHERE `{name}_time` < ?', (cutoff, ))
+        if result and result[0][0] is not None: first.append(str(result[0][0]))
+    if not first: return {}
+
+    moved = {}
+    paths = archived_years(db)
+    for year in range(int(min(first)[:4]), int(cutoff[:4]) + 1):
+        start, end = f'{year:04d}-01-01', min(f'{year + 1:04d}-01-01', cutoff)
+        if start >= end or not has_records(db, start, end): continue
+        path = paths.get(year) or archive_path(db, year)
+        schema = attach_archives(db, [year], {year: path})[year]
+        condition = '`{name}_time` >= ? AND `{name}_time` < ?'
+        # 主库为 WAL 模式时，跨附加数据库的事务对主库不是原子的：先复制并提交
+        with db.transaction():
+            for name in ['in', 'out']:
+                for sql in ARCHIVE_TABLE:
+                    db.exec_sql(sql.format(schema=schema, name=name))
+                columns = ', '.join(f'`{column.format(name=name)}`' for column in RECORD_COLUMNS)
+                db.exec_sql(
+                    f'INSERT OR IGNORE INTO {schema}.{name}_records ({columns}) '
+                    f'SELECT {columns} FROM main.{name}_records WHERE {condition.format(name=name)}',
+                    (start, end)
+                )
+        # 再在另一个事务中核对主库该范围的记录均已在归档中，然后删除
+        counts = []
+        with db.transaction():
+            for name in ['in', 'out']:
+                result, _ = db.exec_sql(
+                    f'SELECT COUNT(*), COUNT(a.`id`) FROM main.{name}_records AS m '
+                    f'LEFT JOIN {schema}.{name}_records AS a ON a.`id` = m.`id` '
+                    f'WHERE m.`{name}_time` >= ? AND m.`{name}_time` < ?',
+                    (start, end)
+                )
+                total, copied = result[0]
+                if copied != total:
+                    raise RuntimeError(f'{total - copied} {name} records of {year} are missing in {path}, '
+                                       f'nothing is deleted.')
+                db.exec_sql(f'DELETE FROM main.{name}_records WHERE {condition.format(name=name)}', (start, end))
+                counts.append(total)
+            db.exec_sql(UPSERT_ARCHIVE, (year, path, *counts, end))
+        moved[year] = tuple(counts)
+        db.recorder.lock_output(f'Archived {year}: {counts[0]} in records, {counts[1]} out records to {path}.')
+        if progress is not None: progress(year)
+
+    if vacuum:
+        db.exec_sql('VACUUM main')
+    return moved
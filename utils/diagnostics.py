@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : diagnostics.py
+
+# sql 执行情况统计：按归一化后的语句记录次数、耗时分布及返回行数，
+# 超过阈值的慢查询记录 EXPLAIN QUERY PLAN，另外统计提交次数。
+# 主线程与后台线程的连接默认共用 QUERY_STATS。
+
+import json
+import re
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from threading import Lock
+
+# 耗时分布的桶上界（ms），最后一个桶为更慢的语句
+BUCKETS = [0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000]
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w?.])-?\d+(?:\.\d+)?\b')
+# 只有这些语句可以 EXPLAIN QUERY PLAN
+_EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    # 合并空白并将字面量替换为 ?，同一结构的语句归为一类
+    sql = ' '.join(sql.split())
+    sql = _STRING.sub('?', sql)
+    return _NUMBER.sub('?', sql)
+
+
+def is_explainable(sql):
+    return sql.lstrip().split(None, 1)[0].upper() in _EXPLAINABLE if sql.strip() else False
+
+
+class QueryStats:
+
+    def __init__(self, slow_ms=100, max_slow=100):
+        self.slow_ms = slow_ms
+        self.lock = Lock()
+        self.slow = deque(maxlen=max_slow)
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # 归一化 sql -> {'count', 'total_ms', 'max_ms', 'rows', 'errors', 'histogram'}
+            self.statements = {}
+            self.commits = 0
+            self.rows = 0
+            self.errors = 0
+            self.slow.clear()
+            self.since = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def _entry(self, sql):
+        key = normalize_sql(sql)
+        entry = self.statements.get(key)
+        if entry is None:
+            entry = self.statements[key] = {
+                'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'errors': 0,
+                'histogram': [0] * (len(BUCKETS) + 1),
+            }
+        return entry
+
+    def record(self, sql, elapsed_ms, rows):
+        with self.lock:
+            entry = self._entry(sql)
+            entry['count'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['rows'] += rows
+            entry['histogram'][bisect_left(BUCKETS, elapsed_ms)] += 1
+            self.rows += rows
+
+    def record_error(self, sql):
+        with self.lock:
+            self._entry(sql)['errors'] += 1
+            self.errors += 1
+
+    def record_commit(self):
+        with self.lock:
+            self.commits += 1
+
+    def is_slow(self, elapsed_ms):
+        return self.slow_ms is not None and elapsed_ms >= self.slow_ms
+
+    def record_slow(self, sql, elapsed_ms, args, plan):
+        with self.lock:
+            self.slow.append({
+                'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'sql': ' '.join(sql.split()),
+                'args': args,
+                'ms': round(elapsed_ms, 3),
+                'plan': plan,
+            })
+
+    @staticmethod
+    def percentile(histogram, ratio):
+        # 按桶估算分位数，返回所在桶的上界
+        total = sum(histogram)
+        if not total: return 0
+        target = total * ratio
+        count = 0
+        for i, n in enumerate(histogram):
+            count += n
+            if count >= target:
+                return BUCKETS[i] if i < len(BUCKETS) else float('inf')
+        return float('inf')
+
+    def summary(self, order='total_ms'):
+        # [(sql, count, total_ms, avg_ms, p95_ms, max_ms, rows, errors), ...]，默认按总耗时倒序
+        with self.lock:
+            items = [(sql, dict(entry, histogram=list(entry['histogram'])))
+                     for sql, entry in self.statements.items()]
+        rows = [
+            (sql, entry['count'], round(entry['total_ms'], 3),
+             round(entry['total_ms'] / entry['count'], 3) if entry['count'] else 0,
+             self.percentile(entry['histogram'], 0.95), round(entry['max_ms'], 3), entry['rows'], entry['errors'])
+            for sql, entry in items
+        ]
+        index = {'count': 1, 'total_ms': 2, 'avg_ms': 3, 'max_ms': 5, 'rows': 6}[order]
+        rows.sort(key=lambda row: row[index], reverse=True)
+        return rows
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'since': self.since,
+                'slow_ms': self.slow_ms,
+                'buckets_ms': BUCKETS,
+                'commits': self.commits,
+                'rows': self.rows,
+                'errors': self.errors,
+                'statements': {sql: dict(entry, histogram=list(entry['histogram']))
+                               for sql, entry in self.statements.items()},
+                'slow_queries': list(self.slow),
+            }
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2, default=str)
+
+
+QUERY_STATS = QueryStats()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : export.py
+
+import csv
+import os
+
+from .archive import record_tables
+
+EXPORT_COLUMNS = ['', '时间', '商品编号', '数量（瓶）', '单价（瓶）', '总价', '是否结清']
+
+
+class CsvWriter:
+
+    def __init__(self, path):
+        # utf-8-sig 便于 Excel 直接打开
+        self.file = open(path, 'w', newline='', encoding='utf-8-sig')
+        self.writer = csv.writer(self.file)
+
+    def append(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxWriter:
+
+    def __init__(self, path):
+        from openpyxl import Workbook
+
+        # 只写模式逐行写入临时文件，不在内存中保留整张表
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet()
+
+    def append(self, row):
+        self.sheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+WRITERS = {'xlsx': XlsxWriter, 'csv': CsvWriter}
+
+
+def count_records(db, name, start_time, end_time, tables=None):
+    total = 0
+    for table in tables or record_tables(db, name, start_time, end_time):
+        result, _ = db.exec_sql(
+            f'SELECT COUNT(*) FROM {table} WHERE `{name}_time` BETWEEN ? AND ?',
+            (start_time, end_time)
+        )
+        total += result[0][0] if result else 0
+    return total
+
+
+def export_records(db, name, start_time, end_time, keep_dir, fmt='xlsx', chunk_size=5000, progress=None):
+    """
+    按时间范围导出出入库记录，每次从游标读取 chunk_size 行并写入文件，内存占用与行数无关。
+    范围内有已归档的年份时一并导出，各表按时间索引有序读取后合并。
+    name 为 in / out，fmt 为 xlsx / csv，progress(done, total) 在每批写入后调用。
+    返回导出的行数。
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f'Input format "{fmt}" is invalid, not in {list(WRITERS)}.')
+    tables = record_tables(db, name, start_time, end_time)
+    total = count_records(db, name, start_time, end_time, tables)
+    cursor = db.return_driver().cursor()
+    cursor.execute(
+        ' UNION ALL '.join(
+            f'''
+            SELECT `id`, `{name}_time`, `product_id`, `bottles`, `unit_price`, `total_price`,
+                   CASE WHEN `settled` THEN '已结清' ELSE '未结清' END
+            FROM {table}
+            WHERE `{name}_time` BETWEEN ? AND ?
+            '''
+            for table in tables
+        ) + f' ORDER BY `{name}_time`, `id`',
+        (start_time, end_time) * len(tables)
+    )
+
+    path = os.path.join(keep_dir, f'{name}.{fmt}')
+    writer = WRITERS[fmt](path)
+    done = 0
+    try:
+        writer.append(EXPORT_COLUMNS)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows: break
+            for row in rows:
+                writer.append(row)
+            done += len(rows)
+            if progress is not None: progress(done, total)
+        writer.close()
+    except BaseException:
+        # 失败或取消时删除未写完的文件
+        cursor.close()
+        if isinstance(writer, CsvWriter): writer.close()
+        if os.path.exists(path): os.remove(path)
+        raise
+    cursor.close()
+    db.recorder.lock_output(f'Exported {done} rows of {name}_records to {path}.')
+    return done
@@ -3,26 +3,71 @@
 # Author: lhys
 # File  : log.py
 
+import atexit
 import logging
+import sys
 import time
-import tkinter as tk
 from collections.abc import Iterable
-from threading import Lock
-from tkinter import messagebox
+from logging.handlers import RotatingFileHandler, MemoryHandler, QueueHandler, QueueListener
+from queue import SimpleQueue, Empty
+from threading import Lock, current_thread, main_thread
 
 
 class Record:
 
-    def __init__(self, log_text=None, log_file='process.log'):
-        logging.basicConfig(
-            filename=log_file,
-            filemode='w',
-            format='%(asctime)s - %(pathname)s[line: %(lineno)d] - %(levelname)s - %(message)s',
-            level=logging.INFO
+    def __init__(self, log_text=None, log_file='process.log', max_bytes=5 * 1024 * 1024, backup_count=3,
+                 encoding='utf-8', buffer_size=64, background=False, headless=False):
+        # 编码在初始化时确定，无法编码的字符转义后写入，不再每次检查日志文件
+        handler = RotatingFileHandler(
+            log_file,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding=encoding,
+            errors='backslashreplace',
+            delay=True
         )
+        handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(pathname)s[line: %(lineno)d] - %(levelname)s - %(message)s'
+        ))
+        self.logger = logging.getLogger(f'{__name__}.{id(self)}')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.listener = None
+        if background:
+            # 后台线程负责写文件
+            log_queue = SimpleQueue()
+            self.listener = QueueListener(log_queue, handler)
+            self.listener.start()
+            self.handler = QueueHandler(log_queue)
+        else:
+            # 缓冲写入，满 buffer_size 条或出现错误时落盘
+            self.handler = MemoryHandler(buffer_size, flushLevel=logging.ERROR, target=handler)
+        self.file_handler = handler
+        self.logger.addHandler(self.handler)
+        atexit.register(self.close)
+
         self.lock = Lock()
         self.log_text = log_text
-        self.encoding_error_flag = False
+        # 无界面时（命令行）文本及错误输出到 stderr，不弹窗
+        self.headless = headless
+        # 其他线程待显示的输出
+        self.pending = SimpleQueue()
+
+    def close(self):
+        if self.handler is None: return
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
+        if self.listener is not None:
+            self.listener.stop()
+        self.file_handler.close()
+        self.handler = None
+
+    def set_level(self, level):
+        self.logger.setLevel(getattr(logging, level.upper()))
+
+    def is_enabled(self, level='info'):
+        # 用于调用方在拼接日志前判断是否需要记录
+        return self.handler is not None and self.logger.isEnabledFor(getattr(logging, level.upper()))
 
     @staticmethod
     def format_string(*items, extract=True):
@@ -38,18 +83,9 @@ class Record:
     def lock_logging(self, msg, level='info'):
         level = level.lower()
         if level in ['error', 'warning', 'info', 'debug']:
-            try:
-                if not self.encoding_error_flag:
-                    with open('process.log', encoding='utf-8') as f:
-                        f.read()
-                    # with open('process1.log', 'w') as f:
-                    #     f.write(f'{Record.get_format_current_time()} - {level} - ' + msg + '\n')
-                func = getattr(logging, level)
-                func(msg)
-            except UnicodeEncodeError as e:
-                self.encoding_error_flag = True
-                print(e)
-            return
+            # 已关闭则不再记录
+            if self.handler is None: return
+            self.logger.log(getattr(logging, level.upper()), msg)
         else:
             raise ValueError(f'Input level "{level}" is invalid, not in ["error", "warning", "info", "debug"].')
 
@@ -57,21 +93,46 @@ class Record:
         if out is not None:
             out.write(msg)
         if self.log_text is not None:
+            import tkinter as tk
+
             self.log_text.config(state='normal')
             self.log_text.insert(tk.END, msg + "\n")
             self.log_text.see(tk.END)
             self.log_text.config(state='disabled')
 
     def lock_output(self, *msg, level='info', out='log', msg_extract=True):
+        level = level.lower()
+        msg = Record.format_string(*msg, extract=msg_extract)
         with self.lock:
-            level = level.lower()
-            msg = Record.format_string(*msg, extract=msg_extract)
             if 'log' in out or 'all' in out:
                 self.lock_logging(msg, level=level)
-            if 'text' in out or 'all' in out:
-                self.lock_print(msg)
-            if level == 'error':
-                messagebox.showerror('错误', msg)
+        show_text = 'text' in out or 'all' in out
+        if not show_text and level != 'error': return
+        if current_thread() is not main_thread() and not self.headless:
+            # Tk 只能在主线程中操作，其他线程的输出交由主线程 flush_pending 显示
+            self.pending.put((msg, show_text, level == 'error'))
+            return
+        self._show(msg, show_text, level == 'error')
+
+    def _show(self, msg, show_text, show_error):
+        if self.headless:
+            print(f'错误：{msg}' if show_error else msg, file=sys.stderr)
+            return
+        if show_text:
+            self.lock_print(msg)
+        if show_error:
+            # 只有界面才用到 tkinter，命令行在没有 Tk 的环境中也能运行
+            from tkinter import messagebox
+
+            messagebox.showerror('错误', msg)
+
+    def flush_pending(self):
+        while True:
+            try:
+                item = self.pending.get_nowait()
+            except Empty:
+                break
+            self._show(*item)
 
     def LogWrapper(self, retry=True, pop_up=False):
         def wrapper(func):
@@ -87,6 +148,8 @@ class Record:
                                          f'func: {func.__name__}, args:{args}, kwargs: {kwargs}, message: {message}',
                                          level='error', out='all')
                         if pop_up:
+                            from tkinter import messagebox
+
                             messagebox.showerror('错误', '程序出了一些错误，请查看日志文件。')
 
             return inner
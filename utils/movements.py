@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : movements.py
+
+from .stats import update_statistics_batch
+
+MOVEMENT_COLUMNS = ['product_id', 'bottles', 'unit_price', 'total_price', 'settled']
+
+
+def save_movements(db, data, mode='in', day=None):
+    """
+    批量写入出入库记录，data 为包含 MOVEMENT_COLUMNS 的 DataFrame，数量及单价均以瓶为单位。
+    记录与统计在同一事务中提交，返回写入的条数。
+    """
+    if mode not in ['in', 'out']:
+        raise ValueError(f'Input mode "{mode}" is invalid, not in ["in", "out"].')
+    rows = data[MOVEMENT_COLUMNS].astype(object).values.tolist()
+    if not rows: return 0
+    with db.transaction():
+        db.exec_sql(
+            f'INSERT INTO {mode}_records (`product_id`, `bottles`, `unit_price`, `total_price`, `settled`) '
+            f'VALUES (?, ?, ?, ?, ?)',
+            rows,
+            mode='multi'
+        )
+        update_statistics_batch(
+            db,
+            [(product_id, bottles, total_price, settled) for product_id, bottles, _, total_price, settled in rows],
+            mode=mode,
+            day=day
+        )
+    db.recorder.lock_output(f'Saved {len(rows)} {mode} records.')
+    return len(rows)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : products.py
+
+import os
+
+PRODUCT_COLUMNS = ['id', 'name', 'num']
+
+
+def read_product_file(path):
+    import pandas as pd
+
+    # 第一行为表头，依次为商品编号、商品名称、每箱瓶数，第四列条码可选
+    options = dict(header=None, skiprows=1, dtype=str)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        data = pd.read_csv(path, encoding='utf-8-sig', **options)
+    elif ext in ['.xlsx', '.xls']:
+        data = pd.read_excel(path, **options)
+    else:
+        raise ValueError(f'Unsupported file type "{ext}", expect .xlsx or .csv.')
+    data = data.iloc[:, :4]
+    data.columns = (PRODUCT_COLUMNS + ['barcode'])[:data.shape[1]]
+    if 'barcode' not in data:
+        data['barcode'] = None
+    return data
+
+
+def import_products(db, path, update=False, progress=None):
+    """
+    批量导入商品，整表去重后一次写入，缺少字段或每箱瓶数不是数字的行跳过。
+    update 为 True 时更新已存在商品的名称、每箱瓶数及条码，否则跳过。
+    返回 {'inserted': n, 'updated': n, 'skipped': n}。
+    """
+    import pandas as pd
+
+    report = progress or (lambda *args, **kwargs: None)
+    report(0, 3, '正在读取文件...')
+    data = read_product_file(path)
+    total = len(data)
+    data = data.dropna(subset=PRODUCT_COLUMNS)
+    data['id'] = data['id'].str.strip()
+    data = data[data['id'] != '']
+    # 每箱瓶数不是整数（如 12瓶、12.5）的行跳过，计入 skipped；12.0 视为 12
+    data['num'] = pd.to_numeric(data['num'].str.strip(), errors='coerce')
+    data = data[data['num'].notna() & (data['num'] % 1 == 0)]
+    data['num'] = data['num'].astype('int64')
+    # 文件内重复的编号保留最后一条
+    data = data.drop_duplicates(subset='id', keep='last')
+    data['barcode'] = data['barcode'].astype(object).where(data['barcode'].notna(), None)
+
+    report(1, 3, '正在检查已有商品...')
+    with db.transaction():
+        # 通过临时表一次查出已存在的编号
+        db.exec_sql('CREATE TEMP TABLE IF NOT EXISTS import_ids (id TEXT PRIMARY KEY)')
+        db.exec_sql('DELETE FROM import_ids')
+        db.exec_sql('INSERT OR IGNORE INTO import_ids (id) VALUES (?)', [(i, ) for i in data['id']], mode='multi')
+        existing, _ = db.exec_sql('SELECT i.`id` FROM import_ids i JOIN products p ON p.`id` = i.`id`')
+        db.exec_sql('DROP TABLE import_ids')
+        exists = data['id'].isin({row[0] for row in existing})
+
+        report(2, 3, '正在写入商品...')
+        new_rows = data.loc[~exists, PRODUCT_COLUMNS + ['barcode']].astype(object).values.tolist()
+        if new_rows:
+            db.exec_sql('INSERT OR IGNORE INTO products (`id`, `Name`, `BottlesPerBox`, `barcode`) VALUES (?, ?, ?, ?)',
+                        new_rows, mode='multi')
+        updated = 0
+        if update:
+            update_rows = data.loc[exists, ['name', 'num', 'barcode', 'id']].astype(object).values.tolist()
+            if update_rows:
+                # 文件中没有条码时保留原条码
+                db.exec_sql(
+                    'UPDATE products SET `Name` = ?, `BottlesPerBox` = ?, `barcode` = COALESCE(?, `barcode`) '
+                    'WHERE `id` = ?',
+                    update_rows, mode='multi'
+                )
+            updated = len(update_rows)
+
+    result = {'inserted': len(new_rows), 'updated': updated, 'skipped': total - len(new_rows) - updated}
+    db.recorder.lock_output(f'Imported products from {path}: {result}')
+    return result
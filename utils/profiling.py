@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : profiling.py
+
+import importlib
+import json
+import sys
+import time
+from threading import Lock
+
+
+class StartupTimer:
+    """
+    记录启动各阶段耗时及各阶段新导入的模块，类似 -X importtime 的分阶段汇总。
+    mark(name) 结束当前阶段；time_import(module) 单独记录一个模块的导入耗时（可在后台线程调用）。
+    """
+
+    def __init__(self, start=None):
+        self.start = start if start is not None else time.perf_counter()
+        self.last = self.start
+        self.modules = set(sys.modules)
+        self.phases = []
+        self.imports = []
+        self.lock = Lock()
+
+    def mark(self, name):
+        now = time.perf_counter()
+        with self.lock:
+            current = set(sys.modules)
+            new = sorted({module.split('.')[0] for module in current - self.modules})
+            self.modules = current
+            self.phases.append({
+                'phase': name,
+                'ms': round((now - self.last) * 1000, 2),
+                'since_start_ms': round((now - self.start) * 1000, 2),
+                'new_modules': new,
+            })
+            self.last = now
+
+    def time_import(self, module):
+        start = time.perf_counter()
+        importlib.import_module(module)
+        with self.lock:
+            self.imports.append({'module': module, 'ms': round((time.perf_counter() - start) * 1000, 2)})
+
+    def to_dict(self):
+        with self.lock:
+            return {'phases': list(self.phases), 'background_imports': list(self.imports)}
+
+    def report(self):
+        data = self.to_dict()
+        lines = ['Startup timing:']
+        for phase in data['phases']:
+            modules = ', '.join(phase['new_modules'][:10])
+            more = len(phase['new_modules']) - 10
+            lines.append(f"  {phase['phase']:<16}{phase['ms']:>10.2f} ms  (at {phase['since_start_ms']:.2f} ms)"
+                         + (f"  imports: {modules}" if modules else '')
+                         + (f" ... +{more}" if more > 0 else ''))
+        for item in data['background_imports']:
+            lines.append(f"  [background] {item['module']:<32}{item['ms']:>10.2f} ms")
+        return '\n'.join(lines)
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
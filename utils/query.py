@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : query.py
+
+# 参数化 sql 构造。表名、列名只允许标识符并加反引号，值全部以 ? 绑定；
+# 结构相同的查询得到相同的 sql 文本，可复用 sqlite3 的预编译语句缓存。
+#
+# where 为 {条件: 值} 或 [(条件, 值), ...]，条件为 "列名" 或 "列名 运算符"，多个条件以 AND 连接：
+#     {'id': 'A1'}                      -> `id` = ?
+#     {'Name LIKE': '%可乐%'}            -> `Name` LIKE ?
+#     {'day BETWEEN': (start, end)}     -> `day` BETWEEN ? AND ?
+#     {'id IN': ['A1', 'A2']}           -> `id` IN (?, ?)
+# order 为列名或列名列表，列名前加 - 表示倒序；join 为 (表名, 左列, 右列)，左连接。
+
+import re
+from functools import lru_cache
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+FUNCTION = re.compile(r'^(COUNT|MIN|MAX|SUM|AVG|TOTAL)\(\s*([^()\s]+)\s*\)$', re.IGNORECASE)
+OPERATORS = {'=', '!=', '<>', '<', '<=', '>', '>=', 'LIKE', 'GLOB', 'BETWEEN', 'IN', 'NOT IN'}
+
+
+def quote(name):
+    # 列名可为 table.column、* 或 MIN(column) 等聚合函数
+    if name == '*':
+        return name
+    match = FUNCTION.match(name)
+    if match:
+        return f'{match.group(1).upper()}({quote(match.group(2))})'
+    parts = name.split('.')
+    for part in parts:
+        if part != '*' and not IDENTIFIER.match(part):
+            raise ValueError(f'Invalid identifier "{name}".')
+    return '.'.join(part if part == '*' else f'`{part}`' for part in parts)
+
+
+def _fields_sql(fields):
+    if isinstance(fields, str):
+        return quote(fields)
+    return ', '.join(map(quote, fields))
+
+
+def _parse_where(where):
+    # 返回 (结构, 参数)，结构只包含列名、运算符及参数个数，用作缓存的键
+    if not where:
+        return (), []
+    items = where.items() if isinstance(where, dict) else where
+    structure, params = [], []
+    for condition, value in items:
+        column, _, op = condition.strip().partition(' ')
+        op = ' '.join(op.split()).upper() or '='
+        if op not in OPERATORS:
+            raise ValueError(f'Invalid operator "{op}" in "{condition}".')
+        if op in ('BETWEEN', 'IN', 'NOT IN'):
+            value = list(value)
+            if op == 'BETWEEN' and len(value) != 2:
+                raise ValueError(f'BETWEEN expects 2 values, got {len(value)}.')
+            params.extend(value)
+            structure.append((column, op, len(value)))
+        else:
+            params.append(value)
+            structure.append((column, op, 1))
+    return tuple(structure), params
+
+
+def _where_sql(structure):
+    if not structure:
+        return ''
+    conditions = []
+    for column, op, count in structure:
+        if op == 'BETWEEN':
+            value = '? AND ?'
+        elif op in ('IN', 'NOT IN'):
+            value = '(' + ', '.join(['?'] * count) + ')'
+        else:
+            value = '?'
+        conditions.append(f'{quote(column)} {op} {value}')
+    return ' WHERE ' + ' AND '.join(conditions)
+
+
+def _order_sql(order):
+    if not order:
+        return ''
+    if isinstance(order, str):
+        order = [order]
+    items = [f'{quote(column[1:])} DESC' if column.startswith('-') else quote(column) for column in order]
+    return ' ORDER BY ' + ', '.join(items)
+
+
+def _freeze(value):
+    # 列表转为元组以便作为缓存的键
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+@lru_cache(maxsize=256)
+def _select(table, fields, where, order, join, limit, offset):
+    sql = f'SELECT {_fields_sql(fields)} FROM {quote(table)}'
+    if join:
+        other, left, right = join
+        sql += f' LEFT JOIN {quote(other)} ON {quote(left)} = {quote(right)}'
+    sql += _where_sql(where) + _order_sql(order)
+    if limit:
+        sql += ' LIMIT ?'
+    if offset:
+        sql += ' OFFSET ?'
+    return sql
+
+
+@lru_cache(maxsize=256)
+def _insert(table, keywords, count):
+    columns = f" ({', '.join(map(quote, keywords))})" if keywords else ''
+    return f"INSERT INTO {quote(table)}{columns} VALUES ({', '.join(['?'] * count)})"
+
+
+@lru_cache(maxsize=256)
+def _update(table, keywords, where):
+    return f"UPDATE {quote(table)} SET {', '.join(f'{quote(kw)} = ?' for kw in keywords)}" + _where_sql(where)
+
+
+@lru_cache(maxsize=256)
+def _delete(table, where):
+    return f'DELETE FROM {quote(table)}' + _where_sql(where)
+
+
+def select_sql(table, fields='*', where=None, order=None, limit=None, offset=None, join=None):
+    """
+    返回 (sql, 参数)。limit / offset 同样以参数绑定，不同的分页共用一条语句。
+    """
+    structure, params = _parse_where(where)
+    if offset is not None and limit is None:
+        # sqlite 的 OFFSET 必须跟在 LIMIT 之后
+        limit = -1
+    sql = _select(table, _freeze(fields), structure, _freeze(order), _freeze(join),
+                  limit is not None, offset is not None)
+    if limit is not None: params.append(limit)
+    if offset is not None: params.append(offset)
+    return sql, params
+
+
+def insert_sql(table, count, keywords=()):
+    return _insert(table, _freeze(keywords), count)
+
+
+def update_sql(table, values, where=None):
+    # values 为 {列名: 值}
+    structure, params = _parse_where(where)
+    return _update(table, tuple(values), structure), list(values.values()) + params
+
+
+def delete_sql(table, where=None):
+    structure, params = _parse_where(where)
+    return _delete(table, structure), params
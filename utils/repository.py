@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : repository.py
+
+from collections import OrderedDict
+
+PRODUCT_FIELDS = ('id', 'Name', 'BottlesPerBox')
+
+
+class ProductRepository:
+    """
+    商品信息的缓存，位于 SqliteOperation 之上，供界面各处读取商品。
+    商品按编号做 LRU 缓存，经由本类写入时同步使缓存失效；
+    其他连接（如后台导入）修改商品后需调用 invalidate。
+    """
+
+    def __init__(self, db, max_size=1024):
+        self.db = db
+        self.max_size = max_size
+        # product_id -> (id, name, bottles_per_box)
+        self.cache = OrderedDict()
+
+    def _put(self, product):
+        self.cache[product[0]] = product
+        self.cache.move_to_end(product[0])
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    def get(self, product_id):
+        # 返回 (编号, 名称, 每箱瓶数)，不存在时返回 None，不缓存不存在的编号
+        if not product_id: return None
+        product = self.cache.get(product_id)
+        if product is not None:
+            self.cache.move_to_end(product_id)
+            return product
+        result, _ = self.db.search('products', field=PRODUCT_FIELDS, where={'id': product_id})
+        if not result: return None
+        product = tuple(result[0])
+        self._put(product)
+        return product
+
+    def find(self, keyword):
+        # 按编号或名称查找商品
+        product = self.get(keyword)
+        if product is not None: return product
+        result, _ = self.db.search('products', field=PRODUCT_FIELDS, where={'Name': keyword}, limit=1)
+        if not result: return None
+        product = tuple(result[0])
+        self._put(product)
+        return product
+
+    def bottles_per_box(self, product_id):
+        product = self.get(product_id)
+        return int(product[2] or 0) if product is not None else 0
+
+    def add(self, product_id, name, bottles_per_box):
+        _, flag = self.db.insert('products', [product_id, name, bottles_per_box], keywords=PRODUCT_FIELDS)
+        # 写入后使缓存失效，下次读取时按数据库中的类型重新缓存
+        if flag: self.invalidate(product_id)
+        return flag
+
+    def invalidate(self, product_id=None):
+        if product_id is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(product_id, None)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : schema.py
+
+# 数据库结构的版本迁移，版本号保存在 PRAGMA user_version 中。
+# MIGRATIONS[i] 将数据库从版本 i 升级到 i + 1，每一项为 sql 语句或接收 db 的函数。
+# 已发布的迁移不要修改，新的结构变更只在末尾追加；迁移中用到的函数也在本文件中固定下来，
+# 不调用之后会继续修改的业务代码。
+
+
+def rebuild_statistics_v3(db):
+    """
+    版本 3 的 statistics / stock 计算：按时间顺序遍历当时的出入库表，
+    入库按移动加权平均更新成本，出库按出库时的平均成本计算利润。
+    """
+    cursor = db.return_driver().execute('''
+        SELECT `in_time` AS time, 1 AS direction, `id`, `product_id`, `bottles`, `total_price`, `settled`
+        FROM in_records
+        UNION ALL
+        SELECT `out_time` AS time, 0 AS direction, `id`, `product_id`, `bottles`, `total_price`, `settled`
+        FROM out_records
+        ORDER BY time, direction DESC, `id`
+    ''')
+    stock, days = {}, {}
+    for time, direction, _, product_id, bottles, total_price, settled in cursor:
+        state = stock.setdefault(product_id, [0, 0.0, time])
+        row = days.get((product_id, str(time)[:10]))
+        if row is None:
+            row = days[(product_id, str(time)[:10])] = [state[0], 0, 0, 0.0, 0.0, True, 0.0]
+        if direction:
+            on_hand = max(state[0], 0)
+            if bottles > 0:
+                state[1] = (on_hand * state[1] + total_price) / (on_hand + bottles)
+            state[0] += bottles
+            row[1] += bottles
+            row[3] += total_price
+        else:
+            row[6] += total_price - bottles * state[1]
+            state[0] -= bottles
+            row[2] += bottles
+            row[4] += total_price
+        row[5] = row[5] and bool(settled)
+        state[2] = time
+
+    db.exec_sql('DELETE FROM statistics')
+    db.exec_sql('DELETE FROM stock')
+    db.exec_sql(
+        '''
+        INSERT INTO statistics (
+            product_id, day, origin, in_total, out_total, in_unit_price, out_unit_price, settled, profit
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''',
+        [
+            (product_id, day, origin, in_total, out_total,
+             in_amount / in_total if in_total else 0, out_amount / out_total if out_total else 0, settled, profit)
+            for (product_id, day), (origin, in_total, out_total, in_amount, out_amount, settled, profit)
+            in days.items()
+        ],
+        mode='multi'
+    )
+    db.exec_sql('INSERT INTO stock (product_id, bottles, avg_cost, updated) VALUES (?, ?, ?, ?)',
+                [(product_id, *state) for product_id, state in stock.items()], mode='multi')
+
+
+MIGRATIONS = [
+    # 1: 初始表结构
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS in_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            in_time DATETIME DEFAULT (datetime('now', 'localtime')) NOT NULL,
+            product_id TEXT NOT NULL,
+            bottles INTEGER NOT NULL,
+            unit_price REAL NOT NULL,
+            total_price REAL NOT NULL,
+            settled BOOLEAN DEFAULT FALSE,
+            FOREIGN KEY (product_id) REFERENCES products (`id`)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS out_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            out_time DATETIME DEFAULT (datetime('now', 'localtime')) NOT NULL,
+            product_id TEXT NOT NULL,
+            bottles INTEGER NOT NULL,
+            unit_price REAL NOT NULL,
+            total_price REAL NOT NULL,
+            settled BOOLEAN DEFAULT FALSE,
+            FOREIGN KEY (product_id) REFERENCES products (`id`)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS products (
+            id TEXT PRIMARY KEY,
+            Name TEXT,
+            BottlesPerBox INTEGER DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS statistics (
+            product_id TEXT,
+            day TEXT DEFAULT (DATE('now')) NOT NULL,
+            origin INTEGER DEFAULT 0 NOT NULL,
+            in_total INTEGER DEFAULT 0 NOT NULL,
+            out_total INTEGER DEFAULT 0 NOT NULL,
+            in_unit_price REAL DEFAULT 0 NOT NULL,
+            out_unit_price REAL DEFAULT 0 NOT NULL,
+            settled BOOLEAN DEFAULT FALSE,
+            profit REAL DEFAULT 0 NOT NULL,
+            FOREIGN KEY (product_id) REFERENCES products (`id`)
+        )
+        ''',
+    ],
+    # 2: 按商品、时间查询及按时间导出使用的索引
+    [
+        'CREATE INDEX IF NOT EXISTS idx_in_records_product_time ON in_records (product_id, in_time)',
+        'CREATE INDEX IF NOT EXISTS idx_out_records_product_time ON out_records (product_id, out_time)',
+        'CREATE INDEX IF NOT EXISTS idx_in_records_time ON in_records (in_time)',
+        'CREATE INDEX IF NOT EXISTS idx_out_records_time ON out_records (out_time)',
+        'CREATE INDEX IF NOT EXISTS idx_statistics_product_day ON statistics (product_id, day)',
+        'CREATE INDEX IF NOT EXISTS idx_statistics_day ON statistics (day)',
+    ],
+    # 3: 库存表，statistics 改为每个商品每天一行，并由出入库记录重新计算
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS stock (
+            product_id TEXT PRIMARY KEY,
+            bottles INTEGER DEFAULT 0 NOT NULL,
+            avg_cost REAL DEFAULT 0 NOT NULL,
+            updated DATETIME,
+            FOREIGN KEY (product_id) REFERENCES products (`id`)
+        )
+        ''',
+        rebuild_statistics_v3,
+        'DROP INDEX IF EXISTS idx_statistics_product_day',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_statistics_product_day ON statistics (product_id, day)',
+    ],
+    # 4: 商品条码，出入库记录的来源键（防止重复导入），已导入文件
+    [
+        'ALTER TABLE products ADD COLUMN barcode TEXT',
+        'CREATE INDEX IF NOT EXISTS idx_products_barcode ON products (barcode)',
+        'ALTER TABLE in_records ADD COLUMN source_key TEXT',
+        'ALTER TABLE out_records ADD COLUMN source_key TEXT',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_in_records_source ON in_records (source_key) '
+        'WHERE source_key IS NOT NULL',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_out_records_source ON out_records (source_key) '
+        'WHERE source_key IS NOT NULL',
+        '''
+        CREATE TABLE IF NOT EXISTS ingested_files (
+            file_hash TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            rows INTEGER DEFAULT 0 NOT NULL,
+            inserted INTEGER DEFAULT 0 NOT NULL,
+            skipped INTEGER DEFAULT 0 NOT NULL,
+            ingested DATETIME DEFAULT (datetime('now', 'localtime')) NOT NULL
+        )
+        ''',
+    ],
+    # 5: 按年归档的出入库记录文件，until 为已归档到的时间（不含）
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS archives (
+            year INTEGER PRIMARY KEY,
+            path TEXT NOT NULL,
+            in_rows INTEGER DEFAULT 0 NOT NULL,
+            out_rows INTEGER DEFAULT 0 NOT NULL,
+            until TEXT NOT NULL,
+            updated DATETIME DEFAULT (datetime('now', 'localtime')) NOT NULL
+        )
+        ''',
+    ],
+    # 6: 导入失败的文件记录错误信息，内容不变时不再重试
+    [
+        'ALTER TABLE ingested_files ADD COLUMN error TEXT',
+    ],
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(db):
+    result, _ = db.exec_sql('PRAGMA user_version')
+    return result[0][0] if result else 0
+
+
+def migrate(db):
+    version = get_schema_version(db)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f'Database version {version} is newer than supported version {SCHEMA_VERSION}.')
+
+    for target, steps in enumerate(MIGRATIONS[version:], start=version + 1):
+        # 每个版本在一个事务中完成，失败则保持原版本
+        with db.transaction():
+            for step in steps:
+                if callable(step):
+                    step(db)
+                else:
+                    db.exec_sql(step)
+            db.exec_sql(f'PRAGMA user_version = {target}')
+        db.recorder.lock_output(f'Database migrated to version {target}.')
+    return SCHEMA_VERSION
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : search_index.py
+
+import heapq
+import re
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from functools import lru_cache
+from threading import Lock
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:
+    lazy_pinyin = None
+
+# GB2312 一级汉字按拼音排序，用各声母首字的编码作为分界
+_GB2312_INITIALS = [
+    (0xB0A1, 'a'), (0xB0C5, 'b'), (0xB2C1, 'c'), (0xB4EE, 'd'), (0xB6EA, 'e'),
+    (0xB7A2, 'f'), (0xB8C1, 'g'), (0xB9FE, 'h'), (0xBBF7, 'j'), (0xBFA6, 'k'),
+    (0xC0AC, 'l'), (0xC2E8, 'm'), (0xC4C3, 'n'), (0xC5B6, 'o'), (0xC5BE, 'p'),
+    (0xC6DA, 'q'), (0xC8BB, 'r'), (0xC8F6, 's'), (0xCBFA, 't'), (0xCDDA, 'w'),
+    (0xCEF4, 'x'), (0xD1B9, 'y'), (0xD4D1, 'z'), (0xD7FA, ''),
+]
+
+
+_GB2312_CODES = [code for code, _ in _GB2312_INITIALS]
+
+
+@lru_cache(maxsize=None)
+def char_initial(char):
+    if char.isascii():
+        return char.lower()
+    try:
+        code = int.from_bytes(char.encode('gb2312'), 'big')
+    except UnicodeEncodeError:
+        return char
+    i = bisect_right(_GB2312_CODES, code) - 1
+    # 二级汉字不按拼音排序，保留原字符
+    return _GB2312_INITIALS[i][1] if 0 <= i < len(_GB2312_INITIALS) - 1 else char
+
+
+def pinyin_initials(text):
+    if lazy_pinyin is not None:
+        return ''.join(
+            (item[0] if item else '').lower()
+            for item in lazy_pinyin(text, style=Style.FIRST_LETTER, errors=lambda x: list(x))
+        )
+    return ''.join(char_initial(char) for char in text)
+
+
+def grams(text):
+    # 单字及相邻两字，用于倒排表
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+@lru_cache(maxsize=256)
+def subsequence_pattern(kw):
+    # 正则在 C 中匹配，比逐字迭代快得多
+    return re.compile('.*?'.join(map(re.escape, kw)), re.S)
+
+
+# load 时整体替换的数据
+INDEX_FIELDS = ['ids', 'names', 'lower_names', 'initials', 'name_to_id', 'sorted_names', 'sorted_initials',
+                'name_postings', 'initial_postings']
+
+
+class ProductIndex:
+    """
+    商品名称的内存索引，启动时加载一次，products 变化时刷新。
+    支持子串、子序列及拼音首字母匹配，按匹配程度排序，同等程度下名称越短越靠前。
+    子串从关键词中最少见的单字或两字的倒排表中验证；子序列从最少见的字的倒排表中按顺序最多检查 scan_limit 个，
+    大量商品时只返回排序靠前的部分结果，保证每次查询的耗时有上限。
+    """
+
+    def __init__(self, scan_limit=2000):
+        self.scan_limit = scan_limit
+        self.lock = Lock()
+        self.clear()
+
+    def clear(self):
+        self.ids = []
+        self.names = []
+        self.lower_names = []
+        self.initials = []
+        self.name_to_id = {}
+        # 按名称、拼音首字母排序的 (key, 下标) 列表，用于二分查找前缀
+        self.sorted_names = []
+        self.sorted_initials = []
+        # 单字及两字 -> 商品下标 的倒排表，名称与拼音首字母分开，下标递增
+        self.name_postings = defaultdict(list)
+        self.initial_postings = defaultdict(list)
+
+    def __len__(self):
+        return len(self.names)
+
+    def load(self, db):
+        result, flag = db.exec_sql('SELECT `id`, `Name` FROM products WHERE `Name` IS NOT NULL')
+        if not flag: return False
+        # 按名称长度加载，下标顺序即为同等匹配程度下的排序
+        result.sort(key=lambda row: (len(str(row[1])), str(row[1])))
+        # 在锁外建立新索引后整体替换，加载期间仍可查询原有数据
+        index = ProductIndex(self.scan_limit)
+        for product_id, name in result:
+            index._add(product_id, str(name))
+        index.sorted_names = sorted((name, pos) for pos, name in enumerate(index.lower_names))
+        index.sorted_initials = sorted((initials, pos) for pos, initials in enumerate(index.initials))
+        with self.lock:
+            for field in INDEX_FIELDS:
+                setattr(self, field, getattr(index, field))
+        return True
+
+    def add(self, product_id, name):
+        if name is None: return
+        name = str(name)
+        with self.lock:
+            if name in self.name_to_id:
+                self.name_to_id[name] = product_id
+                return
+            pos = self._add(product_id, name)
+            insort(self.sorted_names, (self.lower_names[pos], pos))
+            insort(self.sorted_initials, (self.initials[pos], pos))
+
+    def _add(self, product_id, name):
+        pos = len(self.names)
+        lower_name = name.lower()
+        initials = pinyin_initials(name)
+        self.ids.append(product_id)
+        self.names.append(name)
+        self.lower_names.append(lower_name)
+        self.initials.append(initials)
+        self.name_to_id.setdefault(name, product_id)
+        for postings, text in [(self.name_postings, lower_name), (self.initial_postings, initials)]:
+            for gram in grams(text):
+                postings[gram].append(pos)
+        return pos
+
+    def get_id(self, name):
+        return self.name_to_id.get(name)
+
+    @staticmethod
+    def _prefix_range(sorted_keys, kw, limit):
+        start = bisect_left(sorted_keys, (kw, ))
+        end = bisect_left(sorted_keys, (kw + '\uffff', ))
+        return heapq.nsmallest(limit, (pos for _, pos in sorted_keys[start:end]))
+
+    @staticmethod
+    def _substring(postings, texts, kw):
+        # 单字、两字直接取倒排表，更长的关键词从最少见的两字片段的倒排表中验证
+        if len(kw) <= 2: return postings.get(kw, [])
+        rarest = min((postings.get(kw[i:i + 2], []) for i in range(len(kw) - 1)), key=len)
+        return (pos for pos in rarest if kw in texts[pos])
+
+    def _subsequence(self, postings, texts, kw):
+        # 子序列必然包含关键词的每个字，从最少见的字的倒排表中按顺序检查
+        rarest = min((postings.get(char, []) for char in set(kw)), key=len)
+        pattern = subsequence_pattern(kw)
+        return (pos for pos in rarest[:self.scan_limit] if pattern.search(texts[pos]))
+
+    def search(self, kw, limit=50):
+        kw = kw.strip().lower()
+        if not kw: return []
+        with self.lock:
+            result, seen = [], set()
+
+            def collect(positions):
+                for pos in positions:
+                    if pos in seen: continue
+                    seen.add(pos)
+                    result.append(pos)
+                    if len(result) >= limit: return True
+                return False
+
+            # 依次为：名称前缀、名称子串、首字母前缀、首字母子串、名称子序列、首字母子序列
+            tiers = [
+                lambda: self._prefix_range(self.sorted_names, kw, limit),
+                lambda: self._substring(self.name_postings, self.lower_names, kw),
+                lambda: self._prefix_range(self.sorted_initials, kw, limit),
+                lambda: self._substring(self.initial_postings, self.initials, kw),
+                lambda: self._subsequence(self.name_postings, self.lower_names, kw),
+                lambda: self._subsequence(self.initial_postings, self.initials, kw),
+            ]
+            for tier in tiers:
+                if collect(tier()): break
+            return [self.names[pos] for pos in result]
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : service.py
+
+# 不依赖 Tk 的业务接口，界面与命令行共用。
+
+import csv
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+
+from .archive import archive_records, record_segments, range_condition, closed_month
+from .export import export_records
+from .log import Record
+from .products import import_products
+from .repository import ProductRepository
+from .schema import migrate
+from .sql import SqliteOperation
+from .stats import update_statistics, apply_movements, rebuild_statistics, get_stock
+
+RECORD_COLUMNS = ['product_id', 'bottles', 'unit_price', 'total_price', 'settled']
+
+# 出入库 csv 的表头，中英文均可
+CSV_HEADERS = {
+    'product_id': ['product_id', 'id', 'barcode', '商品编号', '条码', '条形码'],
+    'bottles': ['bottles', 'quantity', '数量', '数量（瓶）'],
+    'unit_price': ['unit_price', 'price', '单价', '单价（瓶）'],
+    'total_price': ['total_price', 'total', '总价'],
+    'settled': ['settled', '是否结清', '结算状态'],
+    'time': ['time', 'in_time', 'out_time', '时间'],
+    'direction': ['direction', 'mode', 'type', '类型'],
+}
+DIRECTIONS = {'in': 'in', 'out': 'out', '入库': 'in', '出库': 'out', '入': 'in', '出': 'out'}
+SETTLED_FALSE = {'', '0', 'false', 'no', 'n', '否', '未结清'}
+
+
+def parse_settled(value):
+    return 0 if str(value).strip().lower() in SETTLED_FALSE else 1
+
+
+# 记录时间统一保存为 TIME_FORMAT，导入时另外接受以下写法
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+TIME_FORMATS = ['%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M', '%Y/%m/%d', '%Y%m%d%H%M%S', '%Y%m%d']
+
+
+def parse_time(value):
+    # 解析失败时抛出 ValueError；ISO 格式（2024-01-02 03:04:05、2024-01-02T03:04、2024-01-02）走快速路径
+    value = value.strip()
+    try:
+        return datetime.fromisoformat(value).strftime(TIME_FORMAT)
+    except ValueError:
+        pass
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime(TIME_FORMAT)
+        except ValueError:
+            continue
+    raise ValueError(f'Invalid time "{value}".')
+
+
+def _header_index(fieldnames):
+    # 列名 -> 文件中的列号
+    normalized = [name.strip().lower() for name in fieldnames]
+    index = {}
+    for key, names in CSV_HEADERS.items():
+        for name in names:
+            if name.lower() in normalized:
+                index[key] = normalized.index(name.lower())
+                break
+    return index
+
+
+class InventoryService:
+    """
+    出入库、统计、导入导出的业务接口，只依赖 SqliteOperation。
+    界面中同步调用，也可以在命令行或后台线程中使用（每个线程使用各自的连接）。
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.products = ProductRepository(db)
+
+    @classmethod
+    def open(cls, db_name='data.db', log_file='process.log', log_level='info'):
+        # 命令行使用：无界面的日志，升级数据库结构
+        recorder = Record(log_file=log_file, headless=True)
+        recorder.set_level(log_level)
+        db = SqliteOperation(db_name, recorder)
+        migrate(db)
+        db.exec_sql('PRAGMA journal_mode=WAL')
+        return cls(db)
+
+    def close(self):
+        self.db.close()
+        self.db.recorder.close()
+
+    def record_movement(self, product_id, quantity, unit_price, settled=True, mode='in', unit='瓶'):
+        """
+        新增一笔出入库，unit 为 箱 时按每箱瓶数换算为瓶，记录与统计在同一事务中提交。
+        商品不存在或按箱录入但未设置每箱瓶数时抛出 ValueError。
+        返回 [product_id, 瓶数, 每瓶单价, 总价, 是否结清]。
+        """
+        if mode not in ['in', 'out']:
+            raise ValueError(f'Input mode "{mode}" is invalid, not in ["in", "out"].')
+        product = self.products.get(product_id)
+        if product is None:
+            raise ValueError(f'Product "{product_id}" does not exist.')
+        total_price = quantity * unit_price
+        if unit == '箱':
+            per_box = int(product[2] or 0)
+            if per_box <= 0:
+                raise ValueError(f'Product "{product_id}" has no bottles per box, cannot record by box.')
+            quantity *= per_box
+            unit_price /= per_box
+        data = [product_id, quantity, unit_price, total_price, settled]
+        with self.db.transaction():
+            self.db.insert(f'{mode}_records', data, keywords=RECORD_COLUMNS)
+            update_statistics(self.db, *data, mode=mode)
+        return data
+
+    def _search_in(self, table, field, column, values, chunk_size=500):
+        # 分批 IN 查询，每批参数个数低于 sqlite 的变量上限
+        values = list(values)
+        result = []
+        for i in range(0, len(values), chunk_size):
+            rows, _ = self.db.search(table, field=field, where={f'{column} IN': values[i:i + chunk_size]})
+            result.extend(rows)
+        return result
+
+    def resolve_products(self, codes):
+        # 商品编号或条码 -> 商品编号，找不到的不在结果中
+        codes = set(codes)
+        mapping = {row[0]: row[0] for row in self._search_in('products', 'id', 'id', codes)}
+        rest = codes - set(mapping)
+        if rest:
+            for product_id, barcode in self._search_in('products', ('id', 'barcode'), 'barcode', rest):
+                mapping.setdefault(barcode, product_id)
+        return mapping
+
+    def _write_batch(self, rows):
+        # rows: [(mode, time, 编号或条码, bottles, unit_price, total_price, settled, source_key), ...]
+        products = self.resolve_products({row[2] for row in rows})
+        groups = {}
+        for i, (mode, record_time, code, *values) in enumerate(rows):
+            if code in products:
+                # 没有来源键的行以序号区分，有来源键的同一批内去重
+                key = values[-1] if values[-1] is not None else i
+                groups.setdefault(mode, {})[key] = (i, record_time, products[code], *values)
+        # 来源键已存在的记录之前导入过，跳过；主库中没有的再到记录时间所在年份的归档中查找
+        for mode, keyed in groups.items():
+            keys = [key for key in keyed if isinstance(key, str)]
+            for (key, ) in self._search_in(f'{mode}_records', 'source_key', 'source_key', keys):
+                keyed.pop(key, None)
+            keys = [key for key in keys if key in keyed]
+            if not keys: continue
+            times = sorted(str(keyed[key][1]) for key in keys)
+            until = f'{int(times[-1][:4]) + 1:04d}-01-01'
+            for start, end, schema in record_segments(self.db, times[0], until):
+                if schema is None: continue
+                archived = [key for key in keys if start <= str(keyed[key][1]) < end]
+                for (key, ) in self._search_in(f'{schema}.{mode}_records', 'source_key', 'source_key', archived):
+                    keyed.pop(key, None)
+        # 与 rebuild_statistics 相同的顺序：时间、同一时间入库在前、文件中的顺序
+        items = sorted(
+            ((record_time, int(mode == 'in'), i, product_id, bottles, unit_price, total_price, settled, key)
+             for mode, keyed in groups.items()
+             for i, record_time, product_id, bottles, unit_price, total_price, settled, key in keyed.values()),
+            key=lambda item: (item[0], -item[1], item[2])
+        )
+        if not items: return 0
+        with self.db.transaction():
+            for mode, direction in [('in', 1), ('out', 0)]:
+                records = [(item[0], *item[3:]) for item in items if item[1] == direction]
+                if records:
+                    self.db.insert(f'{mode}_records', records, mode='multi',
+                                   keywords=[f'{mode}_time'] + RECORD_COLUMNS + ['source_key'])
+            # 批内跨多天、出入库交错，按时间顺序累计后写入统计及库存
+            apply_movements(self.db, [
+                (record_time, direction, i, product_id, bottles, total_price, settled)
+                for record_time, direction, i, product_id, bottles, _, total_price, settled, _ in items
+            ])
+        return len(items)
+
+    def ingest_csv(self, path, mode=None, batch_size=5000, progress=None, source=None):
+        """
+        流式读取出入库 csv，每 batch_size 行在一个事务中写入记录并合并更新统计。
+        表头见 CSV_HEADERS，至少包含商品编号（或条码）、数量及单价或总价；没有类型列时使用 mode，
+        没有时间列或时间为空时使用当前时间。商品不存在、数据或时间有误、已导入过的行跳过。
+        source 不为空时每行以 (source, 行号, 内容) 生成来源键，同一文件重复导入不会重复记录。
+        每批按时间顺序计入统计，文件按时间排序时结果与 rebuild_statistics 相同；
+        补录早于已有记录的数据后可执行 rebuild_statistics 重新计算成本。
+        返回 {'rows', 'inserted', 'skipped', 'seconds'}。
+        """
+        start = time.perf_counter()
+        rows = inserted = skipped = 0
+        batch = []
+        now = datetime.now().strftime(TIME_FORMAT)
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            index = _header_index(next(reader, []))
+            missing = [key for key in ['product_id', 'bottles'] if key not in index]
+            if 'unit_price' not in index and 'total_price' not in index:
+                missing.append('unit_price')
+            if mode is None and 'direction' not in index:
+                missing.append('direction')
+            if missing:
+                raise ValueError(f'Missing columns {missing} in "{path}".')
+            get = {key: (lambda row, i=i: row[i] if i < len(row) else '') for key, i in index.items()}
+
+            for line in reader:
+                rows += 1
+                try:
+                    direction = DIRECTIONS[get['direction'](line).strip()] if 'direction' in get else mode
+                    bottles = int(float(get['bottles'](line)))
+                    if 'unit_price' in get:
+                        unit_price = float(get['unit_price'](line))
+                        total_price = float(get['total_price'](line)) if 'total_price' in get \
+                            else bottles * unit_price
+                    else:
+                        total_price = float(get['total_price'](line))
+                        unit_price = total_price / bottles if bottles else 0
+                    # 时间无法解析的行跳过，其余统一为 TIME_FORMAT，与界面录入的记录一致、可按字符串比较
+                    record_time = get['time'](line).strip() if 'time' in get else ''
+                    record_time = parse_time(record_time) if record_time else now
+                    key = None
+                    if source is not None:
+                        digest = hashlib.sha1(','.join(line).encode('utf-8')).hexdigest()[:16]
+                        key = f'{source}:{reader.line_num}:{digest}'
+                    batch.append((
+                        direction, record_time, get['product_id'](line).strip(), bottles, unit_price,
+                        total_price, parse_settled(get['settled'](line)) if 'settled' in get else 1, key
+                    ))
+                except (KeyError, ValueError):
+                    skipped += 1
+                    continue
+                if len(batch) >= batch_size:
+                    written = self._write_batch(batch)
+                    inserted += written
+                    skipped += len(batch) - written
+                    batch = []
+                    if progress is not None: progress(rows)
+            if batch:
+                written = self._write_batch(batch)
+                inserted += written
+                skipped += len(batch) - written
+                if progress is not None: progress(rows)
+
+        result = {'rows': rows, 'inserted': inserted, 'skipped': skipped,
+                  'seconds': round(time.perf_counter() - start, 3)}
+        self.db.recorder.lock_output(f'Ingested {path}: {result}')
+        return result
+
+    def import_products(self, path, update=False, progress=None):
+        result = import_products(self.db, path, update=update, progress=progress)
+        self.products.invalidate()
+        return result
+
+    def export(self, start_time, end_time, keep_dir, fmt='xlsx', names=('in', 'out'), progress=None):
+        # 结束时间不包含在内，返回 {name: 导出的行数}
+        os.makedirs(keep_dir, exist_ok=True)
+        return {
+            name: export_records(self.db, name, start_time, end_time, keep_dir, fmt=fmt, progress=progress)
+            for name in names
+        }
+
+    def rebuild_statistics(self):
+        return rebuild_statistics(self.db)
+
+    def archive(self, before=None, keep_months=12, vacuum=False):
+        """
+        归档 before（YYYY-MM）之前的出入库记录，未指定时保留最近 keep_months 个月及当月。
+        返回 {year: (入库条数, 出库条数)}。
+        """
+        return archive_records(self.db, before or closed_month(keep_months), vacuum=vacuum)
+
+    def report(self, start=None, end=None):
+        """
+        汇总区间内（日期，包含两端）的出入库及利润，以及当前库存。
+        """
+        start = start or '0000-01-01'
+        end = end or '9999-12-30'
+        # 记录时间带时分秒，按次日零点截止
+        end_time = (datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+        report = {'start': start, 'end': end}
+        for name in ['in', 'out']:
+            # 区间涉及已归档的年份时按年逐个附加，合计各表
+            totals = [0, 0, 0]
+            for segment_start, segment_end, schema in record_segments(self.db, start, end_time):
+                condition, params = range_condition(f'{name}_time', segment_start, segment_end)
+                for table in [f'main.{name}_records'] + ([f'{schema}.{name}_records'] if schema else []):
+                    result, _ = self.db.exec_sql(
+                        f'SELECT COUNT(*), COALESCE(SUM(`bottles`), 0), COALESCE(SUM(`total_price`), 0) FROM {table} '
+                        f'WHERE {condition}',
+                        params
+                    )
+                    for i, value in enumerate(result[0]):
+                        totals[i] += value
+            count, bottles, amount = totals
+            report[name] = {'records': count, 'bottles': bottles, 'amount': round(amount, 2)}
+        result, _ = self.db.exec_sql(
+            'SELECT COALESCE(SUM(`profit`), 0) FROM statistics WHERE `day` BETWEEN ? AND ?', (start, end)
+        )
+        report['profit'] = round(result[0][0], 2)
+        stock = get_stock(self.db)
+        report['stock'] = {'products': len(stock), 'value': round(sum(item[4] or 0 for item in stock), 2)}
+        return report
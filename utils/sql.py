@@ -4,93 +4,163 @@
 # @FileName: sql_tools.py
 
 import sqlite3
+import time
+from contextlib import contextmanager
+
+from .query import quote, select_sql, insert_sql, update_sql, delete_sql
+from .diagnostics import QUERY_STATS, is_explainable
 
 class SqliteOperation:
 
-    def __init__(self, db_name, recorder):
-        self.driver = sqlite3.connect(db_name)
+    def __init__(self, db_name, recorder, log_level='info', log_results=False, max_log_length=200,
+                 cached_statements=256, stats=QUERY_STATS):
+        # 参数化后语句文本固定，预编译语句缓存可以复用
+        self.driver = sqlite3.connect(db_name, cached_statements=cached_statements)
         self.recorder = recorder
+        # sql 日志等级，以及是否完整记录查询结果（仅调试时开启）
+        self.log_level = log_level
+        self.log_results = log_results
+        self.max_log_length = max_log_length
+        # 事务嵌套层数，大于 0 时由 transaction 统一提交
+        self.tx_depth = 0
+        # 执行耗时、行数及提交次数统计，为 None 时不统计
+        self.stats = stats
 
     def return_driver(self):
         return self.driver
 
+    def _summary_args(self, args, mode='single'):
+        if not args:
+            return '[]'
+        params = args[0]
+        if mode != 'single':
+            # 批量执行只记录条数，避免展开全部数据
+            return f'[{len(params)} rows]' if hasattr(params, '__len__') else '[iterator]'
+        text = ', '.join(map(str, params))
+        if len(text) > self.max_log_length:
+            text = text[:self.max_log_length] + '...'
+        return f'[{text}]'
+
     def exec_sql(self, sql, *args, mode='single'):
         try:
+            start = time.perf_counter()
             cursor = self.driver.cursor()
             # 执行 sql 语句
             if mode == 'single':
                 result = cursor.execute(sql, *args).fetchall()
             else:
                 result = cursor.executemany(sql, *args).fetchall()
-            # 提交 sql 语句
-            self.driver.commit()
-            self.recorder.lock_output(f"Execute '{sql}' successfully, args: [{', '.join(map(str, args))}], result: {result}")
+            # 只有写操作开启了隐式事务才需要提交，读操作不提交；显式事务中由 transaction 统一提交
+            if not self.tx_depth and self.driver.in_transaction:
+                self.driver.commit()
+                if self.stats is not None: self.stats.record_commit()
+            elapsed = (time.perf_counter() - start) * 1000
+            if self.stats is not None:
+                self.stats.record(sql, elapsed, len(result))
+                if self.stats.is_slow(elapsed): self._record_slow(sql, elapsed, args, mode)
+            # 日志等级未开启时不拼接日志内容
+            if self.recorder.is_enabled(self.log_level):
+                message = (f"Execute '{' '.join(sql.split())}' successfully, args: {self._summary_args(args, mode)}, "
+                           f"rows: {len(result)}, time: {elapsed:.2f} ms")
+                if self.log_results:
+                    message += f', result: {result}'
+                self.recorder.lock_output(message, level=self.log_level, msg_extract=False)
             return result, True
         except Exception as e:
-            sql = sql.replace('\n', '')
-            self.recorder.lock_output(f"Execute '{sql}' error, args: [{', '.join(map(str, args))}], {e}", level='error', out='all')
+            sql = ' '.join(sql.split())
+            if isinstance(e, sqlite3.OperationalError) and str(e) == 'interrupted':
+                # 后台任务取消时被进度回调中断的查询，交由调用方处理，不视为错误
+                self.recorder.lock_output(f"Execute '{sql}' interrupted.", msg_extract=False)
+                raise
+            if self.stats is not None: self.stats.record_error(sql)
+            self.recorder.lock_output(f"Execute '{sql}' error, args: {self._summary_args(args, mode)}, {e}",
+                                      level='error', out='all', msg_extract=False)
+            # 事务中出错需要中断整个事务
+            if self.tx_depth: raise
             return [], False
 
-    def _concat_fields(self, fields, extra=''):
-        if not fields:
-            return ''
-        if isinstance(fields, str):
-            # 如果字段名包含括号，可能是函数调用，如 "MIN(day)"
-            if '(' in fields and ')' in fields:
-                # 分割函数名和字段名
-                func_name, field_name = fields.split('(')
-                field_name = field_name.strip(') ')  # 去掉右括号和多余的空格
-                # 添加反引号并重组
-                return f"{func_name}(`{field_name}`)"
-            elif '*' not in fields:
-                # 普通字段名，直接添加反引号
-                return f"`{fields}`"
-            else:
-                return fields
+    def explain(self, sql, params=()):
+        # EXPLAIN QUERY PLAN 的每一行为 (id, parent, notused, detail)，返回 detail 列表
+        rows = self.driver.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+        return [row[3] for row in rows]
+
+    def _record_slow(self, sql, elapsed, args, mode):
+        params = args[0] if args else ()
+        if mode != 'single':
+            # 批量执行取第一组参数
+            params = params[0] if hasattr(params, '__getitem__') and len(params) else None
+        plan = []
+        if params is not None and is_explainable(sql):
+            try:
+                plan = self.explain(sql, params)
+            except sqlite3.Error as e:
+                plan = [f'explain failed: {e}']
+        self.stats.record_slow(sql, elapsed, self._summary_args(args, mode), plan)
+        self.recorder.lock_output(
+            f"Slow query {elapsed:.2f} ms: '{' '.join(sql.split())}', plan: {plan}", level='warning', msg_extract=False
+        )
+
+    @contextmanager
+    def transaction(self):
+        """
+        显式事务，with 块内的语句全部成功后一次提交，任一语句出错则整体回滚并抛出异常。
+        嵌套使用时并入最外层事务。
+        """
+        if not self.tx_depth:
+            # 提交之前遗留的隐式事务
+            if self.driver.in_transaction: self.driver.commit()
+            self.driver.execute('BEGIN')
+        self.tx_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.tx_depth -= 1
+            if not self.tx_depth:
+                self.driver.rollback()
+                self.recorder.lock_output('Transaction rolled back.', level='warning')
+            raise
         else:
-            return '(`' + '`, `'.join([kw + extra for kw in fields]) + '`)'
+            self.tx_depth -= 1
+            if not self.tx_depth:
+                self.driver.commit()
+                if self.stats is not None: self.stats.record_commit()
 
-    def _concat_value_string(self, num, key=''):
-        return ', '.join([(key + str(i) + '=' if key else '') + '?' for i in range(num)])
+    def data_version(self):
+        # 本连接的修改行数与其他连接提交次数，任一变化说明数据已被修改，用于缓存失效
+        result = self.driver.execute('PRAGMA data_version').fetchone()
+        return self.driver.total_changes, result[0]
 
     def get_column_names(self, table_name):
-        result, _ = self.exec_sql(f"PRAGMA table_info({table_name})")
+        result, _ = self.exec_sql(f"PRAGMA table_info({quote(table_name)})")
         columns = [column[1] for column in result]
         return columns
 
     def insert(self, table, data, keywords=[], mode='single'):
-        kw_sql = self._concat_fields(keywords)
-        value_sql = self._concat_value_string(len(data) if mode == 'single' else len(data[0]))
-        sql = f'''INSERT INTO {table} {kw_sql} VALUES ({value_sql})'''
+        # 批量写入空数据时没有可执行的语句
+        if mode != 'single' and not len(data): return [], True
+        sql = insert_sql(table, len(data) if mode == 'single' else len(data[0]), keywords)
         return self.exec_sql(sql, data, mode=mode)
 
-    def delete(self, table, limit=None):
-        sql = f'DELETE FROM {table} '
-        # 如果有限制条件就加上
-        if limit: sql += limit
-        return self.exec_sql(sql)
-
-    def modify(self, table, keywords, data, *args, limit=''):
-        # limit = f'where {limit}' if limit else ''
-        # 同上，拼接 sql 语句
-        sql = f'UPDATE {table} SET {self._concat_fields(keywords, " = ?")} {limit}'
-        return self.exec_sql(sql, data)
-
-    def search(self, table, *args, field='*', limit=''):
-        kw_sql = self._concat_fields(field)
-        # limit = f'where {limit}' if limit else ''
-        # 拼接 sql 字符串
-        sql = f'SELECT {kw_sql} FROM {table} {limit}'
-        return self.exec_sql(sql, *args)
-
-    def union_search(self, table1, table2, *args, field1='*', field2='*',  limit=''):
-        kw1, kw2 = map(self._concat_fields, [field1, field2])
-        sql = f'''
-            SELECT {kw1} FROM {table1} {limit} 
-            UNION 
-            SELECT {kw2} FROM {table2} {limit}
-        '''
-        return self.exec_sql(sql, *args)
+    def delete(self, table, where=None):
+        # 没有条件时删除全部数据
+        sql, params = delete_sql(table, where)
+        return self.exec_sql(sql, params)
+
+    def modify(self, table, keywords, data, where=None):
+        sql, params = update_sql(table, dict(zip(keywords, data)), where)
+        return self.exec_sql(sql, params)
+
+    def search(self, table, field='*', where=None, order=None, limit=None, offset=None, join=None):
+        """
+        where / order / limit / join 的写法见 query.py，值全部以参数绑定。
+        """
+        sql, params = select_sql(table, field, where=where, order=order, limit=limit, offset=offset, join=join)
+        return self.exec_sql(sql, params)
+
+    def union_search(self, table1, table2, field1='*', field2='*', where=None):
+        sql1, params1 = select_sql(table1, field1, where=where)
+        sql2, params2 = select_sql(table2, field2, where=where)
+        return self.exec_sql(f'{sql1} UNION {sql2}', params1 + params2)
 
     def close(self):
         self.driver.close()
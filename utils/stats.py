@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : stats.py
+
+# 库存与每日统计的增量维护。
+# stock 表保存每个商品当前的库存瓶数及移动加权平均成本；
+# statistics 表每个商品每天一行：origin 为当天首笔出入库前的库存，
+# in_total / out_total 为当天出入库瓶数，in_unit_price / out_unit_price 为当天均价，
+# profit 为当天出库按出库时平均成本计算的利润。
+# 两张表都用 INSERT ... ON CONFLICT 在出入库记录所在的事务中更新，不再先读后写。
+
+from datetime import datetime
+
+from .archive import record_segments, range_condition
+
+# 同一商品同一天已有统计时合并：数量累加，均价按数量加权，利润累加，origin 保持不变
+MERGE_STATISTICS = '''
+    ON CONFLICT (product_id, day) DO UPDATE SET
+        in_unit_price = CASE WHEN in_total + excluded.in_total > 0
+            THEN (in_unit_price * in_total + excluded.in_unit_price * excluded.in_total)
+                 / (in_total + excluded.in_total)
+            ELSE 0 END,
+        out_unit_price = CASE WHEN out_total + excluded.out_total > 0
+            THEN (out_unit_price * out_total + excluded.out_unit_price * excluded.out_total)
+                 / (out_total + excluded.out_total)
+            ELSE 0 END,
+        in_total = in_total + excluded.in_total,
+        out_total = out_total + excluded.out_total,
+        settled = settled AND excluded.settled,
+        profit = profit + excluded.profit
+'''
+
+UPSERT_STATISTICS = '''
+    INSERT INTO statistics (
+        product_id, day, origin, in_total, out_total, in_unit_price, out_unit_price, settled, profit
+    )
+    VALUES (
+        ?1, ?2, COALESCE((SELECT `bottles` FROM stock WHERE `product_id` = ?1), 0), ?3, ?4, ?5, ?6, ?7,
+        ?8 - ?4 * COALESCE((SELECT `avg_cost` FROM stock WHERE `product_id` = ?1), 0)
+    )
+''' + MERGE_STATISTICS
+
+# 已在 Python 中算好的统计行
+UPSERT_STATISTICS_ROW = '''
+    INSERT INTO statistics (
+        product_id, day, origin, in_total, out_total, in_unit_price, out_unit_price, settled, profit
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+''' + MERGE_STATISTICS
+
+# 入库时按移动加权平均更新成本，出库只减少库存
+UPSERT_STOCK = '''
+    INSERT INTO stock (product_id, bottles, avg_cost, updated)
+    VALUES (?1, ?2, ?3, ?4)
+    ON CONFLICT (product_id) DO UPDATE SET
+        avg_cost = CASE WHEN excluded.bottles > 0
+            THEN (MAX(bottles, 0) * avg_cost + excluded.bottles * excluded.avg_cost)
+                 / (MAX(bottles, 0) + excluded.bottles)
+            ELSE avg_cost END,
+        bottles = bottles + excluded.bottles,
+        updated = excluded.updated
+'''
+
+# 写入已算好的库存
+REPLACE_STOCK = '''
+    INSERT INTO stock (product_id, bottles, avg_cost, updated)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (product_id) DO UPDATE SET
+        bottles = excluded.bottles,
+        avg_cost = excluded.avg_cost,
+        updated = excluded.updated
+'''
+
+
+def get_today():
+    return datetime.today().strftime('%Y-%m-%d')
+
+
+def movement_params(product_id, bottles, total_price, settled, mode='in', day=None, updated=None):
+    # 返回 (统计参数, 库存参数)，供单条及批量更新共用
+    day = day or get_today()
+    updated = updated or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    unit_price = total_price / bottles if bottles else 0
+    if mode == 'in':
+        statistics = (product_id, day, bottles, 0, unit_price, 0, settled, 0)
+        stock = (product_id, bottles, unit_price, updated)
+    else:
+        statistics = (product_id, day, 0, bottles, 0, unit_price, settled, total_price)
+        stock = (product_id, -bottles, 0, updated)
+    return statistics, stock
+
+
+def update_statistics(db, product_id, bottles, unit_price, total_price, settled, mode='in', day=None):
+    """
+    记录一笔出入库对统计及库存的影响，应与出入库记录在同一事务中调用。
+    unit_price 为每瓶单价，均价按 total_price 计算。
+    """
+    statistics, stock = movement_params(product_id, bottles, total_price, settled, mode=mode, day=day)
+    with db.transaction():
+        # 先更新统计，利润使用本次出库前的平均成本
+        db.exec_sql(UPSERT_STATISTICS, statistics)
+        db.exec_sql(UPSERT_STOCK, stock)
+
+
+def update_statistics_batch(db, movements, mode='in', day=None):
+    """
+    批量出入库后一次更新统计及库存，movements 为 [(product_id, bottles, total_price, settled), ...]，
+    同一商品先合并再写入，每个商品只执行一次 upsert。
+    """
+    merged = {}
+    for product_id, bottles, total_price, settled in movements:
+        item = merged.setdefault(product_id, [0, 0.0, True])
+        item[0] += bottles
+        item[1] += total_price
+        item[2] = item[2] and bool(settled)
+    params = [
+        movement_params(product_id, bottles, total_price, settled, mode=mode, day=day)
+        for product_id, (bottles, total_price, settled) in merged.items()
+    ]
+    with db.transaction():
+        db.exec_sql(UPSERT_STATISTICS, [item[0] for item in params], mode='multi')
+        db.exec_sql(UPSERT_STOCK, [item[1] for item in params], mode='multi')
+    return len(merged)
+
+
+def walk_movements(movements, stock, days):
+    """
+    按顺序累计出入库，movements 为按 (时间, 入库在前, 编号) 排好序的
+    [(time, direction, id, product_id, bottles, total_price, settled), ...]，direction 入库为 1、出库为 0。
+    stock: product_id -> [库存瓶数, 平均成本, 最后更新时间]
+    days: (product_id, day) -> [origin, in_total, out_total, in_amount, out_amount, settled, profit]
+    两者原地更新。
+    """
+    for time, direction, _, product_id, bottles, total_price, settled in movements:
+        state = stock.setdefault(product_id, [0, 0.0, time])
+        day = str(time)[:10]
+        row = days.get((product_id, day))
+        if row is None:
+            row = days[(product_id, day)] = [state[0], 0, 0, 0.0, 0.0, True, 0.0]
+        if direction:
+            on_hand = max(state[0], 0)
+            if bottles > 0:
+                state[1] = (on_hand * state[1] + total_price) / (on_hand + bottles)
+            state[0] += bottles
+            row[1] += bottles
+            row[3] += total_price
+        else:
+            row[6] += total_price - bottles * state[1]
+            state[0] -= bottles
+            row[2] += bottles
+            row[4] += total_price
+        row[5] = row[5] and bool(settled)
+        state[2] = time
+
+
+def statistics_rows(days):
+    # walk_movements 的结果转为 statistics 表的行
+    return [
+        (product_id, day, origin, in_total, out_total,
+         in_amount / in_total if in_total else 0, out_amount / out_total if out_total else 0,
+         settled, profit)
+        for (product_id, day), (origin, in_total, out_total, in_amount, out_amount, settled, profit)
+        in days.items()
+    ]
+
+
+def apply_movements(db, movements, chunk_size=500):
+    """
+    将一批跨多天、出入库混合的记录计入统计及库存，movements 格式及顺序同 walk_movements。
+    先读出涉及商品的当前库存，在内存中按时间顺序累计，结果与逐笔 update_statistics 相同，
+    每个 (商品, 日期) 及每个商品只写一次。应与出入库记录在同一事务中调用。
+    """
+    products = list({item[3] for item in movements})
+    stock = {}
+    for i in range(0, len(products), chunk_size):
+        rows, _ = db.search('stock', field=('product_id', 'bottles', 'avg_cost', 'updated'),
+                            where={'product_id IN': products[i:i + chunk_size]})
+        stock.update({product_id: list(state) for product_id, *state in rows})
+    days = {}
+    walk_movements(movements, stock, days)
+    with db.transaction():
+        db.exec_sql(UPSERT_STATISTICS_ROW, statistics_rows(days), mode='multi')
+        db.exec_sql(REPLACE_STOCK, [(product_id, *state) for product_id, state in stock.items()], mode='multi')
+    return len(days)
+
+
+def rebuild_statistics(db):
+    """
+    按时间顺序遍历全部出入库记录（包括已归档的），一次性重新计算 statistics 与 stock，用于修复数据。
+    """
+    stock, days = {}, {}
+    # 按年分段，每段合并主库与该年归档的记录；主库中补录到已归档年份的记录在对应的段内一起排序
+    for start, end, schema in record_segments(db):
+        branches, params = [], []
+        for name, direction in [('in', 1), ('out', 0)]:
+            condition, values = range_condition(f'{name}_time', start, end)
+            for table in [f'main.{name}_records'] + ([f'{schema}.{name}_records'] if schema else []):
+                branches.append(
+                    f'SELECT `{name}_time` AS time, {direction} AS direction, `id`, `product_id`, `bottles`, '
+                    f'`total_price`, `settled` FROM {table} WHERE {condition}'
+                )
+                params.extend(values)
+        cursor = db.return_driver().execute(' UNION ALL '.join(branches) + ' ORDER BY time, direction DESC, `id`',
+                                            params)
+        walk_movements(cursor, stock, days)
+
+    with db.transaction():
+        db.exec_sql('DELETE FROM statistics')
+        db.exec_sql('DELETE FROM stock')
+        db.exec_sql(
+            '''
+            INSERT INTO statistics (
+                product_id, day, origin, in_total, out_total, in_unit_price, out_unit_price, settled, profit
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''',
+            statistics_rows(days),
+            mode='multi'
+        )
+        db.exec_sql(
+            'INSERT INTO stock (product_id, bottles, avg_cost, updated) VALUES (?, ?, ?, ?)',
+            [(product_id, *state) for product_id, state in stock.items()],
+            mode='multi'
+        )
+    db.recorder.lock_output(f'Rebuilt statistics: {len(days)} daily rows, {len(stock)} products.')
+    return len(days)
+
+
+def get_stock(db):
+    # 库存状况：[(商品编号, 商品名称, 库存瓶数, 平均成本, 总价), ...]，只与商品数量有关
+    result, _ = db.exec_sql('''
+        SELECT s.`product_id`, p.`Name`, s.`bottles`, ROUND(s.`avg_cost`, 2), ROUND(s.`bottles` * s.`avg_cost`, 2)
+        FROM stock s LEFT JOIN products p ON p.`id` = s.`product_id`
+        ORDER BY s.`product_id`
+    ''')
+    return result
+
+
+def get_daily_profit(db, start, end):
+    # 按天汇总利润，[(day, profit), ...]，只读取区间内的统计行
+    result, _ = db.exec_sql(
+        'SELECT `day`, SUM(`profit`) FROM statistics WHERE `day` BETWEEN ? AND ? GROUP BY `day` ORDER BY `day`',
+        (start, end)
+    )
+    return result
+
+
+class ProfitCache:
+    """
+    按区间缓存每日利润，数据库有写入时整体失效。
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.version = None
+        self.cache = {}
+
+    def get(self, start, end):
+        version = self.db.data_version()
+        if version != self.version:
+            self.cache.clear()
+            self.version = version
+        key = (start, end)
+        if key not in self.cache:
+            self.cache[key] = get_daily_profit(self.db, start, end)
+        return self.cache[key]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : watcher.py
+
+# 轮询收银系统导出 csv 的目录，新文件写入出库记录。
+# 文件按内容哈希记录在 ingested_files 中，内容不变不会再次处理；
+# 文件追加内容后重新处理，之前的行由来源键跳过，不会重复计入。
+# 表头或编码有误的文件记录为失败（error 列），内容改变前不再重试，也不影响其他文件。
+
+import csv
+import glob
+import hashlib
+import os
+import time
+
+from .service import InventoryService
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scan_folder(service, folder, pattern='*.csv', mode='out', settle=5, batch_size=5000, check=None):
+    """
+    处理目录中尚未导入的文件，返回 [(path, result), ...]，导入失败的文件 result['error'] 为错误信息。
+    最后修改时间在 settle 秒以内的文件可能仍在写入，留到下次处理；暂时无法读取的文件也留到下次。
+    check 在每个文件前调用，可用于取消。
+    """
+    results = []
+    paths = sorted(glob.glob(os.path.join(folder, pattern)), key=os.path.getmtime)
+    for path in paths:
+        if check is not None: check()
+        if time.time() - os.path.getmtime(path) < settle: continue
+        digest = file_hash(path)
+        done, _ = service.db.search('ingested_files', field='file_hash', where={'file_hash': digest})
+        if done: continue
+        try:
+            result = service.ingest_csv(path, mode=mode, batch_size=batch_size, source=os.path.basename(path))
+        except (ValueError, csv.Error) as e:
+            # 包括 UnicodeDecodeError；出错前已写入的批次保留，修正后重新导入时按来源键跳过
+            result = {'rows': 0, 'inserted': 0, 'skipped': 0, 'error': f'{type(e).__name__}: {e}'}
+            service.db.recorder.lock_output(f'Ingest {path} failed, {result["error"]}', level='warning')
+        except OSError as e:
+            service.db.recorder.lock_output(f'Ingest {path} skipped, {e}', level='warning')
+            continue
+        service.db.insert(
+            'ingested_files', [digest, path, result['rows'], result['inserted'], result['skipped'], result.get('error')],
+            keywords=['file_hash', 'path', 'rows', 'inserted', 'skipped', 'error']
+        )
+        results.append((path, result))
+    return results
+
+
+class FolderWatcher:
+    """
+    定时（root.after）在后台线程中扫描目录，有新数据时在主线程调用 on_ingested(results)。
+    """
+
+    def __init__(self, root, worker, folder, interval=30, on_ingested=None, **options):
+        self.root = root
+        self.worker = worker
+        self.folder = folder
+        self.interval = interval
+        self.on_ingested = on_ingested
+        self.options = options
+        self.task = None
+        self.after_id = None
+
+    def start(self):
+        self.poll()
+        return self
+
+    def poll(self):
+        # 上一次扫描尚未完成时跳过
+        if self.task is None:
+            self.task = self.worker.submit(self._scan, on_done=self._on_done, on_error=self._on_error)
+        self.after_id = self.root.after(int(self.interval * 1000), self.poll)
+
+    def _scan(self, task):
+        if not os.path.isdir(self.folder): return []
+        return scan_folder(InventoryService(task.db), self.folder, check=task.check_cancelled, **self.options)
+
+    def _on_done(self, results):
+        self.task = None
+        if results and self.on_ingested is not None:
+            self.on_ingested(results)
+
+    def _on_error(self, error):
+        self.task = None
+        # 定时重试，不弹窗
+        self.worker.recorder.lock_output(f'扫描 {self.folder} 失败：{error}', level='warning', out='all')
+
+    def stop(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : widgets.py
+
+import tkinter as tk
+from tkinter import ttk
+
+
+class VirtualTreeview(ttk.Treeview):
+    """
+    分页加载的 Treeview，只保存可见区域及前后缓冲的数据。
+    fetch(after=None, before=None, limit=n) 按显示顺序返回 [(key, values), ...]：
+    after 为 key 时返回其后的 n 条，before 为 key 时返回其前的 n 条，均为 None 时返回第一页。
+    指定 worker 时 fetch 在后台线程执行，结果返回后再插入。
+    """
+
+    def __init__(self, master, fetch=None, page_size=100, max_rows=300, worker=None, **kwargs):
+        self.scroll_command = kwargs.pop('yscrollcommand', None)
+        super().__init__(master, **kwargs)
+        super().configure(yscrollcommand=self._on_yscroll)
+        self.fetch = fetch
+        # 指定 worker 时在后台线程查询，fetch 额外接收 db= 工作线程的数据库连接
+        self.worker = worker
+        self.task = None
+        self.page_size = page_size
+        self.max_rows = max(max_rows, page_size * 2)
+        # 当前窗口中每行对应的 key
+        self.keys = []
+        self.has_before = False
+        self.has_after = False
+        self.loading = False
+        # reload 时加一，之前排队的加载及返回的结果按此丢弃
+        self.generation = 0
+
+    def configure(self, cnf=None, **kwargs):
+        # 滚动条回调由本类转发
+        if isinstance(cnf, dict) and 'yscrollcommand' in cnf:
+            cnf = dict(cnf)
+            self.scroll_command = cnf.pop('yscrollcommand')
+        if 'yscrollcommand' in kwargs:
+            self.scroll_command = kwargs.pop('yscrollcommand')
+        return super().configure(cnf, **kwargs)
+
+    config = configure
+
+    def _fetch(self, callback, **kwargs):
+        if self.worker is None:
+            return callback(self.fetch(**kwargs))
+        fetch = self.fetch
+        generation = self.generation
+
+        def on_done(rows):
+            if generation == self.generation: callback(rows)
+
+        def on_error(error):
+            if generation == self.generation: self._on_fetch_error(error)
+
+        self.task = self.worker.submit(lambda task: fetch(db=task.db, **kwargs), on_done=on_done, on_error=on_error)
+
+    def _on_fetch_error(self, error):
+        self.loading = False
+        raise error
+
+    def reload(self, fetch=None):
+        if fetch is not None:
+            self.fetch = fetch
+        # 丢弃尚未返回的查询
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.generation += 1
+        children = self.get_children()
+        if children: self.delete(*children)
+        self.keys = []
+        self.has_before = False
+        self.has_after = False
+        if self.fetch is None: return
+        self.loading = True
+        self._fetch(self._on_reload, limit=self.page_size)
+
+    def _on_reload(self, rows):
+        self.has_after = len(rows) == self.page_size
+        self._insert_rows(rows, 'end')
+        self.yview_moveto(0)
+        self.loading = False
+
+    def _insert_rows(self, rows, index):
+        keys = []
+        for i, (key, values) in enumerate(rows):
+            self.insert('', index if index == 'end' else index + i, values=values)
+            keys.append(key)
+        if index == 'end':
+            self.keys.extend(keys)
+        else:
+            self.keys[index:index] = keys
+
+    def _top_index(self):
+        return int(float(self.yview()[0]) * len(self.keys) + 0.5)
+
+    def _move_to(self, index):
+        if self.keys:
+            self.yview_moveto(max(index, 0) / len(self.keys))
+
+    def _on_yscroll(self, first, last):
+        if self.scroll_command is not None:
+            self.scroll_command(first, last)
+        if self.loading or not self.keys: return
+        # 接近边缘时在空闲时加载下一页或上一页
+        if float(last) >= 0.95 and self.has_after:
+            self.loading = True
+            self.after_idle(self.load_after, self.generation)
+        elif float(first) <= 0.05 and self.has_before:
+            self.loading = True
+            self.after_idle(self.load_before, self.generation)
+
+    def _is_stale(self, generation):
+        # 排队期间已经 reload：不再加载，loading 由新的查询负责
+        if generation is not None and generation != self.generation: return True
+        if not self.keys:
+            self.loading = False
+            return True
+        return False
+
+    def load_after(self, generation=None):
+        if self._is_stale(generation): return
+        self._fetch(self._on_load_after, after=self.keys[-1], limit=self.page_size)
+
+    def _on_load_after(self, rows):
+        try:
+            top = self._top_index()
+            self.has_after = len(rows) == self.page_size
+            self._insert_rows(rows, 'end')
+            # 超出部分从顶部移除
+            overflow = len(self.keys) - self.max_rows
+            if overflow > 0:
+                self.delete(*self.get_children()[:overflow])
+                del self.keys[:overflow]
+                self.has_before = True
+                self._move_to(top - overflow)
+        finally:
+            self.loading = False
+
+    def load_before(self, generation=None):
+        if self._is_stale(generation): return
+        self._fetch(self._on_load_before, before=self.keys[0], limit=self.page_size)
+
+    def _on_load_before(self, rows):
+        try:
+            top = self._top_index()
+            self.has_before = len(rows) == self.page_size
+            self._insert_rows(rows, 0)
+            # 超出部分从底部移除
+            overflow = len(self.keys) - self.max_rows
+            if overflow > 0:
+                self.delete(*self.get_children()[-overflow:])
+                del self.keys[-overflow:]
+                self.has_after = True
+            self._move_to(top + len(rows))
+        finally:
+            self.loading = False
+
+
+class ProgressDialog(tk.Toplevel):
+    """
+    耗时任务的进度窗口，带取消按钮。
+    """
+
+    def __init__(self, master, title='处理中', on_cancel=None):
+        super().__init__(master)
+        self.title(title)
+        self.geometry('360x120')
+        self.resizable(False, False)
+        self.transient(master)
+        self.on_cancel = on_cancel
+
+        self.message_var = tk.StringVar(value=f'{title}，请稍候...')
+        tk.Label(self, textvariable=self.message_var).pack(pady=10)
+        self.bar = ttk.Progressbar(self, length=300, mode='indeterminate')
+        self.bar.pack(pady=5)
+        self.bar.start()
+        ttk.Button(self, text='取消', command=self.cancel).pack(pady=5)
+        self.protocol('WM_DELETE_WINDOW', self.cancel)
+
+    def update_progress(self, done, total=None, message=''):
+        if message:
+            self.message_var.set(message)
+        if total:
+            if self.bar['mode'] != 'determinate':
+                self.bar.stop()
+                self.bar.configure(mode='determinate', maximum=total)
+            self.bar['value'] = done
+
+    def cancel(self):
+        if self.on_cancel is not None:
+            self.on_cancel()
+        self.close()
+
+    def close(self):
+        if self.winfo_exists():
+            self.destroy()
+
+
+class ProfitChart:
+    """
+    首页利润折线图，只创建一次 Figure 和画布，之后原地更新折线数据。
+    """
+
+    def __init__(self, master):
+        import matplotlib
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        # 显示中文和负号
+        matplotlib.rcParams['font.sans-serif'] = ['SimHei']
+        matplotlib.rcParams['axes.unicode_minus'] = False
+
+        self.figure = Figure(figsize=(5, 4), dpi=100)
+        self.ax = self.figure.add_subplot(111)
+        self.line, = self.ax.plot([], [])
+        self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+        self.widget = self.canvas.get_tk_widget()
+        # 上次绘制所用数据的标识，未变化时不重绘
+        self.key = None
+
+    def update(self, key, dates, values, title):
+        if key == self.key: return False
+        self.key = key
+        # x 轴使用日期下标，刻度标签显示日期，区间较长时间隔显示
+        self.line.set_data(range(len(dates)), values)
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.ax.set_title(title)
+        ticks = list(range(0, len(dates), max(len(dates) // 8, 1)))
+        self.ax.set_xticks(ticks)
+        self.ax.set_xticklabels([dates[i].strftime('%m-%d') for i in ticks])
+        self.canvas.draw_idle()
+        return True
+
+
+class PageManager:
+    """
+    页面只在第一次显示时创建，之后切换时隐藏 / 显示，保留页面上的输入及查询结果。
+    register(name, build, events) 中 build(frame) 创建页面，可返回刷新函数；
+    notify(*events) 表示数据有变化，当前页面立即刷新，其余页面在下次显示时刷新。
+    """
+
+    def __init__(self, container):
+        self.container = container
+        # name -> (build, events)
+        self.pages = {}
+        self.frames = {}
+        self.refreshers = {}
+        self.dirty = set()
+        self.current = None
+
+    def register(self, name, build, events=()):
+        self.pages[name] = (build, set(events))
+
+    def show(self, name):
+        frame = self.frames.get(name)
+        if frame is None:
+            frame = self.frames[name] = tk.Frame(self.container)
+            self.refreshers[name] = self.pages[name][0](frame)
+            self.dirty.discard(name)
+        if self.current is not None and self.current != name:
+            self.frames[self.current].pack_forget()
+        if self.current != name:
+            frame.pack(fill=tk.BOTH, expand=True)
+            self.current = name
+        if name in self.dirty:
+            self.refresh(name)
+        return frame
+
+    def refresh(self, name):
+        self.dirty.discard(name)
+        refresher = self.refreshers.get(name)
+        if refresher is not None: refresher()
+
+    def reset(self, name):
+        # 销毁页面，下次显示时重新创建；当前页面立即重建
+        frame = self.frames.pop(name, None)
+        self.refreshers.pop(name, None)
+        self.dirty.discard(name)
+        if frame is not None: frame.destroy()
+        if self.current == name:
+            self.current = None
+            self.show(name)
+
+    def notify(self, *events):
+        events = set(events)
+        for name, (_, page_events) in self.pages.items():
+            if name in self.frames and page_events & events:
+                self.dirty.add(name)
+        if self.current in self.dirty:
+            self.refresh(self.current)
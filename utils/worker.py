@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: lhys
+# File  : worker.py
+
+import queue
+from threading import Thread, Event
+
+from .sql import SqliteOperation
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Task:
+
+    def __init__(self, worker, func, args, kwargs, on_done=None, on_error=None, on_progress=None):
+        self.worker = worker
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.cancel_event = Event()
+        # 任务执行时为工作线程的数据库连接
+        self.db = None
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check_cancelled(self):
+        # 供耗时任务在循环中调用，取消后中断执行
+        if self.cancelled:
+            raise TaskCancelled()
+
+    def report(self, done, total=None, message=''):
+        self.check_cancelled()
+        if self.on_progress is not None:
+            self.worker.results.put((self, 'progress', (done, total, message)))
+
+
+class Worker:
+    """
+    后台工作线程，使用独立的数据库连接执行耗时操作。
+    submit 的函数在工作线程中以 func(task, *args, **kwargs) 调用，
+    结果通过队列返回，由 Tk 主线程定时（root.after）取出并调用回调。
+    """
+
+    def __init__(self, root, db_name, recorder, poll_interval=50):
+        self.root = root
+        self.db_name = db_name
+        self.recorder = recorder
+        self.poll_interval = poll_interval
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self.current = None
+        self.thread = Thread(target=self._run, name='worker', daemon=True)
+        self.thread.start()
+        self.after_id = self.root.after(self.poll_interval, self._poll)
+
+    def submit(self, func, *args, on_done=None, on_error=None, on_progress=None, **kwargs):
+        task = Task(self, func, args, kwargs, on_done=on_done, on_error=on_error, on_progress=on_progress)
+        self.tasks.put(task)
+        return task
+
+    def _run(self):
+        db = SqliteOperation(self.db_name, self.recorder)
+        # 任务取消后中断正在执行的查询，每执行 1000 条虚拟机指令检查一次
+        db.driver.set_progress_handler(self._interrupted, 1000)
+        while True:
+            task = self.tasks.get()
+            if task is None: break
+            if task.cancelled: continue
+            self.current = task
+            task.db = db
+            try:
+                result = task.func(task, *task.args, **task.kwargs)
+                self.results.put((task, 'done', result))
+            except TaskCancelled:
+                self.recorder.lock_output(f'Task {task.func.__name__} cancelled.')
+            except Exception as e:
+                # 取消时被中断的查询同样视为取消
+                if task.cancelled:
+                    self.recorder.lock_output(f'Task {task.func.__name__} cancelled.')
+                else:
+                    self.results.put((task, 'error', e))
+            finally:
+                self.current = None
+        db.close()
+
+    def _interrupted(self):
+        task = self.current
+        return 1 if task is not None and task.cancelled else 0
+
+    def _poll(self):
+        # 在主线程中执行回调
+        self.recorder.flush_pending()
+        while True:
+            try:
+                task, kind, value = self.results.get_nowait()
+            except queue.Empty:
+                break
+            # 已取消的任务不再回调
+            if task.cancelled: continue
+            try:
+                if kind == 'progress':
+                    task.on_progress(*value)
+                elif kind == 'done':
+                    if task.on_done is not None: task.on_done(value)
+                elif task.on_error is not None:
+                    task.on_error(value)
+                else:
+                    raise value
+            except Exception as e:
+                self.recorder.lock_output(
+                    f'type: {e.__class__.__name__}, func: {task.func.__name__}, message: {e}',
+                    level='error', out='all'
+                )
+        self.after_id = self.root.after(self.poll_interval, self._poll)
+
+    def close(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+        if self.current is not None:
+            self.current.cancel()
+        self.tasks.put(None)
+        self.thread.join(timeout=5)